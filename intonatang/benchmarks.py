@@ -0,0 +1,179 @@
+"""Benchmarks of the main analyses on synthetic data (see synthetic_data), runnable without patient data.
+
+Each benchmark sets up its data once and then times repeated runs of one analysis: ridge TRF fitting, encoding
+models (OLS), LDA invariance permutations, epoching of block data into Y_mats, and PSI computation. Sizes are set by a scale:
+"small" runs in seconds, "full" uses the sizes of the real data (256 channels, 96 trials, 500 TIMIT sentences, 32 phonemes).
+
+Run from the command line, optionally saving the timings and comparing them to a previous run::
+
+    python -m intonatang.benchmarks --scale small --output new.json --compare old.json
+
+The comparison exits with status 1 if any benchmark is slower than the previous run by more than the tolerance.
+With --imports, the import times of the compute modules are also checked against their budgets
+(see lazy_imports.check_import_times).
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import sys
+import json
+import time
+import argparse
+import platform
+from collections import OrderedDict
+
+import numpy as np
+
+from . import synthetic_data
+from .lazy_imports import check_import_times
+
+scales = {'small': {'n_chans': 16, 'n_trials': 96, 'n_sentences': 50, 'n_perms': 2, 'n_samples': 5000, 'n_phonemes': 6},
+          'medium': {'n_chans': 64, 'n_trials': 96, 'n_sentences': 200, 'n_perms': 5, 'n_samples': 20000, 'n_phonemes': 12},
+          'full': {'n_chans': 256, 'n_trials': 96, 'n_sentences': 500, 'n_perms': 10, 'n_samples': 60000, 'n_phonemes': 32}}
+
+benchmarks = OrderedDict()
+
+def benchmark(func):
+    """Registers a benchmark. func(**scale) sets up data and returns the function to time (with no arguments).
+    """
+    benchmarks[func.__name__] = func
+    return func
+
+@benchmark
+def ridge_trf(n_chans, n_samples, **kwargs):
+    from .temporal_receptive_field import get_dstim, get_delays, get_alphas, run_ridge_regression
+    random_state = np.random.RandomState(0)
+    # 23 binary pitch and intensity features x 46 delays, as in the ptrf models
+    stim = (random_state.rand(n_samples, 23) < 0.1).astype(float)
+    resp = random_state.randn(n_samples, n_chans)
+    n_train = int(0.8 * n_samples)
+    n_ridge = int(0.9 * n_samples)
+    delays = get_delays(delay_seconds=0.46)
+    def run():
+        dstim = get_dstim(stim, delays=delays)
+        return run_ridge_regression(dstim[:n_train], resp[:n_train], dstim[n_train:n_ridge], resp[n_train:n_ridge], get_alphas())
+    return run
+
+@benchmark
+def encoding_ols(n_chans, n_trials, **kwargs):
+    from .intonation_encoding import single_electrode_encoding_varpart
+    Y_mat, sns, sts, sps, Y_mat_plotter = synthetic_data.get_synthetic_Y_mat(n_chans=n_chans, n_trials=n_trials)
+    # the OLS models are fit on each channel separately, so a few channels are enough to catch regressions.
+    which_chans = np.arange(min(n_chans, 4))
+    def run():
+        return single_electrode_encoding_varpart(Y_mat, sns, sts, sps, which_chans=which_chans)
+    return run
+
+@benchmark
+def lda_invariance(n_chans, n_trials, n_perms, **kwargs):
+    from .intonation_invariance import test_invariance
+    Y_mat, sns, sts, sps, Y_mat_plotter = synthetic_data.get_synthetic_Y_mat(n_chans=n_chans, n_trials=n_trials)
+    def run():
+        return test_invariance(Y_mat, sns, sts, sps, n_perms=n_perms, seed=0)
+    return run
+
+@benchmark
+def epoching(n_chans, n_trials, n_blocks=3, **kwargs):
+    from .intonation_preanalysis import get_Y_mats
+    # Y_mat and Y_mat_plotter for both normalizations, as saved by save_Y_mats_for_subject_number
+    blocks = [synthetic_data.get_synthetic_block_data(block=block, n_trials=n_trials, n_chans=n_chans, seed=block)
+              for block in np.arange(1, n_blocks + 1)]
+    times = [data['times'] for data in blocks]
+    hg = [data['EC100_B' + str(block) + '_hg_100Hz'] for block, data in zip(np.arange(1, n_blocks + 1), blocks)]
+    good_trials = [np.arange(n_trials) for block in blocks]
+    def run():
+        return get_Y_mats(times, good_trials, hg)
+    return run
+
+@benchmark
+def psis(n_sentences, n_phonemes, **kwargs):
+    from .timit import get_psis, phoneme_order
+    timit_pitch = synthetic_data.get_synthetic_timit_pitch(n_sentences=n_sentences)
+    timit_phonemes = synthetic_data.get_synthetic_timit_phonemes(timit_pitch)
+    # get_psis uses 256 channels
+    out = synthetic_data.get_synthetic_timit_out(timit_pitch, n_chans=256)
+    # the number of rank sum tests grows with the square of the number of phonemes
+    def run():
+        return get_psis(out, phoneme_order=phoneme_order[:n_phonemes], timit_phonemes=timit_phonemes)
+    return run
+
+def run_benchmarks(scale='small', names=None, repeat=3, verbose=True):
+    """Runs benchmarks and returns their timings.
+
+    Args:
+        scale (str or dict): a key of ``scales``, or a dict with the same keys
+        names (list): benchmarks to run, defaults to all
+        repeat (int): number of timed runs of each benchmark
+
+    Returns:
+        (dict): with "info" (scale, platform, library versions) and "benchmarks" (benchmark names and dicts with
+            "min", "mean", and "times" in seconds). Benchmarks that could not be set up (e.g. missing optional
+            dependencies) have an "error" instead.
+    """
+    params = scales[scale] if not isinstance(scale, dict) else scale
+    if names is None:
+        names = list(benchmarks)
+    results = OrderedDict()
+    for name in names:
+        try:
+            run = benchmarks[name](**params)
+        except ImportError as e:
+            results[name] = {'error': str(e)}
+            if verbose:
+                print("{:<16} skipped ({})".format(name, e))
+            continue
+        times = []
+        for i in range(repeat):
+            start = time.time()
+            run()
+            times.append(time.time() - start)
+        results[name] = {'min': min(times), 'mean': float(np.mean(times)), 'times': times}
+        if verbose:
+            print("{:<16} min {:8.3f} s  mean {:8.3f} s".format(name, min(times), np.mean(times)))
+    info = OrderedDict([('scale', scale if not isinstance(scale, dict) else params), ('repeat', repeat),
+                        ('python', platform.python_version()), ('numpy', np.__version__),
+                        ('platform', platform.platform())])
+    return OrderedDict([('info', info), ('benchmarks', results)])
+
+def compare_benchmarks(old, new, tolerance=1.2):
+    """Returns names and slowdowns (new min time / old min time) of benchmarks that are slower by more than tolerance.
+    """
+    regressions = OrderedDict()
+    for name, result in new['benchmarks'].items():
+        old_result = old['benchmarks'].get(name, {})
+        if 'min' in result and 'min' in old_result and old_result['min'] > 0:
+            slowdown = result['min'] / old_result['min']
+            if slowdown > tolerance:
+                regressions[name] = slowdown
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of intonatang analyses on synthetic data.")
+    parser.add_argument('--scale', default='small', choices=sorted(scales))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='+', choices=list(benchmarks), help="benchmarks to run")
+    parser.add_argument('--output', help="save timings to this json file")
+    parser.add_argument('--compare', help="json file of a previous run to compare to")
+    parser.add_argument('--tolerance', type=float, default=1.2, help="allowed slowdown relative to --compare")
+    parser.add_argument('--imports', action='store_true', help="also check import times against lazy_imports.import_time_budgets")
+    args = parser.parse_args(argv)
+
+    import_failures = {}
+    if args.imports:
+        import_failures = check_import_times()
+
+    report = run_benchmarks(scale=args.scale, names=args.only, repeat=args.repeat)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            regressions = compare_benchmarks(json.load(f), report, tolerance=args.tolerance)
+        for name, slowdown in regressions.items():
+            print("{} is {:.2f} times slower".format(name, slowdown))
+        if len(regressions) > 0:
+            return 1
+    return 1 if len(import_failures) > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Content-addressed validation of saved intermediate results.
+
+Intermediate results (e.g. the preprocessed Y_mat files in processed_neural_data) are saved to files whose names
+only encode a few options. To know whether a saved file is still valid, a cache key is computed from the
+signatures of the input files (size, modification time and, optionally, a sha1 checksum of their contents) and
+all parameters used to compute the result. The key is stored in a json sidecar file next to the output
+(``<output>.cache.json``) when the output is saved. The output is valid as long as the key computed from the
+current inputs and parameters matches the key in its sidecar.
+
+Small arrays (e.g. bin edges) can be saved to an .npz file with its sidecar by ``save_cached_arrays`` and loaded
+with ``load_cached_arrays``. The file is written to a temporary file and renamed into place, so other processes
+never read a partially written file.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import json
+import hashlib
+import zipfile
+
+import numpy as np
+
+sidecar_suffix = '.cache.json'
+
+def get_file_signature(path, checksum=False):
+    """Returns a dict describing the state of the file at path.
+
+    Args:
+        path (str): file path
+        checksum (bool): include the sha1 of the file contents. Slower, but does not depend on modification times.
+
+    Returns:
+        (dict): with keys "path", "size", and "mtime" (and "sha1" if checksum is True). Size and mtime are None if
+            the file does not exist.
+    """
+    signature = {'path': os.path.abspath(path), 'size': None, 'mtime': None}
+    if os.path.exists(path):
+        stat = os.stat(path)
+        signature['size'] = stat.st_size
+        signature['mtime'] = stat.st_mtime
+        if checksum:
+            signature['sha1'] = get_file_checksum(path)
+    return signature
+
+def get_file_checksum(path, chunk_size=2**20):
+    """Returns the sha1 hex digest of the contents of the file at path.
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def to_jsonable(value):
+    """Converts numpy scalars and arrays (and containers of them) in parameters to json-serializable values.
+    """
+    if isinstance(value, dict):
+        return dict((str(k), to_jsonable(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def get_cache_key(input_paths, params, checksum=False):
+    """Returns the cache key for a result computed from input_paths with params.
+
+    Args:
+        input_paths (list): paths of the input files
+        params (dict): all parameters used to compute the result
+        checksum (bool): use file contents instead of size/mtime for the file signatures (size is still included)
+
+    Returns:
+        (tuple):
+            * **key** (*str*): sha1 hex digest of the file signatures and parameters
+            * **description** (*dict*): the file signatures and parameters that were hashed
+    """
+    signatures = [get_file_signature(path, checksum=checksum) for path in input_paths]
+    if checksum:
+        for signature in signatures:
+            signature.pop('mtime')
+    description = {'files': signatures, 'params': to_jsonable(params)}
+    key = hashlib.sha1(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+    return key, description
+
+def get_sidecar_path(output_path):
+    return output_path + sidecar_suffix
+
+def read_cache_key(output_path):
+    """Returns the key stored in the sidecar of output_path, or None if there is no (readable) sidecar.
+    """
+    try:
+        with open(get_sidecar_path(output_path), 'r') as f:
+            return json.load(f)['key']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+def write_cache_key(output_path, key, description=None):
+    """Writes key (and the description of what was hashed) to the sidecar of output_path.
+    """
+    with open(get_sidecar_path(output_path), 'w') as f:
+        json.dump({'key': key, 'description': description}, f, indent=1, sort_keys=True)
+
+def is_cache_valid(output_path, key):
+    """Returns True if output_path exists and was saved with the given key.
+    """
+    return os.path.exists(output_path) and read_cache_key(output_path) == key
+
+def save_cached_arrays(path, key, description, **arrays):
+    """Saves arrays to the .npz file path and then writes its sidecar.
+
+    The arrays are written to a temporary file (unique to this process) that is renamed to path, so processes
+    loading path at the same time read either the old or the new file.
+    """
+    tmp_path = path + '.tmp' + str(os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.rename(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    write_cache_key(path, key, description)
+
+def load_cached_arrays(path, key, names):
+    """Returns a dict of the arrays in names from the .npz file path saved with save_cached_arrays.
+
+    Returns None if path is missing, was saved with another key, or cannot be read, so that the arrays are
+    computed again.
+    """
+    if not is_cache_valid(path, key):
+        return None
+    try:
+        with np.load(path) as data:
+            return dict((name, data[name]) for name in names)
+    except (IOError, OSError, ValueError, KeyError, EOFError, zipfile.BadZipfile):
+        return None
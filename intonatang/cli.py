@@ -0,0 +1,90 @@
+"""Command-line driver of the analysis pipeline (see pipeline.get_all_results_pipeline).
+
+Installed as the ``intonatang`` command (or run with ``python -m intonatang.cli``). Stages and subjects are
+selected on the command line, e.g. to run the encoding models and the ptrf permutation tests of two subjects with
+8 worker processes and one BLAS thread per worker, skipping stages whose results are already up to date::
+
+    intonatang encoding ptrf-permutations --subjects 113 118 --workers 8 --blas-threads 1 --resume
+
+Without stage names, all stages are run. Stages that depend on stages that were not selected use their saved results.
+Without --resume, every selected stage is run again, including the preprocessing of the Y_mat files.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import sys
+import argparse
+
+# environment variables that set the number of threads of the BLAS libraries numpy and scipy may be linked against
+blas_thread_variables = ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS',
+                         'NUMEXPR_NUM_THREADS']
+
+stage_names = ['preanalysis', 'encoding', 'invariance', 'ptrf', 'ptrf-permutations', 'timit-psis']
+
+def set_blas_threads(n_threads):
+    """Limits the number of BLAS threads. Only has an effect before numpy is imported, and is inherited by workers.
+    """
+    for variable in blas_thread_variables:
+        os.environ[variable] = str(n_threads)
+
+def select_subjects(subject_numbers, selected):
+    """Returns the subjects of subject_numbers that are in selected, or subject_numbers if selected is None.
+    """
+    if selected is None:
+        return list(subject_numbers)
+    return [subject_number for subject_number in selected if subject_number in subject_numbers]
+
+def get_parser():
+    parser = argparse.ArgumentParser(prog='intonatang', description="Runs the intonatang analyses.")
+    parser.add_argument('stages', nargs='*', metavar='stage',
+                        help="stages to run: " + ", ".join(stage_names) + " (default: all)")
+    parser.add_argument('--subjects', nargs='+', type=int, help="subject numbers (default: all subjects of each stage)")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument('--blas-threads', type=int, default=None, help="number of BLAS threads in each process")
+    parser.add_argument('--perms', type=int, default=None,
+                        help="number of permutations of the invariance and ptrf permutation tests")
+    parser.add_argument('--resume', action='store_true',
+                        help="skip stages whose outputs exist and are newer than their inputs, and only recompute "
+                             "preprocessed Y_mat files that are out of date")
+    parser.add_argument('--regenerate-timit-data', action='store_true',
+                        help="regenerate the processed TIMIT pitch and phoneme data first")
+    parser.add_argument('--regenerate-shuffled-timit-data', action='store_true',
+                        help="regenerate the shuffled TIMIT pitch contours before the ptrf permutation tests")
+    return parser
+
+def main(argv=None):
+    parser = get_parser()
+    args = parser.parse_args(argv)
+    for stage in args.stages:
+        if stage not in stage_names:
+            parser.error("unknown stage " + stage + " (choose from " + ", ".join(stage_names) + ")")
+    if args.blas_threads is not None:
+        set_blas_threads(args.blas_threads)
+
+    # imported after the BLAS threads are set
+    from . import pipeline
+    from .intonation_subject_data import intonation_subject_numbers, nonspeech_subject_numbers, timit_subject_numbers
+
+    kinds = [stage.replace('-', '_') for stage in args.stages] if len(args.stages) > 0 else None
+    all_results_pipeline = pipeline.get_all_results_pipeline(
+        subject_numbers=select_subjects(intonation_subject_numbers, args.subjects),
+        nonspeech_subject_numbers=select_subjects(nonspeech_subject_numbers, args.subjects),
+        ptrf_subject_numbers=select_subjects(intonation_subject_numbers, args.subjects),
+        timit_subject_numbers=select_subjects(timit_subject_numbers, args.subjects),
+        regenerate_processed_timit_data=args.regenerate_timit_data,
+        regenerate_shuffled_timit_data=args.regenerate_shuffled_timit_data,
+        use_cache=args.resume, kinds=kinds, n_perms=args.perms)
+    if len(all_results_pipeline.stages) == 0:
+        print("No stages to run for the selected subjects.")
+        return 0
+
+    try:
+        all_results_pipeline.run(n_workers=args.workers, force=not args.resume)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,369 @@
+"""Checks that optimized implementations reproduce the outputs of the reference implementations.
+
+A case (see ``cases``) defines inputs (from synthetic_data), the reference function (the published implementation,
+frozen in reference_impls), the candidate function (the implementation the analyses currently use), the names of
+their outputs, and tolerances for each output. ``check_equivalence`` runs the reference and a candidate function
+with the same signature on copies of the same inputs, compares every output, and returns a report::
+
+    from intonatang import equivalence
+    report = equivalence.check_equivalence('ridge_regression', my_run_ridge_regression)
+    print(equivalence.format_report(report))
+
+Every case can be checked from the command line, which exits with status 1 if any output differs::
+
+    python -m intonatang.equivalence --output report.json
+
+Tolerances are dicts with "rtol" and "atol" (as in np.allclose) or "exact". NaNs have to be at the same positions.
+Significance masks derived from the outputs (e.g. p < 0.05/(256*101) for the encoding models) are compared
+exactly. Reference outputs can be saved once with ``save_golden`` (e.g. before changing an implementation) and
+passed as ``golden`` instead of running the reference again. Saved results of the real data (e.g. the encoding
+results of a subject computed before and after a change) can be compared with ``compare_results_files``.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import sys
+import copy
+import json
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+from . import synthetic_data
+from . import result_store
+from . import reference_impls
+
+exact = 'exact'
+default_tolerance = {'rtol': 1e-7, 'atol': 1e-10}
+
+# sizes of the one-hot groups at the start of the stims of the ridge_regression_fold case (absolute pitch,
+# relative pitch, and pitch_binary), as in the ptrf models.
+ridge_fold_one_hot_groups = [10, 10, 1]
+
+def get_ridge_regression_inputs(n_chans=16, n_samples=5000, seed=0):
+    from .temporal_receptive_field import get_dstim, get_delays, get_alphas
+    random_state = np.random.RandomState(seed)
+    stim = get_dstim((random_state.rand(n_samples, 23) < 0.1).astype(float), delays=get_delays(delay_seconds=0.46))
+    resp = np.dot(stim, random_state.randn(stim.shape[1], n_chans) * 0.1) + random_state.randn(n_samples, n_chans)
+    n_train = int(0.8 * n_samples)
+    return (stim[:n_train], resp[:n_train], stim[n_train:], resp[n_train:], get_alphas()), {}
+
+def get_ridge_regression_fold_inputs(n_chans=16, n_samples=5000, seed=0):
+    from .temporal_receptive_field import get_delays, get_alphas
+    random_state = np.random.RandomState(seed)
+    # one-hot pitch bins (-1 for samples without pitch) followed by a dense intensity column
+    groups = []
+    for n_bins in ridge_fold_one_hot_groups:
+        codes = random_state.randint(-1, n_bins, n_samples)
+        group = np.zeros((n_samples, n_bins))
+        group[np.flatnonzero(codes >= 0), codes[codes >= 0]] = 1
+        groups.append(group)
+    stim = np.column_stack(groups + [random_state.randn(n_samples)])
+    resp = np.dot(stim, random_state.randn(stim.shape[1], n_chans)) + random_state.randn(n_samples, n_chans)
+    splits = [0, int(0.8 * n_samples), int(0.9 * n_samples), n_samples]
+    stims = [stim[start:stop] for start, stop in zip(splits[:-1], splits[1:])]
+    resps = [resp[start:stop] for start, stop in zip(splits[:-1], splits[1:])]
+    return (stims, resps), {'delays': get_delays(delay_seconds=0.46), 'alphas': get_alphas()}
+
+def get_pitch_matrix_inputs(n_samples=5000, seed=0):
+    random_state = np.random.RandomState(seed)
+    # includes pitch values outside of the bin edges and NaNs (samples without pitch)
+    pitch = random_state.uniform(50, 450, n_samples)
+    pitch[random_state.rand(n_samples) < 0.3] = np.NaN
+    return (pitch, np.linspace(80, 400, 11)), {}
+
+def get_epoching_inputs(n_chans=16, n_trials=96, n_blocks=3, seed=0):
+    blocks = [synthetic_data.get_synthetic_block_data(block=block, n_trials=n_trials, n_chans=n_chans, seed=seed + block)
+              for block in np.arange(1, n_blocks + 1)]
+    times = [data['times'] for data in blocks]
+    hg = [data['EC100_B' + str(block) + '_hg_100Hz'] for block, data in zip(np.arange(1, n_blocks + 1), blocks)]
+    # NaNs in a bad time segment of each block, and a bad trial in each block
+    for hg_block in hg:
+        hg_block[:, 1000:1100] = np.NaN
+    good_trials = [np.delete(np.arange(n_trials), block) for block in np.arange(n_blocks)]
+    return (times, good_trials, hg), {}
+
+def get_residualize_inputs(n_chans=16, seed=0):
+    Y_mat, sns, sts, sps, Y_mat_plotter = synthetic_data.get_synthetic_Y_mat(n_chans=n_chans, seed=seed)
+    return (Y_mat, sns), {}
+
+def get_encoding_inputs(n_chans=4, seed=0):
+    Y_mat, sns, sts, sps, Y_mat_plotter = synthetic_data.get_synthetic_Y_mat(n_chans=n_chans, seed=seed)
+    return (Y_mat, sns, sts, sps), {'which_chans': np.arange(n_chans)}
+
+def get_invariance_inputs(n_chans=8, n_perms=3, seed=0):
+    Y_mat, sns, sts, sps, Y_mat_plotter = synthetic_data.get_synthetic_Y_mat(n_chans=n_chans, seed=seed)
+    return (Y_mat, sns, sts, sps), {'n_perms': n_perms, 'seed': seed}
+
+def get_psis_inputs(n_sentences=50, n_phonemes=6, seed=0):
+    from .timit import phoneme_order
+    timit_pitch = synthetic_data.get_synthetic_timit_pitch(n_sentences=n_sentences, seed=seed)
+    out = synthetic_data.get_synthetic_timit_out(timit_pitch, n_chans=256, seed=seed)
+    timit_phonemes = synthetic_data.get_synthetic_timit_phonemes(timit_pitch, seed=seed)
+    return (out,), {'phoneme_order': phoneme_order[:n_phonemes], 'timit_phonemes': timit_phonemes}
+
+def get_function(module, name):
+    """Returns a function that imports and calls module.name, so that cases can be defined without the imports.
+    """
+    def function(*args, **kwargs):
+        m = __import__('intonatang.' + module, fromlist=[name])
+        return getattr(m, name)(*args, **kwargs)
+    function.__name__ = name
+    return function
+
+def run_cv_fold_with_lagged_covariance(stims, resps, delays, alphas):
+    """Runs run_cv_temporal_ridge_regression_model_fold with the covariance computed from the bin codes.
+    """
+    from .temporal_receptive_field import run_cv_temporal_ridge_regression_model_fold
+    return run_cv_temporal_ridge_regression_model_fold(stims, resps, delays=delays, alphas=alphas,
+                                                       one_hot_groups=ridge_fold_one_hot_groups)
+
+def get_Y_mats_outputs(Y_mats):
+    outputs = OrderedDict()
+    for z, name in [(True, 'zscore_to_silence'), (False, 'zscore_to_block')]:
+        outputs['Y_mat_' + name], outputs['Y_mat_plotter_' + name] = Y_mats[z]
+    return outputs
+
+def get_encoding_sig(outputs, alpha=0.05/(256*101)):
+    return {'sig': outputs['p_values'] < alpha}
+
+cases = OrderedDict([
+    ('ridge_regression', {'reference': reference_impls.run_ridge_regression,
+                          'candidate': get_function('temporal_receptive_field', 'run_ridge_regression'),
+                          'get_inputs': get_ridge_regression_inputs,
+                          'outputs': ['wts', 'ridge_corrs'],
+                          'tolerances': {'wts': {'rtol': 1e-6, 'atol': 1e-9}, 'ridge_corrs': {'rtol': 1e-6, 'atol': 1e-9}}}),
+    ('ridge_regression_fold', {'reference': reference_impls.run_cv_temporal_ridge_regression_model_fold,
+                               'candidate': run_cv_fold_with_lagged_covariance,
+                               'get_inputs': get_ridge_regression_fold_inputs,
+                               'outputs': ['test_corr', 'wts'],
+                               'tolerances': {'test_corr': {'rtol': 1e-5, 'atol': 1e-6}, 'wts': {'rtol': 1e-4, 'atol': 1e-5}}}),
+    ('pitch_matrix', {'reference': reference_impls.get_pitch_matrix,
+                      'candidate': get_function('pitch_trf', 'get_pitch_matrix'),
+                      'get_inputs': get_pitch_matrix_inputs,
+                      'outputs': ['stim_pitch'],
+                      'tolerances': {'stim_pitch': exact}}),
+    ('epoching', {'reference': reference_impls.get_Y_mats,
+                  'candidate': get_function('intonation_preanalysis', 'get_Y_mats'),
+                  'get_inputs': get_epoching_inputs,
+                  'outputs': get_Y_mats_outputs,
+                  'tolerances': {'Y_mat_zscore_to_silence': {'rtol': 1e-10, 'atol': 1e-12},
+                                 'Y_mat_plotter_zscore_to_silence': {'rtol': 1e-10, 'atol': 1e-12},
+                                 'Y_mat_zscore_to_block': {'rtol': 1e-10, 'atol': 1e-12},
+                                 'Y_mat_plotter_zscore_to_block': exact}}),
+    ('residualize', {'reference': reference_impls.residualize,
+                     'candidate': get_function('intonation_invariance', 'residualize'),
+                     'get_inputs': get_residualize_inputs,
+                     'outputs': ['Y_resid'],
+                     'tolerances': {'Y_resid': {'rtol': 1e-10, 'atol': 1e-12}}}),
+    ('encoding_varpart', {'reference': reference_impls.single_electrode_encoding_varpart,
+                          'candidate': get_function('intonation_encoding', 'single_electrode_encoding_varpart'),
+                          'get_inputs': get_encoding_inputs,
+                          'outputs': ['r2s', 'p_values', 'f_stats'],
+                          'tolerances': {'r2s': {'rtol': 1e-7, 'atol': 1e-10}, 'p_values': {'rtol': 1e-6, 'atol': 1e-14},
+                                         'f_stats': {'rtol': 1e-7, 'atol': 1e-10}, 'sig': exact},
+                          'derived': get_encoding_sig}),
+    ('invariance', {'reference': reference_impls.test_invariance,
+                    'candidate': get_function('intonation_invariance', 'test_invariance'),
+                    'get_inputs': get_invariance_inputs,
+                    'outputs': ['accs'],
+                    'tolerances': {'accs': {'rtol': 0, 'atol': 1e-12}}}),
+    ('psis', {'reference': reference_impls.get_psis,
+              'candidate': get_function('timit', 'get_psis'),
+              'get_inputs': get_psis_inputs,
+              'outputs': ['psis'],
+              'tolerances': {'psis': exact}}),
+])
+
+def to_output_dict(outputs, names):
+    """Returns a dict of output names and arrays from a function's return value (a tuple or a single array).
+    """
+    if isinstance(outputs, dict):
+        return OrderedDict((name, np.asarray(outputs[name])) for name in names)
+    if not isinstance(outputs, tuple):
+        outputs = (outputs,)
+    if len(outputs) != len(names):
+        raise ValueError("Expected " + str(len(names)) + " outputs (" + ", ".join(names) + "), got " + str(len(outputs)))
+    return OrderedDict((name, np.asarray(output)) for name, output in zip(names, outputs))
+
+def compare_arrays(reference, candidate, tolerance=None):
+    """Compares two arrays.
+
+    Args:
+        tolerance: "exact", or a dict with "rtol" and "atol". Defaults to ``default_tolerance``.
+
+    Returns:
+        (dict): with "passed", "shape" (reference and candidate shapes), "nan_mismatches" (number of positions that
+            are NaN in only one array), "mismatches" (number of values outside the tolerance), "max_abs_diff", and
+            "max_rel_diff"
+    """
+    if tolerance is None:
+        tolerance = default_tolerance
+    reference = np.asarray(reference)
+    candidate = np.asarray(candidate)
+    result = OrderedDict([('passed', False), ('shape', [list(reference.shape), list(candidate.shape)]),
+                          ('nan_mismatches', None), ('mismatches', None), ('max_abs_diff', None), ('max_rel_diff', None),
+                          ('tolerance', tolerance)])
+    if reference.shape != candidate.shape:
+        return result
+
+    if reference.dtype.kind in 'fc' or candidate.dtype.kind in 'fc':
+        reference_nan = np.isnan(reference)
+        candidate_nan = np.isnan(candidate)
+    else:
+        reference_nan = candidate_nan = np.zeros(reference.shape, dtype=bool)
+    result['nan_mismatches'] = int(np.sum(reference_nan != candidate_nan))
+
+    valid = ~reference_nan & ~candidate_nan
+    reference_valid = reference[valid].astype(float)
+    candidate_valid = candidate[valid].astype(float)
+    abs_diff = np.abs(reference_valid - candidate_valid)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel_diff = abs_diff / np.abs(reference_valid)
+    rel_diff[abs_diff == 0] = 0
+    result['max_abs_diff'] = float(np.max(abs_diff)) if abs_diff.size > 0 else 0.0
+    result['max_rel_diff'] = float(np.max(rel_diff)) if rel_diff.size > 0 else 0.0
+
+    if tolerance == exact:
+        mismatches = abs_diff != 0
+    else:
+        mismatches = abs_diff > tolerance['atol'] + tolerance['rtol'] * np.abs(reference_valid)
+    result['mismatches'] = int(np.sum(mismatches))
+    result['passed'] = result['nan_mismatches'] == 0 and result['mismatches'] == 0
+    return result
+
+def compare_outputs(reference, candidate, tolerances=None):
+    """Compares dicts of output names and arrays. Outputs missing from candidate fail.
+
+    Returns:
+        (OrderedDict): output names and the results of compare_arrays
+    """
+    if tolerances is None:
+        tolerances = {}
+    results = OrderedDict()
+    for name in reference:
+        if name not in candidate:
+            results[name] = OrderedDict([('passed', False), ('missing', True)])
+        else:
+            results[name] = compare_arrays(reference[name], candidate[name], tolerances.get(name, default_tolerance))
+    return results
+
+def get_case_outputs(case, func, inputs):
+    # functions get copies of the inputs, since some of the reference implementations change them in place.
+    args, kwargs = copy.deepcopy(inputs)
+    if callable(case['outputs']):
+        outputs = case['outputs'](func(*args, **kwargs))
+    else:
+        outputs = to_output_dict(func(*args, **kwargs), case['outputs'])
+    if 'derived' in case:
+        outputs.update(case['derived'](outputs))
+    return outputs
+
+def check_equivalence(case_name, candidate=None, reference=None, input_params=None, golden=None, tolerances=None):
+    """Runs the reference and candidate implementations of a case on the same inputs and compares their outputs.
+
+    Args:
+        case_name (str): key of ``cases``
+        candidate (function): implementation to check, with the same signature and outputs as the reference.
+            Defaults to the case's candidate implementation.
+        reference (function): defaults to the case's reference implementation
+        input_params (dict): keyword arguments of the case's get_inputs (e.g. n_chans, seed)
+        golden (str): filename of reference outputs saved with save_golden, used instead of running the reference
+        tolerances (dict): output names and tolerances, overriding the case's tolerances
+
+    Returns:
+        (OrderedDict): with "case", "passed", and "outputs" (see compare_outputs)
+    """
+    case = cases[case_name]
+    inputs = case['get_inputs'](**(input_params or {}))
+    if golden is not None:
+        reference_outputs = result_store.load_results(golden, matlab_shapes=False)
+    else:
+        reference_outputs = get_case_outputs(case, reference or case['reference'], inputs)
+    candidate_outputs = get_case_outputs(case, candidate or case['candidate'], inputs)
+
+    case_tolerances = dict(case['tolerances'])
+    case_tolerances.update(tolerances or {})
+    results = compare_outputs(reference_outputs, candidate_outputs, case_tolerances)
+    return OrderedDict([('case', case_name), ('passed', all(r['passed'] for r in results.values())), ('outputs', results)])
+
+def save_golden(case_name, filename, input_params=None, reference=None):
+    """Runs the reference implementation of a case and saves its outputs (in the "npy" format of result_store).
+    """
+    case = cases[case_name]
+    outputs = get_case_outputs(case, reference or case['reference'], case['get_inputs'](**(input_params or {})))
+    return result_store.save_results(filename, outputs, format='npy')
+
+def compare_results_files(reference_filename, candidate_filename, tolerances=None, variable_names=None):
+    """Compares results saved with result_store (or scipy.io.savemat), e.g. from the real data.
+
+    Returns:
+        (OrderedDict): with "passed" and "outputs" (see compare_outputs)
+    """
+    reference = result_store.load_results(reference_filename, variable_names=variable_names)
+    candidate = result_store.load_results(candidate_filename, variable_names=variable_names)
+    results = compare_outputs(reference, candidate, tolerances)
+    return OrderedDict([('case', reference_filename), ('passed', all(r['passed'] for r in results.values())), ('outputs', results)])
+
+def format_report(report):
+    """Returns a text table of a report from check_equivalence or compare_results_files.
+    """
+    lines = [str(report['case']) + ': ' + ('passed' if report['passed'] else 'FAILED')]
+    for name, result in report['outputs'].items():
+        if result.get('missing'):
+            lines.append("  {:<12} missing from candidate".format(name))
+            continue
+        if result['nan_mismatches'] is None:
+            lines.append("  {:<12} FAILED shapes differ: {} vs {}".format(name, result['shape'][0], result['shape'][1]))
+            continue
+        lines.append("  {:<12} {:<6} mismatches {:d}, NaN mismatches {:d}, max abs diff {:.3g}, max rel diff {:.3g}, tolerance {}".format(
+            name, 'ok' if result['passed'] else 'FAILED', result['mismatches'], result['nan_mismatches'],
+            result['max_abs_diff'], result['max_rel_diff'], result['tolerance']))
+    return "\n".join(lines)
+
+def write_report(reports, filename):
+    """Writes a list of reports as json.
+    """
+    with open(filename, 'w') as f:
+        json.dump(reports, f, indent=1)
+
+def check_all(names=None, verbose=True):
+    """Checks the candidate implementation of each case against its reference implementation.
+
+    Args:
+        names (list): cases to check, defaults to all
+
+    Returns:
+        (list): reports of check_equivalence. Cases that could not be run (e.g. missing optional dependencies)
+            have an "error" instead of "outputs".
+    """
+    if names is None:
+        names = list(cases)
+    reports = []
+    for name in names:
+        try:
+            report = check_equivalence(name)
+        except ImportError as e:
+            report = OrderedDict([('case', name), ('passed', None), ('error', str(e))])
+            if verbose:
+                print(name + ": skipped (" + str(e) + ")")
+        else:
+            if verbose:
+                print(format_report(report))
+        reports.append(report)
+    return reports
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checks the intonatang analyses against the published implementations.")
+    parser.add_argument('--only', nargs='+', choices=list(cases), help="cases to check")
+    parser.add_argument('--output', help="save the reports to this json file")
+    args = parser.parse_args(argv)
+
+    reports = check_all(names=args.only)
+    if args.output is not None:
+        write_report(reports, args.output)
+    return 1 if any(report['passed'] is False for report in reports) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,11 @@
 from __future__ import division, print_function, absolute_import
 
 import numpy as np
-import matplotlib.pyplot as plt
 import pandas as pd
 
+from .lazy_imports import lazy_import
+plt = lazy_import('matplotlib.pyplot')
+
 def reshape_grid(x, channel_order=None):
     """Takes an array of 256 values and returns a 2d array that can be matshow-ed
 
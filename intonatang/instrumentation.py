@@ -0,0 +1,157 @@
+"""Opt-in timing and memory instrumentation of the main analysis functions.
+
+Functions decorated with ``instrument`` (e.g. ``run_ridge_regression``, ``get_dstim``,
+``single_electrode_encoding_varpart``, ``test_invariance``, ``get_timelocked_activity``) record, while
+instrumentation is enabled:
+
+* the number of calls
+* total, mean, and max wall time per call
+* the peak resident set size (RSS) of the process after the calls, and how much calls raised it
+
+Instrumentation is disabled by default, in which case decorated functions only check one flag before running.
+Enable it with ``enable()`` or by setting the INTONATANG_INSTRUMENT environment variable before importing intonatang.
+If INTONATANG_INSTRUMENT is set to a filename ending in .json or .csv (instead of "1"), the report is written to
+that file when the process exits. Reports can also be written with ``write_report``::
+
+    from intonatang import instrumentation
+    instrumentation.enable()
+    ...
+    instrumentation.write_report('report.json')
+
+Times are inclusive, i.e. the time of ``run_ridge_regression`` includes time spent in functions it calls. Only
+calls in the current process are recorded, so run with one worker (e.g. ``n_workers=1``) to include work that is
+otherwise done in worker processes.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+import platform
+import functools
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+enabled = False
+stats = OrderedDict()
+started = time.time()
+
+report_fields = ['name', 'calls', 'total_time', 'mean_time', 'max_time', 'peak_rss_mb', 'rss_growth_mb']
+
+def enable():
+    global enabled
+    enabled = True
+
+def disable():
+    global enabled
+    enabled = False
+
+def reset():
+    """Clears all recorded statistics.
+    """
+    global started
+    stats.clear()
+    started = time.time()
+
+def get_peak_rss_mb():
+    """Returns the peak RSS of this process in MB, or NaN if it is not available on this platform.
+    """
+    if resource is None:
+        return np.NaN
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    if sys.platform == 'darwin':
+        return max_rss / 2**20
+    return max_rss / 2**10
+
+def record(name, elapsed, rss_before, rss_after):
+    if name not in stats:
+        stats[name] = {'calls': 0, 'total_time': 0.0, 'max_time': 0.0, 'peak_rss_mb': np.NaN, 'rss_growth_mb': 0.0}
+    entry = stats[name]
+    entry['calls'] += 1
+    entry['total_time'] += elapsed
+    entry['max_time'] = max(entry['max_time'], elapsed)
+    entry['peak_rss_mb'] = rss_after if np.isnan(entry['peak_rss_mb']) else max(entry['peak_rss_mb'], rss_after)
+    if rss_after > rss_before:
+        entry['rss_growth_mb'] += rss_after - rss_before
+
+def instrument(func):
+    """Decorator that records calls to func while instrumentation is enabled.
+    """
+    name = func.__module__.split('.')[-1] + '.' + func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not enabled:
+            return func(*args, **kwargs)
+        rss_before = get_peak_rss_mb()
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.time() - start, rss_before, get_peak_rss_mb())
+    return wrapper
+
+def get_report():
+    """Returns the recorded statistics with information about the run.
+
+    Returns:
+        (dict): with keys "info" (start time, duration, command line, platform, and library versions) and "functions"
+            (list of dicts with the keys in ``report_fields``, sorted by total time)
+    """
+    functions = []
+    for name, entry in stats.items():
+        row = dict(entry)
+        row['name'] = name
+        row['mean_time'] = entry['total_time'] / entry['calls']
+        functions.append(OrderedDict((field, row[field]) for field in report_fields))
+    functions.sort(key=lambda row: -row['total_time'])
+    info = OrderedDict([('started', time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started))),
+                        ('duration', time.time() - started),
+                        ('argv', list(sys.argv)),
+                        ('python', platform.python_version()),
+                        ('numpy', np.__version__),
+                        ('platform', platform.platform()),
+                        ('peak_rss_mb', get_peak_rss_mb())])
+    return OrderedDict([('info', info), ('functions', functions)])
+
+def write_report(filename):
+    """Writes the report to filename, as json or, if filename ends in .csv, as csv with one row per function.
+    """
+    report = get_report()
+    if filename.endswith('.csv'):
+        with open(filename, 'w') as f:
+            writer = csv.DictWriter(f, fieldnames=report_fields)
+            writer.writeheader()
+            for row in report['functions']:
+                writer.writerow(row)
+    else:
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=1)
+
+def print_report():
+    report = get_report()
+    width = max([len(row['name']) for row in report['functions']] + [4])
+    print("{} {:>8} {:>10} {:>10} {:>10} {:>10}".format("name".ljust(width), "calls", "total (s)", "mean (s)", "max (s)", "rss (MB)"))
+    for row in report['functions']:
+        print("{} {:8d} {:10.3f} {:10.4f} {:10.4f} {:10.1f}".format(row['name'].ljust(width), row['calls'], row['total_time'],
+                                                                 row['mean_time'], row['max_time'], row['peak_rss_mb']))
+
+def write_report_at_exit(filename):
+    atexit.register(write_report, filename)
+
+env_setting = os.environ.get('INTONATANG_INSTRUMENT', '')
+if env_setting not in ('', '0'):
+    enable()
+    if env_setting.endswith('.json') or env_setting.endswith('.csv'):
+        write_report_at_exit(env_setting)
@@ -0,0 +1,477 @@
+"""Plots of the intonation encoding results and of single electrode responses (Plotter).
+
+The plotting functions are kept separate from the analyses so that the analysis modules can be imported (e.g. in
+pool workers) without matplotlib. intonatang re-exports them, so ``tang.Plotter`` etc. still work.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+brain_data_path = os.path.join(os.path.dirname(__file__), 'data', 'brain_imaging')
+
+import numpy as np
+import scipy.io as sio
+
+from .intonation_stims import get_continuous_pitch_and_intensity
+from .intonation_encoding import get_vars_for_pie_chart_for_subject_number
+from .results_dataset import ResultsDataset
+from .lazy_imports import lazy_import
+
+def set_plot_style():
+    import matplotlib
+    matplotlib.rcParams.update({'font.size': 14})
+
+plt = lazy_import('matplotlib.pyplot', on_import=set_plot_style)
+mpimg = lazy_import('matplotlib.image', on_import=set_plot_style)
+seaborn = lazy_import('seaborn', on_import=set_plot_style)
+cycler = lazy_import('cycler')
+
+def plot_encoding_summary(ax):
+    r_mean_all, r_max_all, cat_all, abs_r2s, rel_r2s = ResultsDataset().load_all_data()
+
+    for i in range(3):
+        ax.bar((10*i)+np.arange(7), np.mean(r_mean_all[cat_all == i], axis=0))
+
+def plot_r2_single_electrode_encoding_all_subsets(centers, r2s, chan, ylabel="adj-r2", ylim=None):
+    seaborn.set_context("talk", font_scale=2)
+    
+    colors = ['#0051e7','#d5cc00','#d9102e','#009f63','#a200fc','#ff9718','#000000']
+    fig, ax = plt.subplots(1,1,figsize=(8,6))
+    ax.set_prop_cycle(cycler.cycler('color', colors) +
+                    cycler.cycler('lw', [3, 3, 3, 1, 1, 1, 1]) + cycler.cycler('alpha', [1, 1, 1, 0.5, 0.5, 0.5, 0.5]))
+    hs = ax.plot(centers, r2s[chan,:,:])
+    ax.set(xlabel='Time (bins)', xlim=(-10, 300), ylabel=ylabel)
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    plt.legend(hs, ['sn', 'st', 'sp', 'sn st', 'sn sp', 'st sp', 'all'], loc='center left', bbox_to_anchor=(1,0.5))
+    return fig
+
+def plot_r2_single_electrode_encoding_single_subsets(centers, r2s, p_values, chan, ylim=None, yticks=None, mini=False):
+    if not mini: 
+        seaborn.set_context("talk")
+        fig, ax = plt.subplots(1,1,figsize=(8,4))
+        label_font_size=16
+    else:
+        seaborn.set_context("paper")
+        fig, ax = plt.subplots(1,1,figsize=(3,2))
+        label_font_size=16
+        
+    ax.locator_params(axis='y', nbins=7)
+
+    colors = ['#ff2f97','#5674ff','#3fd400']
+    ax.set_prop_cycle(cycler.cycler('color', colors) +
+                           cycler.cycler('lw', [1, 1, 1]) + cycler.cycler('alpha', [1, 1, 1]))
+    r = r2s[chan, :, :][ :, [1, 0, 2]]
+    p = p_values[chan,:,:][ :, [1, 0,2]]
+
+    centers = centers/100
+    hs = ax.plot(centers, r)
+    sig = p < 0.05/(256*101)
+    for r1, s in zip(r.T, sig.T):
+        c = np.copy(centers)
+        rplot = np.copy(r1)
+        c[~s] = np.NaN
+        rplot[~s] = np.NaN
+        ax.plot(c, rplot, linewidth=3)
+
+    ax.set(xlim=(-.25, 2.75))
+    ax.set_xlabel("Time (s)", fontsize=label_font_size)
+    ax.set_ylabel("Unique R2", fontsize=label_font_size)
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    if yticks is not None:
+        ax.set_yticks(yticks)
+    if not mini:
+        leg = ax.legend(hs, ['Intonation', 'Sentence', 'Speaker'], loc='center left', bbox_to_anchor=(1,0.5), fontsize=16)
+        for legobj in leg.legendHandles:
+            legobj.set_linewidth(3)
+        fig.tight_layout(rect=[0.05, 0.05, 0.68, 0.93])
+    else:
+        ax.set(yticklabels=[], xticklabels=[])
+    seaborn.despine()
+    return fig
+
+def plot_betas_intonation(centers, betas, p_values, chan, ylabel="Regression weight", xlabel='Time (s)', ylim=None, mini=False, control_stim=False):
+    if mini:
+        seaborn.set_context("paper")
+        fig, ax = plt.subplots(1,1,figsize=(3,2))
+        label_fontsize=16
+    else:
+        seaborn.set_context("talk")
+        fig, ax = plt.subplots(1,1,figsize=(12,5))
+        label_fontsize=16
+
+    ax.locator_params(axis='y', nbins=4)
+    colors = ['g', 'r', 'm']
+    ax.set_prop_cycle(cycler.cycler('color', colors))
+
+    if control_stim:
+        beta = betas[chan, :, :][ :, [5, 6, 7]]
+        p = p_values[chan,:,:][ :, [5, 6, 7]]
+    else:
+        beta = betas[chan, :, :][ :, [4, 5, 6]]
+        p = p_values[chan,:,:][ :, [4, 5, 6]]
+
+    centers = centers/100
+
+    hs = ax.plot(centers, beta)
+    sig = p < 0.05/101
+    for b, s in zip(beta.T, sig.T):
+        c = np.copy(centers)
+        bplot = np.copy(b)
+        c[~s] = np.NaN
+        bplot[~s] = np.NaN
+        ax.plot(c, bplot, linewidth=7)
+
+    ax.set(xlim=(-.15, 2.85))
+    ax.set_xlabel(xlabel, fontsize=label_fontsize)
+    ax.set_ylabel(ylabel, fontsize=label_fontsize)
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    if mini == False:
+        leg = ax.legend(hs, ['Question vs. Neutral', 'Emphasis 1 vs. Neutral', 'Emphasis 2 vs. Neutral'],
+                    loc='center left', bbox_to_anchor=(1,0.5), fontsize=label_fontsize)
+        for legobj in leg.legendHandles:
+            legobj.set_linewidth(10.0)    
+        fig.tight_layout(rect=[0.05, 0.05, 0.6, 0.93])
+    else:
+        ax.set(yticklabels=[], xticklabels=[])
+    seaborn.despine()
+    return fig
+
+def plot_betas_speakers(centers, betas, p_values, chan, ylabel="Regression weight", xlabel='Time (s)', ylim=None, mini=False, control_stim=False):
+    if mini:
+        seaborn.set_context("paper")
+        fig, ax = plt.subplots(1,1,figsize=(3,2))
+        label_fontsize=16
+    else:
+        seaborn.set_context("talk")
+        fig, ax = plt.subplots(1,1,figsize=(12,5))
+        label_fontsize=16
+
+    ax.locator_params(axis='y', nbins=4)
+    colors =  ['#7A0071', '#4f8ae0']
+    ax.set_prop_cycle(cycler.cycler('color', colors))
+
+    if control_stim:
+        beta = betas[chan, :, :][ :, [8, 9]]
+        p = p_values[chan,:,:][ :, [8, 9]]
+    else:
+        beta = betas[chan, :, :][ :, [7, 8]]
+        p = p_values[chan,:,:][ :, [7, 8]]
+
+    centers = centers/100
+
+    hs = ax.plot(centers, beta)
+    sig = p < 0.05/101
+    for b, s in zip(beta.T, sig.T):
+        c = np.copy(centers)
+        bplot = np.copy(b)
+        c[~s] = np.NaN
+        bplot[~s] = np.NaN
+        ax.plot(c, bplot, linewidth=7)
+
+    ax.set(xlim=(-.15, 2.85))
+    ax.set_xlabel(xlabel, fontsize=label_fontsize)
+    ax.set_ylabel(ylabel, fontsize=label_fontsize)
+    if ylim is not None:
+        ax.set_ylim(ylim)
+    if mini == False:
+        leg = ax.legend(hs, ['Pitch', 'Formant'],
+                    loc='center left', bbox_to_anchor=(1,0.5), fontsize=label_fontsize)
+        for legobj in leg.legendHandles:
+            legobj.set_linewidth(10.0)    
+        fig.tight_layout(rect=[0.05, 0.05, 0.6, 0.93])
+    else:
+        ax.set(yticklabels=[], xticklabels=[])
+    seaborn.despine()
+    return fig
+
+def plot_pie_chart_for_subject_number(subject_number, use_r2=True, alpha=None, on_brain=False):
+    stat_sums, radii = get_vars_for_pie_chart_for_subject_number(subject_number, use_r2=use_r2, alpha=alpha)
+    colors = ['#5674ff','#ff2f97','#3fd400', 'k', 'k', 'k', 'k']
+    fig, ax = plt.subplots(figsize=(10, 10))
+    if on_brain:
+        img, xy = get_brain_img_and_xy_for_subject_number(subject_number)
+        ax.imshow(img, cmap="Greys_r")
+        centers = xy.T
+    else:
+        centers = np.zeros((256, 2))
+        chan = 0
+        for i in range(16):
+            for j in range(16):
+                centers[chan] = [-1*i, j]
+                chan = chan+1
+    for chan in range(256):
+        if on_brain:
+            if np.sum(stat_sums[chan]) > 0:
+                ax.pie(stat_sums[chan]*10, colors=colors, radius=pie_chart_radius_by_subject_number[subject_number]*radii[chan],
+                    center=centers[chan], startangle=90, frame=True, wedgeprops={'linewidth':0})
+        else:
+            if np.sum(stat_sums[chan]) > 0:
+                ax.pie(stat_sums[chan]*10, colors=colors, radius=0.5*radii[chan],
+                    center=centers[chan], startangle=90, frame=True, wedgeprops={'linewidth':0})
+    ax.axis("off")
+    if on_brain:
+        for i, p in enumerate(np.sqrt(np.array([0.25, 0.5, 0.75, 1]))):
+            ax.pie([10.0, 2.0], colors=colors[::-1], radius=pie_chart_radius_by_subject_number[subject_number] * p,
+                  center=[img.shape[1]-120+(i*30), img.shape[0]-20], frame=True, wedgeprops={'linewidth':0})
+    return fig, ax, stat_sums
+
+pie_chart_radius_by_subject_number = {113: 10, 118: 14, 122: 11, 123: 11, 125: 11, 129: 12, 131:10, 137: 12, 142: 11, 143: 11}
+
+def get_brain_img_and_xy_for_subject_number(subject_number):
+    subject = 'EC' + str(subject_number)
+    img_path = os.path.join(brain_data_path, subject + '_brain2D.png')
+    img = mpimg.imread(img_path)
+    xy = sio.loadmat(os.path.join(brain_data_path, subject + '_elec_pos2D.mat'))['xy']
+    return img, xy
+
+def plot_electrode_position_on_brain(subject_number, chan=None, chans=None):
+    img, xy = get_brain_img_and_xy_for_subject_number(subject_number)
+    fig, ax = plt.subplots(figsize=(1, 0.6))
+    ax.axis("off")
+    ax.imshow(img, cmap="Greys_r")
+    if chan is not None:
+        ax.plot(xy[0][chan], xy[1][chan], 'ro', markersize=2)
+    if chans is not None:
+        for chan in chans:
+            ax.plot(xy[0][chan], xy[1][chan], 'ro', markersize=2)
+    return fig
+
+class Plotter():
+    sentence_type_labels = ['Neutral', 'Question', 'Emphasis 1', 'Emphasis 3']
+    sentence_number_labels = ['Humans value\ngenuine behavior', 
+                              'Movies demand\nminimal energy',
+                              'Lawyers give a\nrelevant opinion',
+                              'Reindeer are a\nvisual animal']
+    speaker_labels =['Low pitch/Low formant', 'High pitch/High formant', 'High pitch/Low formant']
+    labels = {'sentence_type': sentence_type_labels,
+              'sentence_number': sentence_number_labels,
+              'speaker': speaker_labels}    
+    def __init__(self, Y_mat, sentence_numbers, sentence_types, speakers, axes_kw=None):
+        self.n_chans = Y_mat.shape[0]
+        self.n_timepoints = Y_mat.shape[1]
+        self.n_conds = Y_mat.shape[2]
+        self.Y_mat = Y_mat
+        self.speakers = speakers
+        self.sentence_types = sentence_types
+        self.sentence_numbers = sentence_numbers
+        self.sexes = np.array([1 if s < 2 else 2 for s in self.speakers])
+        self.axes_kw = axes_kw
+       
+    def plot(self, chan, axes_by='sentence_number', traces_by='sentence_type', restrict_to=None,
+            restrict_trials_to=None, show_acoustics=False, all_individual_plots=False, axes_kw=None):
+        if axes_kw is not None:
+            self.axes_kw = axes_kw
+        Y_mat_chan = np.copy(self.Y_mat[chan, :, :])
+        c = {}        
+        c['speakers'] = np.copy(self.speakers)
+        c['sentence_types'] = np.copy(self.sentence_types)
+        c['sentence_numbers'] = np.copy(self.sentence_numbers)
+        c['sexs'] = np.copy(self.sexes)
+        extra_title = ""
+
+        if restrict_trials_to is not None:
+            min_trial = restrict_trials_to[0]
+            max_trial = restrict_trials_to[1]
+            indexes = np.zeros((self.n_conds))
+            indexes[min_trial:max_trial] = 1
+            indexes = indexes.astype(np.bool)
+            Y_mat_chan = Y_mat_chan[:, indexes]
+            c['speakers'] = c['speakers'][indexes]
+            c['sentence_types'] = c['sentence_types'][indexes]
+            c['sentence_numbers'] = c['sentence_numbers'][indexes]
+            c['sexs'] = c['sexs'][indexes]
+            extra_title = " trials: " + str(min_trial) + "-" + str(max_trial)
+        if restrict_to is not None:
+            if restrict_to[0] == 'sex':
+                indexes = np.array([s in restrict_to[1] for s in c['sexs']])
+            else:
+                indexes = np.array([s in restrict_to[1] for s in c[restrict_to[0] + 's']])
+            Y_mat_chan = Y_mat_chan[:, indexes]
+            c['speakers'] = c['speakers'][indexes]
+            c['sentence_types'] = c['sentence_types'][indexes]
+            c['sentence_numbers'] = c['sentence_numbers'][indexes]
+            c['sexs'] = c['sexs'][indexes]
+        
+        if all_individual_plots:
+            fig, ax = plt.subplots(3, 1, figsize=(12, 20), sharex=True)
+        else:
+            if axes_by == 'sentence_number':
+                fig, axs = plt.subplots(2, 2, figsize=(12,9), sharex=True, sharey=True)
+                legend_index = 4
+
+            if axes_by == "sentence_number_with_phonemes":
+                fig, axs = plt.subplots(4, 1, figsize=(2, 5), sharey=True, sharex=True)
+                legend_index = 10
+                axes_by = "sentence_number"
+                sentence_with_phonemes = True
+            else:
+                sentence_with_phonemes = False
+
+            if axes_by == 'sentence_type':
+                fig, axs = plt.subplots(2, 2, figsize=(12, 7), sharex=True, sharey=True)
+                legend_index = 2
+    
+            if axes_by == 'speaker':
+                fig, axs = plt.subplots(1, 3, figsize=(22, 6), sharex=True, sharey=True)
+                legend_index = 3
+     
+            if axes_by == 'sex':
+                fig, axs = plt.subplots(1, 2, figsize=(12, 4), sharex=True, sharey=True)
+                legend_index = 2
+                
+            if axes_by == 'none':
+                if show_acoustics:
+                    fig, axs = plt.subplots(2, 1, figsize=(12,10))
+                else:
+                    fig, axs = plt.subplots(1, 1, figsize=(12, 6))
+                    axs = np.array([axs])
+                legend_index = 1
+        
+        if sentence_with_phonemes is False:
+            fig.text(0.45, 0.04, 'Time (s)', ha='center', fontsize=24)
+            if axes_by == 'none':
+                if show_acoustics:
+                    fig.text(0.03, 0.28, 'Neural activity (high-gamma)', va='center', rotation='vertical', fontsize=24)
+                    if traces_by=='sentence_number':
+                        fig.text(0.03, 0.75, 'Amplitude contour', va='center', rotation='vertical', fontsize=24)
+                    elif traces_by == 'sentence_type':
+                        fig.text(0.03, 0.75, 'Pitch (Hz)', va='center', rotation='vertical', fontsize=24)
+                else:
+                    fig.text(0.03, 0.5, 'Neural activity (high-gamma)', va='center', rotation='vertical', fontsize=24)
+            else:
+                fig.text(0.03, 0.5, 'Neural activity (high-gamma)', va='center', rotation='vertical', fontsize=24)  
+            fig.text(0.45, 0.94, 'Channel: ' + str(chan) + ' ' + extra_title, ha='center', fontsize=24)
+
+        axs = axs.flatten()
+        for i, ax in enumerate(axs):
+            if self.axes_kw is not None:
+                ax.set(**self.axes_kw)
+
+            if traces_by == 'sentence_number':
+                j_range = 4
+                colors = ['navy', 'goldenrod', 'olivedrab', 'palevioletred']
+            elif traces_by == 'speaker':
+                j_range = 3
+                colors = ['b','g','c','r','m','y']
+            elif traces_by == 'sentence_type':
+                j_range = 4
+                colors = ['b','g','r','m']
+            elif traces_by == 'sex':
+                j_range = 2
+                colors = ['b', 'r']
+            
+            hs = []
+            for j in range(j_range):
+                if axes_by == 'none' and i == 0 and show_acoustics:
+                    xvals = np.arange(0, 2.2, 0.01)
+                    pitches, intensities = get_continuous_pitch_and_intensity()
+                    if traces_by == 'sentence_number':
+                        h1 = ax.plot(xvals, intensities[0] + 0, 'b')
+                        h2 = ax.plot(xvals, intensities[1] + 50, 'g')
+                        h3 = ax.plot(xvals, intensities[2] + 100, 'r')
+                        h4 = ax.plot(xvals, intensities[3] + 150, 'm') 
+                        ax.set_yticklabels([])
+                        hs = [h1[0], h2[0], h3[0], h4[0]]
+                        leg = ax.legend(hs, [Plotter.labels['sentence_number'][k].split()[0] for k in range(4)], fontsize=24, loc='center left', bbox_to_anchor=(1,0.5))
+                        for legobj in leg.legendHandles:
+                            legobj.set_linewidth(10.0)                              
+                    else:
+                        h1 = ax.plot(xvals, pitches[0], 'b')
+                        h2 = ax.plot(xvals, pitches[1], 'g')
+                        h3 = ax.plot(xvals, pitches[2], 'r')
+                        h4 = ax.plot(xvals, pitches[3], 'm')
+                        ax.plot(xvals, pitches[4], 'b')
+                        ax.plot(xvals, pitches[5], 'g')
+                        ax.plot(xvals, pitches[6], 'r')
+                        ax.plot(xvals, pitches[7], 'm')
+                        hs = [h1[0], h2[0], h3[0], h4[0]]
+                        leg = ax.legend(hs, [Plotter.labels['sentence_type'][k] for k in range(4)], fontsize=24, loc='center left', bbox_to_anchor=(1,0.5))
+                        for legobj in leg.legendHandles:
+                            legobj.set_linewidth(10.0)
+                        ax.set_yscale("log")
+                        ax.set_ylim((50,400))
+                        ax.set(yticks=[50, 100, 200, 400], yticklabels=[50, 100, 200, 400])
+                    ax.set_xlim((-0.25, 2.75))
+                else:
+                    if axes_by == 'none':
+                        ax.locator_params(axis='y', nbins=5)
+                        to_plot = Y_mat_chan[:, c[traces_by + 's'] == j+1]
+                    else:
+                        to_plot = Y_mat_chan[:, np.logical_and(c[axes_by + 's'] == i + 1, c[traces_by + 's'] == j+1)]    
+                    if to_plot.shape[1] > 0:
+                        hg_mean = np.nanmean(to_plot, 1)
+                        hg_ste = np.nanstd(to_plot, 1) / np.sqrt(to_plot.shape[1])   
+                        xvals = np.arange(0,len(hg_ste))/100 - 0.25
+                        if sentence_with_phonemes is False:
+                            h = ax.plot(xvals, hg_mean, color=colors[j])
+                            hs.append(h[0])
+
+                        ax.fill_between(xvals, hg_mean-hg_ste, hg_mean+hg_ste, color=colors[j], alpha=0.2)
+                        if axes_by == 'none':
+                            print()
+                            #ax.set_title('Total average')
+                        else:
+                            if sentence_with_phonemes is False:
+                                ax.set_title(Plotter.labels[axes_by][i])
+                        if i+1 == legend_index:
+                            if restrict_to != None and restrict_to[0] == traces_by:
+                                ax.legend(hs, [Plotter.labels[traces_by][k-1] for k in np.sort(np.array(restrict_to[1]))], fontsize=16, loc='center left', bbox_to_anchor=(1,0.5))
+                            else:
+                                leg = ax.legend(hs, [Plotter.labels[traces_by][k] for k in range(j_range)], fontsize=24, loc='center left', bbox_to_anchor=(1,0.5))
+                                for legobj in leg.legendHandles:
+                                    legobj.set_linewidth(10.0)  
+            ax.set(xlim=(-0.25, 2.75), xticks=[0, 0.5, 1, 1.5, 2, 2.5], xticklabels=['0', '0.5', '1', '1.5', '2', '2.5'])
+            if sentence_with_phonemes:
+                ax.locator_params(axis='y', nbins=5)
+
+        if 'sentence_number' in axes_by or axes_by == 'speaker':
+            fig.tight_layout(rect=[0.05, 0.05, 0.8, 0.93])
+        elif axes_by == 'none':
+            if traces_by == 'speaker':
+                fig.tight_layout(rect=[0.05, 0.05, 0.6, 0.93])
+            else:
+                fig.tight_layout(rect=[0.05, 0.05, 0.68, 0.93])
+        elif axes_by == 'sex' or axes_by == 'sentence_type':
+            fig.tight_layout(rect=[0.05, 0.05, 0.7, 0.93])
+
+        if sentence_with_phonemes:
+            axs = fig.get_axes()
+            ax = axs[0]
+            yticks = ax.get_yticks()
+            y_spacing = yticks[1]-yticks[0]
+            print(yticks)
+            print(y_spacing)
+            ax.set_ylim([yticks[0]+0.4*y_spacing, yticks[-1]+0.4*y_spacing])
+            for ax in axs:
+                for x in [0, 0.56, 1.08, 1.65, 2.2]:
+                    ax.axvline(x=x, color='gray', alpha =0.8)
+                for x in [0.26, 0.75, 1.29, 1.42, 1.8, 2.0]:
+                    ax.axvline(x=x, color='gray', alpha =0.2)
+
+        return fig
+
+    def add_phoneme_onset_marks(self, fig, phoneme_class):
+        axs = fig.get_axes()
+
+        if phoneme_class == "plosive":
+            onsets_all = [[1.08, 1.80], [0.56, 1.02, 2], [0.56, 1.78], [0.26]]
+        elif phoneme_class == "fricative":
+            onsets_all = [[0, 0.48, 0.56, 2.0], [0.26, 0.48], [0.48, 1.42], [1.08, 1.29]]
+        elif phoneme_class == "back":
+            onsets_all = [[0.65, 1.14, 1.83],[0.82],[0.06, 1.14],[0.06, 0.56, 1.65]]
+        elif phoneme_class == "front":
+            onsets_all = [[1.67], [0.34,0.62,1.18,2.04], [0.63,1.83], [0.4, 1.17]]
+        elif phoneme_class == "nasal":
+            onsets_all =[[0.26], [0, 0.75, 1.08,1.42, 1.8], [2.0], [1.80, 2.0]]
+
+        for ax, onsets in zip(axs, onsets_all):
+            ylim = ax.get_ylim()
+            line_ymin = ylim[0] + 0.75*(ylim[1] - ylim[0])
+            line_ymax = ylim[0] + 0.9*(ylim[1] - ylim[0])
+            for onset in onsets:
+                ax.axes.plot([onset, onset], [line_ymin, line_ymax], color='k')
+        
+        return fig
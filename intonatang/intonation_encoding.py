@@ -4,10 +4,13 @@ import os
 results_path = os.path.join(os.path.dirname(__file__), 'results')
 
 import numpy as np
-import statsmodels.formula.api as sm
-import scipy.io as sio
 from scipy.stats import f
 
+from . import result_store
+from .instrumentation import instrument
+from .lazy_imports import lazy_import
+sm = lazy_import('statsmodels.formula.api')
+
 default_which_chans = np.arange(256)
 
 def single_electrode_encoding(Y_mat, xs, which_chans=default_which_chans, use_adj_r2=True, return_weights=False):
@@ -42,6 +45,7 @@ def single_electrode_encoding(Y_mat, xs, which_chans=default_which_chans, use_ad
     else:
         return r2s_adj, p_values
 
+@instrument
 def single_electrode_encoding_all_weights(Y_mat, sns, sts, speakers, which_chans=default_which_chans, control_stim=False):
     """Returns weights for encoding when using all groups of predictors
     """
@@ -68,17 +72,20 @@ def single_electrode_encoding_all_weights(Y_mat, sns, sts, speakers, which_chans
 
     return f_values, f_p_values, betas, betas_p_values, r2
 
-def save_encoding_results_all_weights(subject_number, f, fp, b, bp, r2, control_stim=False):
+def get_encoding_results_all_weights_filename(subject_number, control_stim=False):
     control_string = "_control" if control_stim else ""
-    filename = os.path.join(results_path, 'EC' + str(subject_number) + '_encoding_full_model' + control_string + '.mat')
-    sio.savemat(filename, {'f': f, 'fp': fp, 'b': b, 'bp': bp, 'r2':r2})
+    return os.path.join(results_path, 'EC' + str(subject_number) + '_encoding_full_model' + control_string + '.mat')
+
+def save_encoding_results_all_weights(subject_number, f, fp, b, bp, r2, control_stim=False):
+    filename = get_encoding_results_all_weights_filename(subject_number, control_stim=control_stim)
+    result_store.save_results(filename, {'f': f, 'fp': fp, 'b': b, 'bp': bp, 'r2':r2})
 
 def load_encoding_results_all_weights(subject_number, control_stim=False):
-    control_string = "_control" if control_stim else ""
-    filename = os.path.join(results_path, 'EC' + str(subject_number) + '_encoding_full_model' + control_string + '.mat')
-    data = sio.loadmat(filename)
+    filename = get_encoding_results_all_weights_filename(subject_number, control_stim=control_stim)
+    data = result_store.load_results(filename)
     return data['f'], data['fp'], data['b'], data['bp'], data['r2']
 
+@instrument
 def single_electrode_encoding_varpart(Y_mat, sns, sts, sps, which_chans=default_which_chans, use_adj_r2=True, control_stim=False):
     """Returns unique variance of each group of predictors, must use xs from get_xs_dummy_code_varpart
     
@@ -144,22 +151,49 @@ def single_electrode_encoding_varpart(Y_mat, sns, sts, sps, which_chans=default_
         p_values[:, :, i] = f.sf(fstat, m, N-k-1)
     return r2s_varpart, p_values, f_stats
 
-def save_encoding_results(subject_number, r2s, p_values, f_stats, varpart=True, control_stim=False):
+def get_encoding_results_filename(subject_number, varpart=True, control_stim=False):
     varpart_string = "_varpart" if varpart else ""
     control_string = "_control" if control_stim else ""
-    filename = os.path.join(results_path, 'EC' + str(subject_number) + '_encoding' + varpart_string + control_string + '.mat')
-    sio.savemat(filename, {'r2s': r2s, 'p_values': p_values, 'f_stats': f_stats})
+    return os.path.join(results_path, 'EC' + str(subject_number) + '_encoding' + varpart_string + control_string + '.mat')
+
+def save_encoding_results(subject_number, r2s, p_values, f_stats, varpart=True, control_stim=False):
+    filename = get_encoding_results_filename(subject_number, varpart=varpart, control_stim=control_stim)
+    result_store.save_results(filename, {'r2s': r2s, 'p_values': p_values, 'f_stats': f_stats})
 
 def load_encoding_results(subject_number, varpart=True, control_stim=False):
-    varpart_string = "_varpart" if varpart else ""
-    control_string = "_control" if control_stim else ""
-    filename = os.path.join(results_path, 'EC' + str(subject_number) + '_encoding' + varpart_string + control_string + '.mat')
-    data = sio.loadmat(filename)
+    filename = get_encoding_results_filename(subject_number, varpart=varpart, control_stim=control_stim)
+    data = result_store.load_results(filename)
     r2s = data['r2s']
     p_values = data['p_values']
     f_stats = data['f_stats']
     return r2s, p_values, f_stats
 
+def get_sig_elecs_from_full_model(subject_number, alpha=0.05/(256*101)):
+    f, fp, b, bp, total_r2 = load_encoding_results_all_weights(subject_number)
+    sig_elecs_times = fp < alpha
+    sig_elecs = np.sum(sig_elecs_times, axis=1) > 2
+    return np.arange(256)[sig_elecs]
+
+def get_vars_for_pie_chart_for_subject_number(subject_number, use_r2=True, alpha=None):
+    r2, p, f = load_encoding_results(subject_number)
+    _, fp, b, bp, total_r2 = load_encoding_results_all_weights(subject_number)
+    radii = np.nansum(total_r2, axis=1)
+    radii[radii < 0] = 0
+    radii = np.sqrt(radii)
+    radii = radii/np.max(radii)
+    if alpha is None:
+        alpha = 0.05/(256*101)
+    sig = fp < alpha
+    if use_r2:
+        stat = r2
+    else:
+        stat = f
+    stat_zeroed = np.copy(stat)
+    stat_zeroed[~sig] = 0
+    stat_sums = np.sum(stat_zeroed, axis=1)
+    stat_sums[stat_sums<0] = 0
+    return stat_sums, radii
+
 def encoding_varpart_permutation_test(Y_mat, sns, sts, sps, n_perms=250, which_chans=default_which_chans, use_adj_r2=True, control_stim=False):
     """Runs a permutation test on variance partitioning analysis by shuffling trials. Uses single_electrode_encoding_varpart.
     """
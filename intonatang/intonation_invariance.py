@@ -3,16 +3,21 @@ from __future__ import print_function, division, absolute_import
 import os
 results_path = os.path.join(os.path.dirname(__file__), 'results')
 
-import numpy as np
-import scipy.io as sio
-
-from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+import multiprocessing
 
-from tqdm import tqdm
+import numpy as np
 
 from .intonation_preanalysis import load_Y_mat_sns_sts_sps_for_subject_number
-
-def test_invariance_control(subject_number, solver="lsqr", shrinkage=1, n_perms=1000):
+from .permutation_stats import PermutationAccumulator
+from . import result_store
+from .instrumentation import instrument
+from .lazy_imports import lazy_import
+discriminant_analysis = lazy_import('sklearn.discriminant_analysis')
+tqdm = lazy_import('tqdm')
+
+@instrument
+def test_invariance_control(subject_number, solver="lsqr", shrinkage=1, n_perms=1000, seed=None, n_workers=1,
+                            accumulate=False, reservoir_size=1000):
     """Run the LDA invariance analysis on nonspeech control data.
 
     This function contains the pipeline for the nonspeech invariance analysis. Here, we use LDA to fit a model on the 
@@ -25,6 +30,12 @@ def test_invariance_control(subject_number, solver="lsqr", shrinkage=1, n_perms=
         solver: The type of solver to use for LDA. Can be "svd" or "lsqr". Only "lsqr" supports shrinkage/regularization.
         shrinkage: The shrinkage parameter between 0 and 1. Default of 1 is diagonal LDA. 
         n_perms: The number of permutations for held out speech data to run.
+        seed: Base seed for the permutations. Each permutation draws from its own random stream derived from seed and
+            the permutation number, so accs does not depend on n_workers. If None, a seed is drawn from np.random.
+        n_workers: Number of processes to run the permutations on. If None, all cores are used.
+        accumulate: If True, accs is returned as a ``PermutationAccumulator`` with shape (n_chans x 3) that summarizes
+            the permutations (with accs_test as the observed values) instead of keeping all of them.
+        reservoir_size: Number of permutations the accumulator keeps for percentiles.
 
     Returns:
         (tuple):
@@ -42,66 +53,113 @@ def test_invariance_control(subject_number, solver="lsqr", shrinkage=1, n_perms=
     print(Y_mat.shape)
     n_chans, n_timepoints, n_trials = Y_mat.shape
 
-    if solver == "svd":
-        lda = LinearDiscriminantAnalysis()
-    elif solver == "lsqr":
-        lda = LinearDiscriminantAnalysis(solver=solver, shrinkage=shrinkage)
+    lda = get_lda(solver, shrinkage)
 
-    accs = np.zeros((n_chans, n_perms, 3))
+    accs = None if accumulate else np.zeros((n_chans, n_perms, 3))
     accs_test = np.zeros((n_chans))
 
     n_train_100 = len(sts)
-    n_test_100 = len(sts_c)
     n_train_80 = int(np.round(n_train_100*0.8))
     n_train_20 = n_train_100 - n_train_80
 
     ofs1 = sts
     ofs2 = sts_c
 
+    # trial x feature arrays of valid timepoints are built once for each channel.
+    Y_trains = get_valid_timepoint_data(Y_mat, bad_time_indexes)
+    Y_tests = get_valid_timepoint_data(Y_mat_c, bad_time_indexes)
+    n_valid = np.sum(~bad_time_indexes, axis=1)
+
     # calculate performance accuracy of speech-fit LDA model on nonspeech data for each chan.
     for chan in np.arange(n_chans):
-        Y_train = Y_mat[chan][~bad_time_indexes[chan]].T
-        Y_test = Y_mat_c[chan][~bad_time_indexes[chan]].T
-
-        if Y_train.shape[1] < 1 or Y_test.shape[1] < 1:
+        if n_valid[chan] < 1:
             accs_test[chan] = np.NaN
         else:
-            lda.fit(Y_train, ofs1)
-            accs_test[chan] = lda.score(Y_test, ofs2)
+            lda.fit(Y_trains[chan], ofs1)
+            accs_test[chan] = lda.score(Y_tests[chan], ofs2)
 
     # calculate distribution of performance accuracies on held on speech data, shuffled speech data, and shuffled nonspeech data.
-    for p in tqdm(np.arange(n_perms)):
-        rand_perm_train = np.random.permutation(n_train_100)
-        rand_perm_test = np.random.permutation(n_test_100)
+    perm_data = {'Y_trains': Y_trains, 'Y_tests': Y_tests, 'n_valid': n_valid, 'ofs1': ofs1, 'ofs2': ofs2,
+                 'n_train_80': n_train_80, 'n_train_20': n_train_20, 'solver': solver, 'shrinkage': shrinkage,
+                 'seed': get_base_seed(seed)}
+    perm_accs = iterate_permutation_tasks(test_invariance_control_perm, perm_data, np.arange(n_perms), n_workers=n_workers)
+    if accumulate:
+        accs = PermutationAccumulator((n_chans, 3), observed=accs_test[:, None], reservoir_size=reservoir_size,
+                                      seed=perm_data['seed'])
+        accs.update_all(perm_accs)
+    else:
+        for p, perm_acc in enumerate(perm_accs):
+            accs[:, p, :] = perm_acc
 
-        shuffle_train = np.random.permutation(n_train_100)
-        shuffle_test = np.random.permutation(n_test_100)
+    return accs, accs_test
 
-        for chan in np.arange(n_chans):
-            Y_train = Y_mat[chan][~bad_time_indexes[chan]].T
-            Y_test = Y_mat_c[chan][~bad_time_indexes[chan]].T
+def test_invariance_control_perm(p):
+    """Runs one permutation of ``test_invariance_control`` on the data set up by ``run_permutation_tasks``.
 
-            if Y_train.shape[1] < 1 or Y_test.shape[1] < 1:
-                accs[chan, p, :] = np.NaN
-            else:
-                # fit the model on a random 80% of the speech data.
-                lda.fit(Y_train[rand_perm_train][np.arange(n_train_80)], ofs1[rand_perm_train][np.arange(n_train_80)])
-
-                # use the remaining 20% to bootstrap a set with n_test_100 trials.
-                Y_speech_test = Y_train[rand_perm_train][np.arange(n_train_80, n_train_100)]
-                Y_speech_shuffle = Y_train[shuffle_train][np.arange(n_train_80, n_train_100)]
-                ofs1_test = ofs1[rand_perm_train][np.arange(n_train_80, n_train_100)]
-                sample_inds = np.random.randint(0, Y_speech_test.shape[0], size=(n_test_100))
-                Y_speech_test = Y_speech_test[sample_inds]
-                Y_speech_shuffle = Y_speech_shuffle[sample_inds]
-                ofs1_test = ofs1_test[sample_inds]
-
-                # save the performance accuracies
-                accs[chan, p, 0] = lda.score(Y_speech_test, ofs1_test)
-                accs[chan, p, 1] = lda.score(Y_speech_shuffle, ofs1_test)
-                accs[chan, p, 2] = lda.score(Y_test[shuffle_test], ofs2)
+    Returns:
+        accs (ndarray): shape is (n_chans x 3)
+    """
+    data = perm_data_store
+    Y_trains, Y_tests, n_valid, ofs1, ofs2 = data['Y_trains'], data['Y_tests'], data['n_valid'], data['ofs1'], data['ofs2']
+    n_train_80, n_train_20 = data['n_train_80'], data['n_train_20']
+    n_train_100 = len(ofs1)
+    n_test_100 = len(ofs2)
+    n_chans = len(Y_trains)
+
+    lda = get_lda(data['solver'], data['shrinkage'])
+    random_state = get_perm_random_state(data['seed'], p)
+    accs = np.zeros((n_chans, 3))
+
+    rand_perm_train = random_state.permutation(n_train_100)
+    rand_perm_test = random_state.permutation(n_test_100)
+
+    shuffle_train = random_state.permutation(n_train_100)
+    shuffle_test = random_state.permutation(n_test_100)
+
+    # fit the model on a random 80% of the speech data and hold out the remaining 20%.
+    fit_inds = rand_perm_train[:n_train_80]
+    held_out_inds = rand_perm_train[n_train_80:]
+    held_out_shuffle_inds = shuffle_train[n_train_80:]
+    ofs1_fit = ofs1[fit_inds]
+
+    # scoring the unshuffled nonspeech data against inversely shuffled labels gives the same accuracy
+    # as scoring shuffled data against ofs2, without gathering the rows for every channel.
+    ofs2_shuffle = np.empty_like(ofs2)
+    ofs2_shuffle[shuffle_test] = ofs2
 
-    return accs, accs_test
+    for chan in np.arange(n_chans):
+        if n_valid[chan] < 1:
+            accs[chan, :] = np.NaN
+        else:
+            Y_train = Y_trains[chan]
+            lda.fit(Y_train[fit_inds], ofs1_fit)
+
+            # use the held out 20% to bootstrap a set with n_test_100 trials.
+            sample_inds = random_state.randint(0, n_train_20, size=(n_test_100))
+            test_inds = held_out_inds[sample_inds]
+
+            # save the performance accuracies
+            accs[chan, 0] = lda.score(Y_train[test_inds], ofs1[test_inds])
+            accs[chan, 1] = lda.score(Y_train[held_out_shuffle_inds[sample_inds]], ofs1[test_inds])
+            accs[chan, 2] = lda.score(Y_tests[chan], ofs2_shuffle)
+
+    return accs
+
+def get_control_test_accs_filename(subject_number, chans=None, diagonal=True, missing_f0=False, zscore_to_silence=True, summary=False):
+    """Returns the path of the results saved by save_control_test_accs.
+    """
+    info_str = ""
+    if zscore_to_silence is False:
+        info_str = info_str + "_zscore_block"
+    if missing_f0:
+        info_str = info_str + "_missing_f0"
+    if diagonal:
+        info_str = info_str + "_diagonal"
+    if chans is not None:
+        info_str = info_str + "_chans"
+    if summary:
+        info_str = info_str + "_summary"
+    return os.path.join(results_path, 'EC' + str(subject_number) + '_control_test_accs' + info_str + '.mat')
 
 def save_control_test_accs(subject_number, accs, accs_test, chans=None, diagonal=True, missing_f0=False, zscore_to_silence=True):
     """Used to save the nonspeech control invariance analysis results. 
@@ -111,33 +169,31 @@ def save_control_test_accs(subject_number, accs, accs_test, chans=None, diagonal
     Args:
         subject_number: xxx in ECxxx
         accs (ndarray): shape is (n_chans x n_perms x 3). The last dimension contains accuracy values for held out 
-                speech data, shuffled speech data, and shuffled nonspeech data
+                speech data, shuffled speech data, and shuffled nonspeech data. If accs is a ``PermutationAccumulator``,
+                its summary is saved to a separate "_summary" file.
         accs_test (ndarray): shape is (n_chans). Contains accuracy value for nonspeech data. 
     
         diagonal (bool): whether the invariance analysis used a shrinkage of 1 and was diagonal LDA.
         missing_f0 (bool): missing f0 invariance analysis
     """
-    info_str = ""
-    if zscore_to_silence is False:
-        info_str = info_str + "_zscore_block"
-    if missing_f0:
-        info_str = info_str + "_missing_f0"
-    if diagonal:
-        info_str = info_str + "_diagonal"
-    if chans is not None:
-        info_str = info_str + "_chans"
-    filename = os.path.join(results_path, 'EC' + str(subject_number) + '_control_test_accs' + info_str + '.mat')
-    if chans is not None:
-        sio.savemat(filename, {'accs': accs, 'accs_test': accs_test, 'chans': chans})
+    if isinstance(accs, PermutationAccumulator):
+        mdict = accs.to_dict(prefix='perm_')
     else:
-        sio.savemat(filename, {'accs': accs, 'accs_test': accs_test})
+        mdict = {'accs': accs}
+    mdict['accs_test'] = accs_test
+    if chans is not None:
+        mdict['chans'] = chans
+    filename = get_control_test_accs_filename(subject_number, chans=chans, diagonal=diagonal, missing_f0=missing_f0,
+                                              zscore_to_silence=zscore_to_silence, summary=isinstance(accs, PermutationAccumulator))
+    result_store.save_results(filename, mdict)
 
-def load_control_test_accs(subject_number, chans=None, diagonal=True, missing_f0=False, zscore_to_silence=True):
+def load_control_test_accs(subject_number, chans=None, diagonal=True, missing_f0=False, zscore_to_silence=True, summary=False):
     """Used to load nonspeech control invariance analysis results.
 
     Args:
         subject_number: xxx in ECxxx
         diagonal (bool): whether the invariance analysis used a shrinkage of 1 and was diagonal LDA.
+        summary (bool): load results saved from a ``PermutationAccumulator``. accs is then returned as the accumulator.
 
     Returns:
         (tuple):
@@ -145,23 +201,18 @@ def load_control_test_accs(subject_number, chans=None, diagonal=True, missing_f0
                 speech data, shuffled speech data, and shuffled nonspeech data
             * **accs_test** (*ndarray*): shape is (n_chans). Contains accuracy value for nonspeech data. 
     """
-    info_str = ""
-    if zscore_to_silence is False:
-        info_str = info_str + "_zscore_block"
-    if missing_f0:
-        info_str = info_str + "_missing_f0"
-    if diagonal:
-        info_str = info_str + "_diagonal"
-    if chans is not None:
-        info_str = info_str + "_chans"
-    filename = os.path.join(results_path, 'EC' + str(subject_number) + '_control_test_accs' + info_str + '.mat')
-    data = sio.loadmat(filename)
+    filename = get_control_test_accs_filename(subject_number, chans=chans, diagonal=diagonal, missing_f0=missing_f0,
+                                              zscore_to_silence=zscore_to_silence, summary=summary)
+    data = result_store.load_results(filename)
+    accs = PermutationAccumulator.from_dict(data, prefix='perm_') if summary else data['accs']
     if chans is not None:
-        return data['accs'], data['accs_test'], data['chans']
+        return accs, data['accs_test'], data['chans']
     else:
-        return data['accs'], data['accs_test']
+        return accs, data['accs_test']
 
-def test_invariance_missing_f0(subject_number, solver="lsqr", shrinkage=1, n_perms=1000, zscore_to_silence=True, chans=None):
+@instrument
+def test_invariance_missing_f0(subject_number, solver="lsqr", shrinkage=1, n_perms=1000, zscore_to_silence=True, chans=None,
+                               seed=None, n_workers=1, accumulate=False, reservoir_size=1000):
     Y_mat, sns, sts, sps, Y_mat_plotter = load_Y_mat_sns_sts_sps_for_subject_number(subject_number, zscore_to_silence=zscore_to_silence)
     Y_mat_c, sns_c, sts_c, sps_c, Y_mat_plotter_c = load_Y_mat_sns_sts_sps_for_subject_number(subject_number, missing_f0_stim=True, zscore_to_silence=zscore_to_silence)
 
@@ -171,12 +222,9 @@ def test_invariance_missing_f0(subject_number, solver="lsqr", shrinkage=1, n_per
     print(Y_mat.shape)
     n_chans, n_timepoints, n_trials = Y_mat.shape
 
-    if solver == "svd":
-        lda = LinearDiscriminantAnalysis()
-    elif solver == "lsqr":
-        lda = LinearDiscriminantAnalysis(solver=solver, shrinkage=shrinkage)
+    lda = get_lda(solver, shrinkage)
 
-    accs = np.zeros((n_chans, n_perms, 6))
+    accs = None if accumulate else np.zeros((n_chans, n_perms, 6))
     accs_test = np.zeros((n_chans, 5))
 
     n_train_100 = len(sts)
@@ -192,70 +240,109 @@ def test_invariance_missing_f0(subject_number, solver="lsqr", shrinkage=1, n_per
     ofs4 = sts_c[sns_c == 4]
     ofs_tests = [ofs0, ofs1, ofs2, ofs3, ofs4]
 
+    Y_trains = get_valid_timepoint_data(Y_mat, bad_time_indexes)
+    Y_tests = get_valid_timepoint_data(Y_mat_c, bad_time_indexes)
+    n_valid = np.sum(~bad_time_indexes, axis=1)
+    sn_splits = [sns_c == sn for sn in np.arange(5)]
+
     for chan in np.arange(n_chans):
         if chans is None or chan in chans:
-            Y_train = Y_mat[chan][~bad_time_indexes[chan]].T
-
-            for sn in np.arange(5):
-                Y_test = Y_mat_c[chan][~bad_time_indexes[chan]].T[sns_c == sn]
-                ofs_test = ofs_tests[sn]
-
-                if Y_train.shape[1] < 1 or Y_test.shape[1] < 1:
-                    accs_test[chan, sn] = np.NaN
-                else:
-                    lda.fit(Y_train, ofs_train)
-                    accs_test[chan, sn] = lda.score(Y_test, ofs_test)
-
-    for p in tqdm(np.arange(n_perms)):
-        rand_perm_train = np.random.permutation(n_train_100)
-        shuffle_train = np.random.permutation(n_train_100)
-
-        shuffle_nonspeech1 = np.random.permutation(len(ofs1))
-        shuffle_nonspeech2 = np.random.permutation(len(ofs2))
-
-        for chan in np.arange(n_chans):
-            if chans is None or chan in chans:
-                Y_train = Y_mat[chan][~bad_time_indexes[chan]].T
-
-                if Y_train.shape[1] < 1 or Y_test.shape[1] < 1:
-                    accs[chan, p, :] = np.NaN
-                else:
-                    lda.fit(Y_train[rand_perm_train][np.arange(n_train_60)], ofs_train[rand_perm_train][np.arange(n_train_60)])
-                    Y_speech_test = Y_train[rand_perm_train][np.arange(n_train_60, n_train_100)]
-                    Y_speech_shuffle = Y_train[shuffle_train][np.arange(n_train_60, n_train_100)]
-                    ofs_train_test = ofs_train[rand_perm_train][np.arange(n_train_60, n_train_100)]
-
-                    sample_inds48 = np.random.randint(0, Y_speech_test.shape[0], size=(48))
-                    sample_inds96 = np.random.randint(0, Y_speech_test.shape[0], size=(96))
-                    Y_speech_test48 = Y_speech_test[sample_inds48]
-                    Y_speech_shuffle48 = Y_speech_shuffle[sample_inds48]
-                    ofs_train_test48 = ofs_train_test[sample_inds48]
-
-                    Y_speech_test96 = Y_speech_test[sample_inds96]
-                    Y_speech_shuffle96 = Y_speech_shuffle[sample_inds96]
-                    ofs_train_test96 = ofs_train_test[sample_inds96]
-
-                    accs[chan, p, 0] = lda.score(Y_speech_test48, ofs_train_test48)
-                    accs[chan, p, 1] = lda.score(Y_speech_shuffle48, ofs_train_test48)
-                    accs[chan, p, 2] = lda.score(Y_speech_test96, ofs_train_test96)
-                    accs[chan, p, 3] = lda.score(Y_speech_shuffle96, ofs_train_test96)
-
-                    Y_nonspeech1 = Y_mat_c[chan][~bad_time_indexes[chan]].T[sns_c == 1]
-                    Y_nonspeech2 = Y_mat_c[chan][~bad_time_indexes[chan]].T[sns_c == 2]
-                    ofs1_shuffle = ofs1[shuffle_nonspeech1]
-                    ofs2_shuffle = ofs2[shuffle_nonspeech2]
-
-                    accs[chan, p, 4] = lda.score(Y_nonspeech1, ofs1_shuffle)
-                    accs[chan, p, 5] = lda.score(Y_nonspeech2, ofs2_shuffle)
+            if n_valid[chan] < 1:
+                accs_test[chan, :] = np.NaN
+            else:
+                lda.fit(Y_trains[chan], ofs_train)
+                for sn in np.arange(5):
+                    accs_test[chan, sn] = lda.score(Y_tests[chan][sn_splits[sn]], ofs_tests[sn])
+
+    # nonspeech trials for the two scored missing f0 conditions are split out once for each channel.
+    Y_nonspeech1s = [np.ascontiguousarray(Y_test[sn_splits[1]]) for Y_test in Y_tests]
+    Y_nonspeech2s = [np.ascontiguousarray(Y_test[sn_splits[2]]) for Y_test in Y_tests]
+
+    perm_data = {'Y_trains': Y_trains, 'Y_nonspeech1s': Y_nonspeech1s, 'Y_nonspeech2s': Y_nonspeech2s,
+                 'n_valid': n_valid, 'ofs_train': ofs_train, 'ofs1': ofs1, 'ofs2': ofs2, 'chans': chans,
+                 'n_train_60': n_train_60, 'n_train_40': n_train_40, 'solver': solver, 'shrinkage': shrinkage,
+                 'seed': get_base_seed(seed)}
+    perm_accs = iterate_permutation_tasks(test_invariance_missing_f0_perm, perm_data, np.arange(n_perms), n_workers=n_workers)
+    if accumulate:
+        # speech accuracies and shuffled missing f0 accuracies are compared to the missing f0 conditions (sn 1 and 2)
+        # with the same number of trials.
+        accs = PermutationAccumulator((n_chans, 6), observed=accs_test[:, [1, 1, 2, 2, 1, 2]],
+                                      reservoir_size=reservoir_size, seed=perm_data['seed'])
+        accs.update_all(perm_accs)
+    else:
+        for p, perm_acc in enumerate(perm_accs):
+            accs[:, p, :] = perm_acc
 
     if chans is not None:
         return accs, accs_test, chans
     else:
         return accs, accs_test
 
-def test_invariance(Y_mat, sns, sts, sps, of_what="st", to_what="sn", n_perms=1000, solver="svd", shrinkage=1):
+def test_invariance_missing_f0_perm(p):
+    """Runs one permutation of ``test_invariance_missing_f0`` on the data set up by ``run_permutation_tasks``.
+
+    Returns:
+        accs (ndarray): shape is (n_chans x 6)
+    """
+    data = perm_data_store
+    Y_trains, Y_nonspeech1s, Y_nonspeech2s = data['Y_trains'], data['Y_nonspeech1s'], data['Y_nonspeech2s']
+    n_valid, ofs_train, ofs1, ofs2, chans = data['n_valid'], data['ofs_train'], data['ofs1'], data['ofs2'], data['chans']
+    n_train_60, n_train_40 = data['n_train_60'], data['n_train_40']
+    n_train_100 = len(ofs_train)
+    n_chans = len(Y_trains)
+
+    lda = get_lda(data['solver'], data['shrinkage'])
+    random_state = get_perm_random_state(data['seed'], p)
+    accs = np.zeros((n_chans, 6))
+
+    rand_perm_train = random_state.permutation(n_train_100)
+    shuffle_train = random_state.permutation(n_train_100)
+
+    shuffle_nonspeech1 = random_state.permutation(len(ofs1))
+    shuffle_nonspeech2 = random_state.permutation(len(ofs2))
+
+    fit_inds = rand_perm_train[:n_train_60]
+    held_out_inds = rand_perm_train[n_train_60:]
+    held_out_shuffle_inds = shuffle_train[n_train_60:]
+    ofs_train_fit = ofs_train[fit_inds]
+    ofs1_shuffle = ofs1[shuffle_nonspeech1]
+    ofs2_shuffle = ofs2[shuffle_nonspeech2]
+
+    for chan in np.arange(n_chans):
+        if chans is None or chan in chans:
+            if n_valid[chan] < 1:
+                accs[chan, :] = np.NaN
+            else:
+                Y_train = Y_trains[chan]
+                lda.fit(Y_train[fit_inds], ofs_train_fit)
+
+                sample_inds48 = random_state.randint(0, n_train_40, size=(48))
+                sample_inds96 = random_state.randint(0, n_train_40, size=(96))
+                test_inds48 = held_out_inds[sample_inds48]
+                test_inds96 = held_out_inds[sample_inds96]
+
+                accs[chan, 0] = lda.score(Y_train[test_inds48], ofs_train[test_inds48])
+                accs[chan, 1] = lda.score(Y_train[held_out_shuffle_inds[sample_inds48]], ofs_train[test_inds48])
+                accs[chan, 2] = lda.score(Y_train[test_inds96], ofs_train[test_inds96])
+                accs[chan, 3] = lda.score(Y_train[held_out_shuffle_inds[sample_inds96]], ofs_train[test_inds96])
+
+                accs[chan, 4] = lda.score(Y_nonspeech1s[chan], ofs1_shuffle)
+                accs[chan, 5] = lda.score(Y_nonspeech2s[chan], ofs2_shuffle)
+
+    return accs
+
+@instrument
+def test_invariance(Y_mat, sns, sts, sps, of_what="st", to_what="sn", n_perms=1000, solver="svd", shrinkage=1,
+                   seed=None, n_workers=1, accumulate=False, reservoir_size=1000):
+    """Tests whether LDA models of of_what conditions fit on all but one to_what condition generalize to the held out one.
+
+    Returns:
+        accs (ndarray): shape is (n_chans x n_to_conds x n_perms x 8). If accumulate is True, a
+            ``PermutationAccumulator`` with shape (n_chans x n_to_conds x 8) is returned instead, with the first
+            permutation's unshuffled accuracies as the observed values. Columns 0, 2, 4 and 6 are compared to
+            columns 0, 0, 4 and 4, and columns 1, 3, 5 and 7 to columns 1, 1, 5 and 5.
+    """
     bad_time_indexes = np.isnan(np.sum(Y_mat, axis=2))
-    Y_mat_orig = np.copy(Y_mat)
     condition_dict = {'st': sts, 'sn': sns, 'sp': sps}
     condition_labels = {'st':[1, 2, 3, 4], 'sn': [1,2,3,4], 'sp':[1,2,3]}
 
@@ -265,90 +352,116 @@ def test_invariance(Y_mat, sns, sts, sps, of_what="st", to_what="sn", n_perms=10
     n_chans, n_timepoints, n_trials = Y_mat.shape
     print(Y_mat.shape)
 
-    if solver == "svd":
-        lda = LinearDiscriminantAnalysis()
-    elif solver == "lsqr":
-        lda = LinearDiscriminantAnalysis(solver=solver, shrinkage=shrinkage)
-
     test_accs_distribution = False
 
+    # trial x feature arrays of valid timepoints are built once for each channel and then split by to_cond
+    # once for each condition, so the permutations only gather rows.
+    Y_chans = get_valid_timepoint_data(Y_mat, bad_time_indexes)
+    Y_resid_chans = get_valid_timepoint_data(Y_resid, bad_time_indexes)
+    n_valid = np.sum(~bad_time_indexes, axis=1)
+
+    cond_splits = {}
+    for to_cond in condition_labels[to_what]:
+        train_split = tos != to_cond
+        test_split = tos == to_cond
+        cond_splits[to_cond] = {'ofs1': ofs[train_split], 'ofs2': ofs[test_split],
+                                'Y_trains': get_split_data(Y_chans, train_split),
+                                'Y_tests': get_split_data(Y_chans, test_split),
+                                'Y_resid_trains': get_split_data(Y_resid_chans, train_split),
+                                'Y_resid_tests': get_split_data(Y_resid_chans, test_split)}
+
+    # each (to_cond, permutation) is one task with its own random stream.
+    perm_data = {'cond_splits': cond_splits, 'n_valid': n_valid, 'test_accs_distribution': test_accs_distribution,
+                 'solver': solver, 'shrinkage': shrinkage, 'seed': get_base_seed(seed)}
+    n_to_conds = len(condition_labels[to_what])
+    if accumulate:
+        # run permutations in order so that the first n_to_conds results (p == 0) give the observed values.
+        tasks = [(to_cond, p) for p in np.arange(n_perms) for to_cond in condition_labels[to_what]]
+    else:
+        tasks = [(to_cond, p) for to_cond in condition_labels[to_what] for p in np.arange(n_perms)]
+    perm_accs = iterate_permutation_tasks(test_invariance_perm, perm_data, tasks, n_workers=n_workers)
+
+    if accumulate:
+        first_accs = np.stack([next(perm_accs) for to_cond in condition_labels[to_what]], axis=1)
+        # each shuffled column is compared to its unshuffled counterpart: the held out training trials (columns 0 and 4)
+        # for 2 and 6 and the held out condition (columns 1 and 5) for 3 and 7.
+        observed = first_accs[:, :, [0, 1, 0, 1, 4, 5, 4, 5]]
+        accs = PermutationAccumulator((n_chans, n_to_conds, 8), observed=observed, reservoir_size=reservoir_size,
+                                      seed=perm_data['seed'])
+        accs.update(first_accs)
+        for p in np.arange(1, n_perms):
+            accs.update(np.stack([next(perm_accs) for to_cond in condition_labels[to_what]], axis=1))
+        perm_accs.close()
+        return accs
+
+    accs = np.zeros((n_chans, n_to_conds, n_perms, 8))
+    for (to_cond, p), perm_acc in zip(tasks, perm_accs):
+        accs[:, to_cond-1, p, :] = perm_acc
+
+    return accs
+
+def test_invariance_perm(task):
+    """Runs one (to_cond, permutation) task of ``test_invariance`` on the data set up by ``run_permutation_tasks``.
+
+    Returns:
+        accs (ndarray): shape is (n_chans x 8)
+    """
+    to_cond, p = task
+    data = perm_data_store
+    split = data['cond_splits'][to_cond]
+    n_valid = data['n_valid']
+    test_accs_distribution = data['test_accs_distribution']
+    ofs1, ofs2 = split['ofs1'], split['ofs2']
+    n_train_100 = len(ofs1)
+    n_test_100 = len(ofs2)
+    n_chans = len(n_valid)
+
     if test_accs_distribution:
-        accs = np.zeros((n_chans, len(condition_labels[to_what]), n_perms, 8))
-        for to_cond in tqdm(condition_labels[to_what]):
-            n_train_100 = int(np.sum(tos != to_cond))
-            n_test_100 = int(np.sum(tos == to_cond))
-            n_test_50 = int(np.round(n_test_100/2))
-            n1 = n_train_100 - n_test_50
-            ofs1 = ofs[tos != to_cond]
-            ofs2 = ofs[tos == to_cond]
-            for p in tqdm(np.arange(n_perms)):
-                rand_perm_train = np.random.permutation(n_train_100)
-                rand_perm_test = np.random.permutation(n_test_100)
-
-                shuffle_train = np.random.permutation(n_train_100)
-                shuffle_test = np.random.permutation(n_test_100)
-
-                for chan in np.arange(n_chans):
-                    Y_mat_chan = Y_mat[chan][~bad_time_indexes[chan]]
-                    Y_resid_chan = Y_resid[chan][~bad_time_indexes[chan]]
-
-                    if Y_mat_chan.shape[0] < 1:
-                        accs[chan, to_cond-1, p, :] = np.NaN
-                    else:
-                        Y_train = Y_mat_chan[:, tos != to_cond].T
-                        Y_resid_train = Y_resid_chan[:, tos != to_cond].T
-                        Y_test = Y_mat_chan[:, tos == to_cond].T
-                        Y_resid_test = Y_resid_chan[:, tos == to_cond].T
-                        
-                        lda.fit(Y_train[rand_perm_train][np.arange(n1)], ofs1[rand_perm_train][np.arange(n1)])
-                        accs[chan, to_cond-1, p, 0] = lda.score(Y_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[rand_perm_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 1] = lda.score(Y_test[rand_perm_test][np.arange(n_test_50)], ofs2[rand_perm_test][np.arange(n_test_50)])
-                        accs[chan, to_cond-1, p, 2] = lda.score(Y_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[shuffle_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 3] = lda.score(Y_test[rand_perm_test][np.arange(n_test_50)], ofs2[shuffle_test][np.arange(n_test_50)])
-
-                        lda.fit(Y_resid_train[rand_perm_train][np.arange(n1)], ofs1[rand_perm_train][np.arange(n1)])
-                        accs[chan, to_cond-1, p, 4] = lda.score(Y_resid_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[rand_perm_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 5] = lda.score(Y_resid_test[rand_perm_test][np.arange(n_test_50)], ofs2[rand_perm_test][np.arange(n_test_50)])
-                        accs[chan, to_cond-1, p, 6] = lda.score(Y_resid_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[shuffle_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 7] = lda.score(Y_resid_test[rand_perm_test][np.arange(n_test_50)], ofs2[shuffle_test][np.arange(n_test_50)])
+        n_test_50 = int(np.round(n_test_100/2))
+        n1 = n_train_100 - n_test_50
+    else:
+        n1 = n_train_100 - n_test_100
 
+    lda = get_lda(data['solver'], data['shrinkage'])
+    random_state = get_perm_random_state(data['seed'], to_cond, p)
+    accs = np.zeros((n_chans, 8))
+
+    rand_perm_train = random_state.permutation(n_train_100)
+    if test_accs_distribution:
+        rand_perm_test = random_state.permutation(n_test_100)
+    shuffle_train = random_state.permutation(n_train_100)
+    shuffle_test = random_state.permutation(n_test_100)
+
+    fit_inds = rand_perm_train[:n1]
+    ridge_inds = rand_perm_train[n1:]
+    ofs1_fit = ofs1[fit_inds]
+    ofs1_ridge = ofs1[ridge_inds]
+    ofs1_ridge_shuffle = ofs1[shuffle_train[n1:]]
+    if test_accs_distribution:
+        test_inds = rand_perm_test[:n_test_50]
+        ofs2_test = ofs2[test_inds]
+        ofs2_test_shuffle = ofs2[shuffle_test[:n_test_50]]
     else:
-        accs = np.zeros((n_chans, len(condition_labels[to_what]), n_perms, 8))
-        for to_cond in tqdm(condition_labels[to_what]):
-            n_train_100 = int(np.sum(tos != to_cond))
-            n_test_100 = int(np.sum(tos == to_cond))
-            n1 = n_train_100 - n_test_100
-            ofs1 = ofs[tos != to_cond]
-            ofs2 = ofs[tos == to_cond]
-
-            for p in tqdm(np.arange(n_perms)):
-                rand_perm_train = np.random.permutation(n_train_100)
-                shuffle_train = np.random.permutation(n_train_100)
-                shuffle_test = np.random.permutation(n_test_100)
-
-                for chan in np.arange(n_chans):
-                    Y_mat_chan = Y_mat[chan][~bad_time_indexes[chan]]
-                    Y_resid_chan = Y_resid[chan][~bad_time_indexes[chan]]
-
-                    if Y_mat_chan.shape[0] < 1:
-                        accs[chan, to_cond-1, p, :] = np.NaN
-                    else:
-                        Y_train = Y_mat_chan[:, tos != to_cond].T
-                        Y_resid_train = Y_resid_chan[:, tos != to_cond].T
-                        Y_test = Y_mat_chan[:, tos == to_cond].T
-                        Y_resid_test = Y_resid_chan[:, tos == to_cond].T
-
-                        lda.fit(Y_train[rand_perm_train][np.arange(n1)], ofs1[rand_perm_train][np.arange(n1)])
-                        accs[chan, to_cond-1, p, 0] = lda.score(Y_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[rand_perm_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 1] = lda.score(Y_test, ofs2) if p == 0 else np.NaN
-                        accs[chan, to_cond-1, p, 2] = lda.score(Y_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[shuffle_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 3] = lda.score(Y_test, ofs2[shuffle_test])
-
-                        lda.fit(Y_resid_train[rand_perm_train][np.arange(n1)], ofs1[rand_perm_train][np.arange(n1)])
-                        accs[chan, to_cond-1, p, 4] = lda.score(Y_resid_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[rand_perm_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 5] = lda.score(Y_resid_test, ofs2) if p == 0 else np.NaN
-                        accs[chan, to_cond-1, p, 6] = lda.score(Y_resid_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[shuffle_train][np.arange(n1, n_train_100)])
-                        accs[chan, to_cond-1, p, 7] = lda.score(Y_resid_test, ofs2[shuffle_test])
+        ofs2_shuffle = ofs2[shuffle_test]
+
+    for chan in np.arange(n_chans):
+        if n_valid[chan] < 1:
+            accs[chan, :] = np.NaN
+            continue
+
+        for Y_train, Y_test, offset in [(split['Y_trains'][chan], split['Y_tests'][chan], 0),
+                                        (split['Y_resid_trains'][chan], split['Y_resid_tests'][chan], 4)]:
+            Y_ridge = Y_train[ridge_inds]
+            lda.fit(Y_train[fit_inds], ofs1_fit)
+            accs[chan, offset] = lda.score(Y_ridge, ofs1_ridge)
+            accs[chan, offset+2] = lda.score(Y_ridge, ofs1_ridge_shuffle)
+            if test_accs_distribution:
+                Y_test_half = Y_test[test_inds]
+                accs[chan, offset+1] = lda.score(Y_test_half, ofs2_test)
+                accs[chan, offset+3] = lda.score(Y_test_half, ofs2_test_shuffle)
+            else:
+                accs[chan, offset+1] = lda.score(Y_test, ofs2) if p == 0 else np.NaN
+                accs[chan, offset+3] = lda.score(Y_test, ofs2_shuffle)
 
     return accs
 
@@ -358,21 +471,160 @@ def save_invariance_test_accs(subject_number, accs, test_accs_distribution=False
         info_str = info_str + "_single"
     if diagonal:
         info_str = info_str + "_diagonal"
+    if isinstance(accs, PermutationAccumulator):
+        info_str = info_str + "_summary"
+        mdict = accs.to_dict(prefix='perm_')
+    else:
+        mdict = {'accs': accs}
     filename = os.path.join(results_path, 'EC' + str(subject_number) + '_invariance_test_of_' + of_what + '_to_' + to_what + '_accs' + info_str + '.mat')
-    sio.savemat(filename, {'accs': accs})
+    result_store.save_results(filename, mdict)
 
-def load_invariance_test_accs(subject_number, test_accs_distribution=False, of_what="st", to_what="sn", diagonal=False):
+def load_invariance_test_accs(subject_number, test_accs_distribution=False, of_what="st", to_what="sn", diagonal=False, summary=False):
     info_str = ""
     if test_accs_distribution == False:
         info_str = info_str + "_single"
     if diagonal:
         info_str = info_str + "_diagonal"
+    if summary:
+        info_str = info_str + "_summary"
     filename = os.path.join(results_path, 'EC' + str(subject_number) + '_invariance_test_of_' + of_what + '_to_' + to_what + '_accs' + info_str + '.mat')
-    data = sio.loadmat(filename)
+    data = result_store.load_results(filename)
+    if summary:
+        return PermutationAccumulator.from_dict(data, prefix='perm_')
     return data['accs']
 
-def residualize(Y_mat, by):
-    Y_resid = np.copy(Y_mat)
-    for i, cond in enumerate(by):
-        Y_resid[:,:,i] = Y_mat[:,:,i] - np.nanmean(Y_mat[:,:,by==cond], axis=2)
-    return Y_resid
+def get_lda(solver="lsqr", shrinkage=1):
+    """Returns an unfit LinearDiscriminantAnalysis model. Only the "lsqr" solver uses shrinkage.
+    """
+    if solver == "svd":
+        return discriminant_analysis.LinearDiscriminantAnalysis()
+    elif solver == "lsqr":
+        return discriminant_analysis.LinearDiscriminantAnalysis(solver=solver, shrinkage=shrinkage)
+
+def get_base_seed(seed=None):
+    """Returns seed, or a new base seed drawn from np.random if seed is None (so np.random.seed still controls it).
+    """
+    if seed is None:
+        seed = np.random.randint(2**31 - 1)
+    return int(seed)
+
+def get_perm_random_state(seed, *task):
+    """Returns the RandomState for one permutation task.
+
+    The state is seeded with the base seed followed by the task's identifiers (e.g. condition and permutation number),
+    so every task has its own independent stream that does not depend on which process runs it or in what order.
+    """
+    return np.random.RandomState([int(seed)] + [int(t) for t in task])
+
+# data shared by the permutation tasks of one analysis, set in each process by init_perm_worker.
+perm_data_store = {}
+
+def init_perm_worker(perm_data):
+    perm_data_store.clear()
+    perm_data_store.update(perm_data)
+
+def run_permutation_tasks(perm_func, perm_data, tasks, n_workers=1):
+    """Runs perm_func on each task in tasks, either in this process or on a pool of worker processes.
+
+    perm_func must be a module-level function so that it can be sent to worker processes. It reads the shared
+    perm_data from ``perm_data_store``, which is only sent to each worker once, when the pool starts.
+
+    Args:
+        perm_func: function that takes a single task and returns its result
+        perm_data (dict): data shared by all tasks
+        tasks (list): one entry per task
+        n_workers (int): number of processes to use. 1 runs the tasks in this process and None uses all cores.
+
+    Returns:
+        (list): result of perm_func for each task, in the same order as tasks
+    """
+    return list(iterate_permutation_tasks(perm_func, perm_data, tasks, n_workers=n_workers))
+
+def iterate_permutation_tasks(perm_func, perm_data, tasks, n_workers=1):
+    """Same as ``run_permutation_tasks``, but yields each result in task order as soon as it is done, so results
+    can be summarized without holding all of them in memory.
+    """
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+
+    if n_workers == 1:
+        init_perm_worker(perm_data)
+        try:
+            for task in tqdm.tqdm(tasks):
+                yield perm_func(task)
+        finally:
+            perm_data_store.clear()
+    else:
+        pool = multiprocessing.Pool(n_workers, initializer=init_perm_worker, initargs=(perm_data,))
+        try:
+            for result in tqdm.tqdm(pool.imap(perm_func, tasks), total=len(tasks)):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+def get_valid_timepoint_data(Y_mat, bad_time_indexes):
+    """Returns a list with one contiguous trials x features array of valid timepoints for each channel.
+
+    Channels can have different numbers of valid timepoints, so the arrays are stored in a (ragged) list
+    rather than one padded ndarray. A channel without any valid timepoints gets an n_trials x 0 array.
+
+    Args:
+        Y_mat (ndarray): n_chans x n_timepoints x n_trials
+        bad_time_indexes (ndarray): boolean n_chans x n_timepoints, timepoints to exclude for each channel
+
+    Returns:
+        (list): n_chans ndarrays with shape n_trials x n_valid_timepoints
+    """
+    return [np.ascontiguousarray(Y_chan[~bad_chan].T) for Y_chan, bad_chan in zip(Y_mat, bad_time_indexes)]
+
+def get_split_data(Y_chans, split):
+    """Returns the trials in split (boolean or index array) from each channel in Y_chans as contiguous arrays.
+    """
+    return [np.ascontiguousarray(Y_chan[split]) for Y_chan in Y_chans]
+
+def get_group_means(Y_mat, by):
+    """Returns the NaN-aware mean over trials of Y_mat for each unique condition in by.
+
+    All condition means are computed at once as a matrix product of the (NaN-zeroed) data with a trials x conditions
+    one-hot matrix, divided by the number of non-NaN trials in each condition.
+
+    Args:
+        Y_mat (ndarray): ... x n_trials. The last dimension is trials.
+        by (ndarray): 1d array of condition labels with length n_trials
+
+    Returns:
+        (tuple):
+            * **conds** (*ndarray*): sorted unique condition labels (k)
+            * **means** (*ndarray*): shape is (... x k). Mean across trials of each condition, NaN where a condition
+                has no non-NaN trials.
+            * **cond_indexes** (*ndarray*): index into conds for each trial (n_trials)
+    """
+    conds, cond_indexes = np.unique(by, return_inverse=True)
+    one_hot = np.zeros((len(by), len(conds)))
+    one_hot[np.arange(len(by)), cond_indexes] = 1
+
+    nan_mask = np.isnan(Y_mat)
+    sums = np.dot(np.where(nan_mask, 0, Y_mat), one_hot)
+    counts = np.dot((~nan_mask).astype(one_hot.dtype), one_hot)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    means[counts == 0] = np.NaN
+    return conds, means, cond_indexes
+
+def residualize(Y_mat, by, inplace=False):
+    """Subtracts from each trial the mean across trials with the same condition in by.
+
+    Args:
+        Y_mat (ndarray): ... x n_trials. The last dimension is trials.
+        by (ndarray): 1d array of condition labels with length n_trials
+        inplace (bool): If True, Y_mat is overwritten with the residuals instead of allocating a new array.
+
+    Returns:
+        Y_resid (ndarray): same shape as Y_mat
+    """
+    conds, means, cond_indexes = get_group_means(Y_mat, by)
+    if inplace:
+        Y_mat -= means[..., cond_indexes]
+        return Y_mat
+    return Y_mat - means[..., cond_indexes]
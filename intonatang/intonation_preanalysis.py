@@ -4,13 +4,23 @@ import os
 processed_data_path = os.path.join(os.path.dirname(__file__), 'processed_neural_data')
 subject_data_path = os.path.join(os.path.dirname(__file__), 'data', 'subject_data')
 
+import logging
+
 import numpy as np
 from scipy.stats import zscore
 import scipy.io as sio
 
 from .intonation_subject_data import get_blocks_for_subject_number, get_stims_for_subject_number
 from .intonation_subject_data import get_sentence_numbers_sentence_types_speakers_for_stims_list
+from . import cache
+from . import result_store
+from .instrumentation import instrument
+
+logger = logging.getLogger(__name__)
 
+# Increment when a change to the preprocessing code changes the saved Y_mat files, so that cached files are recomputed.
+preprocessing_version = 1
+default_Y_mat_params = {'window': 6, 'step': None, 'back': 15, 'forward': 285, 'plotter_back': 25, 'plotter_forward': 275, 'hz': 100}
 
 def get_times_hg_for_subject_number(subject_number, only_good_trials=False, control_stim=False, missing_f0_stim=False, use_log_hg=False):
     """Used to process .mat data files, called by save_Y_mat_sns_sts_sps_for_subject_number
@@ -230,7 +240,8 @@ def save_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=False
     Y_mat is time-averaged data for encoding analysis. 
     Y_mat_plotter is full time series data for visualization and use with the Plotter.labels
 
-    To load the data that is saved, use load_Y_mat_sns_sts_sps_for_subject_number
+    To load the data that is saved, use load_Y_mat_sns_sts_sps_for_subject_number. To save both normalization
+    variants from one pass over the data, use save_Y_mats_for_subject_number.
 
     Args:
         subject_number (int): xx in ECxx
@@ -238,16 +249,149 @@ def save_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=False
         return_raw_data (bool): set to True to return (times, good_trials, hg, gcs) like get_times_hg_for_subject_number
         zscore_to_silence (bool): normalize neural data to pre-stimulus baseline rather than entire block
     """
+    return save_Y_mats_for_subject_number(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim,
+                                          return_raw_data=return_raw_data, zscore_to_silence=[zscore_to_silence])
+
+def save_Y_mats_for_subject_number(subject_number, control_stim=False, missing_f0_stim=False, return_raw_data=False, zscore_to_silence=(True, False),
+                                   use_log_hg=False, checksum=False, **Y_mat_params):
+    """Runs the pre-analysis processing pipeline once and saves the results for each normalization in zscore_to_silence.
+
+    The block data are loaded and epoched once (see get_Y_mats), and one file is saved for each value in 
+    zscore_to_silence, in the same format as save_Y_mat_sns_sts_sps_for_subject_number. The cache key of each file
+    (see get_Y_mat_cache_key) is saved next to it.
+
+    Args:
+        subject_number (int): xx in ECxx
+        control_stim (bool): set to True for non-speech control_stim
+        return_raw_data (bool): set to True to return (times, good_trials, hg, gcs) like get_times_hg_for_subject_number
+        zscore_to_silence (list of bools): normalizations to save. True normalizes neural data to pre-stimulus
+            baseline and False keeps the z-scoring to the entire block.
+        use_log_hg (bool): use log hg instead of hg. Files saved with log hg have "_log_hg" in their filename.
+        checksum (bool): use checksums of the block files for the cache keys
+        **Y_mat_params: passed to get_Y_mats (window, step, back, forward, plotter_back, plotter_forward, hz).
+            Parameters that differ from default_Y_mat_params are part of the filename (see get_Y_mat_filename), so
+            files saved with other parameters do not replace the default files.
+    """
     assert (control_stim and missing_f0_stim) is False
 
-    times, good_trials, hg, gcs = get_times_hg_for_subject_number(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim)
-    all_good_trials = get_all_good_trials(good_trials, control_stim=control_stim, missing_f0_stim=missing_f0_stim)
+    keys = [get_Y_mat_cache_key(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, zscore_to_silence=z,
+                                use_log_hg=use_log_hg, checksum=checksum, **Y_mat_params) for z in zscore_to_silence]
+
+    raw_data = get_times_hg_for_subject_number(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, use_log_hg=use_log_hg)
+    times, good_trials, hg, gcs = raw_data
     sns, sts, sps = get_sentence_numbers_sentence_types_speakers_for_subject_number(subject_number, good_trials, control_stim=control_stim, missing_f0_stim=missing_f0_stim)
-    Y_mat_plotter = get_concatenated_data(times, [hg_block[:256] for hg_block in hg], zscore=False, back=25, forward=275, zscore_to_silence=zscore_to_silence)
-    Y_mat_plotter = Y_mat_plotter[:, :, all_good_trials]
-    Y_mat, centers = get_time_averaged_data(times, [hg_block[:256] for hg_block in hg], zscore=False, zscore_to_silence=zscore_to_silence)
-    Y_mat = Y_mat[:, :, all_good_trials]
+    Y_mats = get_Y_mats(times, good_trials, hg, zscore_to_silence=zscore_to_silence, control_stim=control_stim, missing_f0_stim=missing_f0_stim, **Y_mat_params)
+
+    for zscore_to_silence_i, (key, description) in zip(zscore_to_silence, keys):
+        Y_mat, Y_mat_plotter = Y_mats[zscore_to_silence_i]
+        data =  {'Y_mat': Y_mat, 'Y_mat_plotter': Y_mat_plotter, 'sentence_numbers': sns, 'sentence_types': sts, 'speakers': sps}
+        filename = get_Y_mat_filename(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, zscore_to_silence=zscore_to_silence_i,
+                                      use_log_hg=use_log_hg, **Y_mat_params)
+        path = result_store.save_results(filename, data)
+        cache.write_cache_key(path, key, description)
+
+    if return_raw_data:
+        return raw_data
+
+def update_Y_mats_for_subject_number(subject_number, control_stim=False, missing_f0_stim=False, zscore_to_silence=(True, False),
+                                     use_log_hg=False, checksum=False, **Y_mat_params):
+    """Recomputes and saves only the Y_mat files that are missing or whose cache key no longer matches.
+
+    A saved file is out of date if any of the subject's block files or any preprocessing parameter changed since it
+    was saved. All out of date normalizations are recomputed together with save_Y_mats_for_subject_number.
+
+    Args:
+        same as save_Y_mats_for_subject_number
+
+    Returns:
+        (list): values of zscore_to_silence that were recomputed
+    """
+    invalid = []
+    for z in zscore_to_silence:
+        key, description = get_Y_mat_cache_key(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, zscore_to_silence=z,
+                                               use_log_hg=use_log_hg, checksum=checksum, **Y_mat_params)
+        path, format = result_store.find_results(get_Y_mat_filename(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, zscore_to_silence=z,
+                                                                    use_log_hg=use_log_hg, **Y_mat_params))
+        if path is None or not cache.is_cache_valid(path, key):
+            invalid.append(z)
+
+    if len(invalid) > 0:
+        logger.info('recomputing Y_mat for EC%s (zscore_to_silence: %s)', subject_number, invalid)
+        save_Y_mats_for_subject_number(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, zscore_to_silence=invalid,
+                                       use_log_hg=use_log_hg, checksum=checksum, **Y_mat_params)
+    return invalid
+
+def get_Y_mat_cache_key(subject_number, control_stim=False, missing_f0_stim=False, zscore_to_silence=True, use_log_hg=False, checksum=False, **Y_mat_params):
+    """Returns the cache key (and what was hashed) for a saved Y_mat file.
+
+    The key covers the signatures of all of the subject's block files (which contain hg, times, bcs, and
+    badTimeSegments), every preprocessing parameter, and preprocessing_version.
+
+    Returns:
+        (tuple): key and description, see cache.get_cache_key
+    """
+    blocks = get_blocks_for_subject_number(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim)
+    paths = [get_full_data_path_for_subject_number_and_block(subject_number, block) for block in blocks]
+
+    params = dict(default_Y_mat_params)
+    params.update(Y_mat_params)
+    params.update({'subject_number': subject_number, 'control_stim': control_stim, 'missing_f0_stim': missing_f0_stim,
+                   'zscore_to_silence': zscore_to_silence, 'use_log_hg': use_log_hg, 'version': preprocessing_version})
+    return cache.get_cache_key(paths, params, checksum=checksum)
 
+@instrument
+def get_Y_mats(times, good_trials, hg, zscore_to_silence=(True, False), control_stim=False, missing_f0_stim=False,
+               window=6, step=None, back=15, forward=285, plotter_back=25, plotter_forward=275, hz=100):
+    """Derives Y_mat and Y_mat_plotter for each normalization from a single epoch gather per block.
+
+    The widest epoch needed by either output is gathered once for each block. Y_mat_plotter is a slice of it and
+    Y_mat is its moving-window average (see get_time_averaged_data). The pre-stimulus baseline is computed once for
+    each block, and applied to both outputs for the zscore_to_silence normalization.
+
+    Args:
+        times, good_trials, hg: returned by get_times_hg_for_subject_number
+        zscore_to_silence (list of bools): normalizations to return
+        window, step, back, forward: moving-window parameters for Y_mat, see get_time_averaged_data
+        plotter_back, plotter_forward: number of samples before and after trial start for Y_mat_plotter
+
+    Returns:
+        (dict): (Y_mat, Y_mat_plotter) for each value in zscore_to_silence. Bad trials are removed.
+    """
+    centers = get_centers(back=back, forward=forward, window=window, step=step)
+    offsets = np.floor(centers - window/2).astype(int)
+    epoch_back = max(int(plotter_back), -int(offsets.min()))
+    epoch_forward = max(int(plotter_forward), int(offsets.max()) + int(window))
+    plotter_indexes = np.arange(epoch_back - int(plotter_back), epoch_back + int(plotter_forward))
+
+    Y_mats = dict((z, ([], [])) for z in zscore_to_silence)
+    for times_block, hg_block in zip(times, hg):
+        hg_block = hg_block[:256]
+        onsets = get_onset_indexes(times_block, hz=hz)
+        epochs = get_epochs(hg_block, onsets, back=epoch_back, forward=epoch_forward)
+        Y_mat = get_windowed_nanmean(epochs, offsets + epoch_back, window)
+        Y_mat_plotter = epochs[:, plotter_indexes]
+        if True in Y_mats:
+            baseline_mean, baseline_std = get_baseline_mean_and_std(hg_block, onsets)
+            baseline_mean = baseline_mean[:, np.newaxis, np.newaxis]
+            baseline_std = baseline_std[:, np.newaxis, np.newaxis]
+            Y_mats[True][0].append((Y_mat - baseline_mean)/baseline_std)
+            Y_mats[True][1].append((Y_mat_plotter - baseline_mean)/baseline_std)
+        if False in Y_mats:
+            Y_mats[False][0].append(Y_mat)
+            Y_mats[False][1].append(Y_mat_plotter)
+
+    all_good_trials = get_all_good_trials(good_trials, control_stim=control_stim, missing_f0_stim=missing_f0_stim)
+    for z, (Y_mat_blocks, Y_mat_plotter_blocks) in Y_mats.items():
+        Y_mats[z] = (np.concatenate(Y_mat_blocks, axis=2)[:, :, all_good_trials],
+                     np.concatenate(Y_mat_plotter_blocks, axis=2)[:, :, all_good_trials])
+    return Y_mats
+
+def get_Y_mat_filename(subject_number, control_stim=False, missing_f0_stim=False, zscore_to_silence=True, use_log_hg=False, **Y_mat_params):
+    """Returns the path of the .mat file saved by save_Y_mat_sns_sts_sps_for_subject_number.
+
+    Data from log hg get "_log_hg" and Y_mat_params that differ from default_Y_mat_params are added to the
+    filename, e.g. "_log_hg_window10_step5".
+    """
     base_string = "EC" + str(subject_number) + "_Y_mat"
     if zscore_to_silence:
         base_string = base_string + "_zscore_to_silence"
@@ -257,18 +401,24 @@ def save_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=False
         base_string = base_string + "_control"
     if missing_f0_stim:
         base_string = base_string + "_missing_f0"
-
-    data =  {'Y_mat': Y_mat, 'Y_mat_plotter': Y_mat_plotter, 'sentence_numbers': sns, 'sentence_types': sts, 'speakers': sps}
-    filename = os.path.join(processed_data_path, base_string + ".mat")
-    sio.savemat(filename, data)
-
-    if return_raw_data:
-        return times, good_trials, hg, gcs
-
-
-def load_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=False, missing_f0_stim=False, zscore_to_silence=True):
+    if use_log_hg:
+        base_string = base_string + "_log_hg"
+    for name in sorted(Y_mat_params):
+        if name not in default_Y_mat_params:
+            raise ValueError("Unknown Y_mat parameter " + name + " (choose from " + ", ".join(sorted(default_Y_mat_params)) + ")")
+        if Y_mat_params[name] != default_Y_mat_params[name]:
+            base_string = base_string + "_" + name + str(Y_mat_params[name])
+    return os.path.join(processed_data_path, base_string + ".mat")
+
+def load_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=False, missing_f0_stim=False, zscore_to_silence=True, validate=False, mmap_mode=None,
+                                              use_log_hg=False, **Y_mat_params):
     """Loads data for analysis from file saved by save_Y_mat_sns_sts_sps_for_subject_number
 
+    If validate is True, the file is first recomputed if it is missing or out of date
+    (see update_Y_mats_for_subject_number). For data saved in the "npy" format (see result_store), mmap_mode='r'
+    memory-maps Y_mat and Y_mat_plotter instead of reading them. Data saved with log hg or other Y_mat_params than
+    default_Y_mat_params (see save_Y_mats_for_subject_number) are loaded by passing the same use_log_hg and Y_mat_params.
+
     Returns:
         (tuple):
             * **Y_mat**: time averaged neural data for encoding analysis
@@ -279,20 +429,17 @@ def load_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=False
     """
     assert (control_stim and missing_f0_stim) is False
 
-    base_string = "EC" + str(subject_number) + "_Y_mat"
-    if zscore_to_silence:
-        base_string = base_string + "_zscore_to_silence"
-    else:
-        base_string = base_string + "_zscore_to_block"
-    if control_stim:
-        base_string = base_string + "_control"
-    if missing_f0_stim:
-        base_string = base_string + "_missing_f0"
+    if validate:
+        update_Y_mats_for_subject_number(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, zscore_to_silence=[zscore_to_silence],
+                                         use_log_hg=use_log_hg, **Y_mat_params)
 
-    filename = os.path.join(processed_data_path, base_string + ".mat")
-    data = sio.loadmat(filename)
+    filename = get_Y_mat_filename(subject_number, control_stim=control_stim, missing_f0_stim=missing_f0_stim, zscore_to_silence=zscore_to_silence,
+                                  use_log_hg=use_log_hg, **Y_mat_params)
+    data = result_store.load_results(filename, mmap_mode=mmap_mode)
 
-    assert data['Y_mat'].shape[1] == 101
+    params = dict(default_Y_mat_params)
+    params.update(Y_mat_params)
+    assert data['Y_mat'].shape[1] == len(get_centers(back=params['back'], forward=params['forward'], window=params['window'], step=params['step']))
     return data['Y_mat'], data['sentence_numbers'][0], data['sentence_types'][0], data['speakers'][0], data['Y_mat_plotter']
 
 def get_stg(subject_number, path='Imaging/elecs/', filename='TDT_elecs_all.mat'):
@@ -304,6 +451,7 @@ def get_stg(subject_number, path='Imaging/elecs/', filename='TDT_elecs_all.mat')
     stg= np.arange(256)[np.logical_and(data[:,3] == 'superiortemporal',data[:,2] == 'grid')]
     return stg
 
+@instrument
 def get_timelocked_activity(times, hg, zscore=True, hz=100, back=0, forward=250, zscore_to_silence=True):
     """Returns a n_chans x n_timepoints x n_trials matrix of high-gamma activity. 
 
@@ -313,49 +461,76 @@ def get_timelocked_activity(times, hg, zscore=True, hz=100, back=0, forward=250,
         back: number of time samples to take preceding trial start
         forward: number of time samples to take following trial start.
         zscore_to_silence: boolean, whether z-scoring should be done to a prestimulus baseline
+
+    Samples of a trial that fall outside of hg are NaN.
     """
     if zscore:
-        for i in np.arange(hg.shape[0]):
-            hg[i, ~np.isnan(hg[i])] = zscore(hg[i, ~np.isnan(hg[i])])
+        hg_mean = np.nanmean(hg, axis=1)[:, np.newaxis]
+        hg_std = np.nanstd(hg, axis=1)[:, np.newaxis]
+        hg[:] = (hg - hg_mean)/hg_std
 
-    Y_mat = np.zeros((hg.shape[0], int(back+forward), np.shape(times)[1]), dtype=float)
+    onsets = get_onset_indexes(times, hz=hz)
+    Y_mat = get_epochs(hg, onsets, back=back, forward=forward)
 
     if zscore_to_silence:
-        baseline = []
-        for i, seconds in enumerate(times[0]):
-            index = int(np.round(seconds*hz))
-            baseline.append(hg[:, index-30:index])
+        baseline_mean, baseline_std = get_baseline_mean_and_std(hg, onsets)
+        Y_mat = (Y_mat - baseline_mean[:, np.newaxis, np.newaxis])/baseline_std[:, np.newaxis, np.newaxis]
+    elif logger.isEnabledFor(logging.DEBUG):
+        for i in np.flatnonzero(np.isnan(Y_mat).any(axis=(0, 1))):
+            logger.debug('trial %d has %d NaN values', i, np.sum(np.isnan(Y_mat[:, :, i])))
 
-        baseline = np.concatenate(baseline, axis=1)
+    return Y_mat
 
-        baseline_mean = np.nanmean(baseline, axis=1)
-        baseline_std = np.nanstd(baseline, axis=1)
+def get_onset_indexes(times, hz=100):
+    """Returns the sample index of each trial start time in times[0] (seconds).
+    """
+    return np.round(np.asarray(times[0], dtype=float)*hz).astype(int)
 
-        print("baseline length: " + str(len(baseline[199])))
+def get_epoch_indexes(onsets, back=0, forward=250):
+    """Returns a n_trials x (back + forward) matrix with the sample indexes of each trial's epoch.
+    """
+    return np.asarray(onsets)[:, np.newaxis] + np.arange(-int(back), int(forward))[np.newaxis, :]
 
-        print("baseline_mean: " + str(baseline_mean[199]))
-        print("baseline_std: " + str(baseline_std[199]))
+def get_epochs(hg, onsets, back=0, forward=250):
+    """Gathers the epoch around each onset from hg in one indexing step.
 
-    for i, seconds in enumerate(times[0]):
-        index = int(np.round(seconds * hz))
-        if zscore_to_silence:
-            try:
-                Y_mat[:,:,i] = hg[:, int(index-back):int(index+forward)]
-            except:
-                print('Error creating Y_mat at trial i: ' + str(i) + ' index: ' + str(index))
-            for t in range(Y_mat.shape[1]):
-                Y_mat[:, t, i] = (Y_mat[:, t, i] - baseline_mean)/baseline_std
-        else:
-            try:
-                Y_mat[:,:,i] = hg[:, index-back:index+forward]
-            except:
-                print('Error creating Y_mat at trial i: ' + str(i) + ' index: ' + str(index))
-            if np.sum(np.isnan(Y_mat[:,:,i])) > 0:
-                print(i)
-                print(np.sum(np.isnan(Y_mat[:,:,i])))
+    Args:
+        hg: full time-series of high-gamma (n_chans x nt)
+        onsets: sample index of each trial start (n_trials)
+        back: number of time samples to take preceding trial start
+        forward: number of time samples to take following trial start.
 
+    Returns:
+        Y_mat (ndarray): n_chans x (back + forward) x n_trials. Samples outside of hg are NaN.
+    """
+    indexes = get_epoch_indexes(onsets, back=back, forward=forward).T
+    out_of_bounds = (indexes < 0) | (indexes >= hg.shape[1])
+    Y_mat = hg[:, np.clip(indexes, 0, hg.shape[1] - 1)].astype(float)
+    if out_of_bounds.any():
+        for i in np.flatnonzero(out_of_bounds.any(axis=0)):
+            logger.warning('epoch of trial %d (onset index %d) extends past the data and is padded with NaN', i, onsets[i])
+        Y_mat[:, out_of_bounds] = np.NaN
     return Y_mat
 
+def get_baseline_mean_and_std(hg, onsets, baseline_length=30):
+    """Returns the mean and std of each channel over the baseline_length samples preceding every onset.
+
+    Returns:
+        (tuple):
+            * **baseline_mean** (*ndarray*): n_chans
+            * **baseline_std** (*ndarray*): n_chans
+    """
+    baseline = get_epochs(hg, onsets, back=baseline_length, forward=0)
+    baseline = baseline.transpose(0, 2, 1).reshape(hg.shape[0], -1)
+
+    baseline_mean = np.nanmean(baseline, axis=1)
+    baseline_std = np.nanstd(baseline, axis=1)
+
+    logger.debug('baseline length: %d', baseline.shape[1])
+    logger.debug('baseline_mean: %s', baseline_mean)
+    logger.debug('baseline_std: %s', baseline_std)
+    return baseline_mean, baseline_std
+
 def get_concatenated_data(times_list, hg_list, hz=100, back=0, forward=250, zscore=True, zscore_to_silence=True):
     """Use to get time locked activity for multiple blocks. 
 
@@ -367,29 +542,82 @@ def get_concatenated_data(times_list, hg_list, hz=100, back=0, forward=250, zsco
     return Y_cat
     
 
-def get_time_averaged_data(times_list, hg_list, window=6, hz=100, back=15, forward=285, zscore=True, zscore_to_silence=True):
-    """Averages data in a moving window (each step is half a window) to smooth high-gamma for encoding analyses.
+def get_time_averaged_data(times_list, hg_list, window=6, step=None, hz=100, back=15, forward=285, zscore=True, zscore_to_silence=True):
+    """Averages data in a moving window (each step is half a window by default) to smooth high-gamma for encoding analyses.
+
+    Window means are computed directly from cumulative sums of each block's high-gamma, so the full resolution
+    time-locked data is never built. Windowing and baseline normalization commute because the normalization is
+    the same affine transform for every sample of a channel.
 
     Args:
         window: number of samples in each window. Use an even number, so steps are an integer number of samples.
+        step: number of samples between window centers. Defaults to half a window.
         back: number of samples back in time, center of the first window
         forward: center of the last window. 
+
+    Returns:
+        (tuple):
+            * **Y_mat** (*ndarray*): n_chans x n_centers x n_trials
+            * **centers** (*ndarray*): window centers returned by ``get_centers``
     """
-    Y_cat = get_concatenated_data(times_list, hg_list, hz=hz, zscore=zscore, back=back+window/2, forward=forward+window/2, zscore_to_silence=zscore_to_silence)
-    centers = get_centers(back=back, forward=forward, window=6)
-    Y_mat = np.zeros((Y_cat.shape[0], centers.shape[0], Y_cat.shape[2]))
-    
-    for i, c in enumerate(centers):
-        Y_mat[:, i, :] = np.nanmean(Y_cat[:, int(c+back):int(c+back+window), :], axis=1)
-    return Y_mat, centers
+    centers = get_centers(back=back, forward=forward, window=window, step=step)
+    offsets = np.floor(centers - window/2).astype(int)
+
+    Y_mats = []
+    for times, hg in zip(times_list, hg_list):
+        if zscore:
+            hg_mean = np.nanmean(hg, axis=1)[:, np.newaxis]
+            hg_std = np.nanstd(hg, axis=1)[:, np.newaxis]
+            hg[:] = (hg - hg_mean)/hg_std
+
+        onsets = get_onset_indexes(times, hz=hz)
+        Y_mat = get_windowed_nanmean(hg, offsets[:, np.newaxis] + onsets[np.newaxis, :], window)
+        if zscore_to_silence:
+            baseline_mean, baseline_std = get_baseline_mean_and_std(hg, onsets)
+            Y_mat = (Y_mat - baseline_mean[:, np.newaxis, np.newaxis])/baseline_std[:, np.newaxis, np.newaxis]
+        Y_mats.append(Y_mat)
+    return np.concatenate(Y_mats, axis=2), centers
+
+def get_windowed_nanmean(hg, starts, window):
+    """Returns the mean of hg over windows of window samples, ignoring NaNs and samples outside of hg.
 
-def get_centers(back=15, forward=285, window=6):
+    All windows are computed at once from NaN-aware cumulative sums of hg along time (axis 1).
+
+    Args:
+        hg: high-gamma with time as the second dimension, e.g. full time-series (n_chans x nt) or
+            epochs (n_chans x nt x n_trials)
+        starts (ndarray): int array (any shape) of the first sample index of each window
+        window (int): number of samples in each window
+
+    Returns:
+        (ndarray): n_chans x starts.shape x remaining dimensions of hg. NaN for windows without any valid samples.
+    """
+    nt = hg.shape[1]
+    valid = ~np.isnan(hg)
+    padded_shape = (hg.shape[0], nt + 1) + hg.shape[2:]
+    sums = np.zeros(padded_shape)
+    np.cumsum(np.where(valid, hg, 0), axis=1, out=sums[:, 1:])
+    counts = np.zeros(padded_shape, dtype=int)
+    np.cumsum(valid, axis=1, out=counts[:, 1:])
+
+    starts = np.asarray(starts)
+    lo = np.clip(starts, 0, nt)
+    hi = np.clip(starts + int(window), 0, nt)
+    window_counts = counts[:, hi] - counts[:, lo]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums[:, hi] - sums[:, lo]) / window_counts
+    means[window_counts == 0] = np.NaN
+    return means
+
+def get_centers(back=15, forward=285, window=6, step=None):
     """Returns a numpy array of center indexes (no parameters needed for default)
 
-    The returned list of `centers` starts at `-1 * back` and steps every half `window`. `centers` will
-    end at `forward` if `forward` can be reached from `-1 * back` in half `window` steps.
+    The returned list of `centers` starts at `-1 * back` and steps every `step` samples (half `window` by default).
+    `centers` will end at `forward` if `forward` can be reached from `-1 * back` in `step` steps.
 
     The default arguments (back=15, forward=285, and window=6) returns a length 101 ndarray.
     """
-    centers = np.arange(-1*back, forward+window/2, window/2)
-    return centers
\ No newline at end of file
+    if step is None:
+        step = window/2
+    centers = np.arange(-1*back, forward+step, step)
+    return centers
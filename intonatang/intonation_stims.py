@@ -7,6 +7,61 @@ import numpy as np
 import pandas as pd
 import itertools
 
+from . import cache
+
+
+# pitch and intensity of all tokens, parsed from the Praat tables in pitch_info_path (see get_pitch_and_intensity_array)
+pitch_intensity_filename = os.path.join(pitch_info_path, 'pitch_intensity.npz')
+
+sentence_number_names = ['sn1_', 'sn2_', 'sn3_', 'sn4_']
+sentence_type_names = ['st1_', 'st2_', 'st3_', 'st4_']
+speaker_names = ['sp1', 'sp2', 'sp3']
+token_names = ["".join(stim_tuple) for stim_tuple in itertools.product(sentence_number_names, sentence_type_names, speaker_names)]
+
+# token arrays and pitch contours already loaded in this process
+stim_acoustics = {}
+
+def parse_pitch_and_intensity_tables(names=token_names):
+    """Reads the Praat table of each token once.
+
+    Returns:
+        (tuple):
+            * **pitch_intensity** (*ndarray*): shape is (n_tokens x n_frames x 2), the pitch (Hz) and intensity (dB)
+              of each token. Zeros in the tables (no voicing) and frames after the end of shorter tokens are NaN.
+            * **n_frames** (*ndarray*): number of frames of each token
+    """
+    tables = [pd.read_table(os.path.join(pitch_info_path, name + ".wav.txt"), na_values=0.0, index_col=0) for name in names]
+    n_frames = np.array([len(table) for table in tables])
+    pitch_intensity = np.full((len(names), np.max(n_frames), 2), np.NaN)
+    for i, table in enumerate(tables):
+        pitch_intensity[i, :n_frames[i], 0] = table['pitch'].values
+        pitch_intensity[i, :n_frames[i], 1] = table['intensity'].values
+    return pitch_intensity, n_frames
+
+def get_pitch_and_intensity_array():
+    """Returns the pitch and intensity of all tokens (see parse_pitch_and_intensity_tables) and their names.
+
+    The Praat tables are parsed once and saved to a single file (pitch_intensity_filename), which is used until any
+    of the tables changes. The arrays are kept in memory after the first call, so do not modify them.
+
+    Returns:
+        (tuple): pitch_intensity, n_frames, names
+    """
+    if 'pitch_intensity' not in stim_acoustics:
+        paths = [os.path.join(pitch_info_path, name + ".wav.txt") for name in token_names]
+        key, description = cache.get_cache_key(paths, {'names': token_names})
+        data = cache.load_cached_arrays(pitch_intensity_filename, key, ['pitch_intensity', 'n_frames'])
+        if data is not None:
+            pitch_intensity, n_frames = data['pitch_intensity'], data['n_frames']
+        else:
+            pitch_intensity, n_frames = parse_pitch_and_intensity_tables()
+            try:
+                cache.save_cached_arrays(pitch_intensity_filename, key, description, pitch_intensity=pitch_intensity, n_frames=n_frames)
+            except (IOError, OSError):
+                # e.g. installed in a read-only location, the tables are parsed again in the next process
+                pass
+        stim_acoustics['pitch_intensity'] = (pitch_intensity, n_frames, token_names)
+    return stim_acoustics['pitch_intensity']
 
 def get_pitch_and_intensity():
     """Returns dict of pitch and intensity values over time for each intonation token.
@@ -16,16 +71,11 @@ def get_pitch_and_intensity():
 
     Pitch values are NaN when there are unvoiced segments.
     """
-    sentence_numbers = ['sn1_', 'sn2_', 'sn3_', 'sn4_']
-    sentence_types = ['st1_', 'st2_', 'st3_', 'st4_']
-    speakers = ['sp1', 'sp2', 'sp3']
-    stims_tuple = list(itertools.product(sentence_numbers, sentence_types, speakers))
+    pitch_intensity, n_frames, names = get_pitch_and_intensity_array()
     pitch_intensity_prosody = {}
-    for stim_tuple in stims_tuple:
-        path = os.path.join(pitch_info_path, "".join(stim_tuple) + ".wav.txt")
-        pitch = pd.read_table(path, na_values=0.0, index_col=0)['pitch'].values
-        intensity = pd.read_table(path, na_values=0.0, index_col=0)['intensity'].values
-        pitch_intensity_prosody["".join(stim_tuple)] = {'pitch': pitch, 'intensity': intensity}
+    for i, name in enumerate(names):
+        pitch_intensity_prosody[name] = {'pitch': pitch_intensity[i, :n_frames[i], 0].copy(),
+                                         'intensity': pitch_intensity[i, :n_frames[i], 1].copy()}
     return pitch_intensity_prosody
 
 def get_continuous_pitch_and_intensity():
@@ -35,12 +85,14 @@ def get_continuous_pitch_and_intensity():
 
     Ordering of intensities is sentences 1-4. 
     """
-    p = get_pitch_and_intensity()
-    pitches_df = pd.read_hdf(os.path.join(pitch_info_path, 'pitch_contours'), 'pitch_contours')
-    pitches = pitches_df.values.T
+    if 'pitch_contours' not in stim_acoustics:
+        pitches_df = pd.read_hdf(os.path.join(pitch_info_path, 'pitch_contours'), 'pitch_contours')
+        stim_acoustics['pitch_contours'] = pitches_df.values.T
+    pitches = stim_acoustics['pitch_contours'].copy()
 
+    pitch_intensity, n_frames, names = get_pitch_and_intensity_array()
     stims = ['sn1_st1_sp2', 'sn2_st1_sp2', 'sn3_st1_sp2', 'sn4_st1_sp2']
-    intensities = np.vstack([p[s]['intensity'] for s in stims])
+    intensities = np.vstack([pitch_intensity[names.index(s), :n_frames[names.index(s)], 1] for s in stims])
     return pitches, intensities
 
 stims1_1 = ['sn3_st3_sp2.wav', 'sn1_st2_sp1.wav', 'sn3_st2_sp1.wav', 'sn2_st2_sp1.wav', 'sn2_st4_sp3.wav', 'sn3_st2_sp3.wav', 'sn4_st2_sp1.wav', 'sn4_st3_sp2.wav', 'sn2_st3_sp2.wav', 'sn2_st4_sp2.wav', 'sn1_st4_sp2.wav', 'sn1_st1_sp1.wav', 'sn1_st3_sp2.wav', 'sn4_st2_sp2.wav', 'sn4_st4_sp1.wav', 'sn4_st4_sp3.wav', 'sn3_st3_sp1.wav', 'sn3_st4_sp1.wav', 'sn3_st4_sp2.wav', 'sn2_st1_sp3.wav', 'sn1_st3_sp3.wav', 'sn4_st2_sp3.wav', 'sn2_st4_sp1.wav', 'sn3_st3_sp3.wav', 'sn2_st3_sp3.wav', 'sn4_st4_sp2.wav', 'sn4_st1_sp1.wav', 'sn4_st1_sp2.wav', 'sn3_st4_sp3.wav', 'sn4_st3_sp1.wav', 'sn2_st2_sp2.wav', 'sn3_st1_sp3.wav', 'sn1_st4_sp1.wav', 'sn1_st4_sp3.wav', 'sn1_st2_sp3.wav', 'sn1_st3_sp1.wav', 'sn2_st1_sp2.wav', 'sn4_st3_sp3.wav', 'sn2_st3_sp1.wav', 'sn2_st2_sp3.wav', 'sn3_st1_sp1.wav', 'sn1_st2_sp2.wav', 'sn3_st1_sp2.wav', 'sn3_st2_sp2.wav', 'sn4_st1_sp3.wav', 'sn1_st1_sp2.wav', 'sn1_st1_sp3.wav', 'sn2_st1_sp1.wav']
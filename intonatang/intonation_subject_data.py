@@ -3,6 +3,12 @@ from __future__ import division, print_function, absolute_import
 import numpy as np
 from .intonation_stims import *
 
+# subjects in the intonation encoding and ptrf analyses, the subset that also heard the nonspeech control stimuli,
+# and all subjects with TIMIT data
+intonation_subject_numbers = [113, 118, 122, 123, 125, 129, 131]
+nonspeech_subject_numbers = [122, 123, 125, 129, 131]
+timit_subject_numbers = [113, 118, 122, 123, 125, 129, 131, 137, 142, 143]
+
 def get_blocks_for_subject_number(subject_number, control_stim=False, missing_f0_stim=False):
     """Returns list of block numbers for each subject. 
     
@@ -0,0 +1,100 @@
+"""Lazy imports of heavy optional dependencies (matplotlib, seaborn, librosa, statsmodels, sklearn, h5py, tables).
+
+``lazy_import`` returns a stand-in for a module that imports the module the first time one of its attributes is
+used. Modules use it for dependencies that only some of their functions need, so that e.g. importing pitch_trf on a
+compute worker does not import matplotlib::
+
+    plt = lazy_import('matplotlib.pyplot')
+    ...
+    fig, ax = plt.subplots()  # matplotlib.pyplot is imported here
+
+``get_import_report`` measures the import time of a module in a fresh interpreter and lists the heavy dependencies
+it imported.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import sys
+import json
+import importlib
+import subprocess
+
+heavy_modules = ['matplotlib', 'seaborn', 'librosa', 'statsmodels', 'sklearn', 'h5py', 'tables']
+
+# seconds allowed for importing each module in a fresh interpreter (see check_import_times)
+import_time_budgets = {'intonatang.pitch_trf': 2.0,
+                       'intonatang.temporal_receptive_field': 1.0,
+                       'intonatang.intonation_preanalysis': 1.0,
+                       'intonatang.intonation_invariance': 1.0,
+                       'intonatang.intonation_encoding': 1.0}
+
+class LazyModule(object):
+    """Stand-in for the module called name, imported on first attribute access.
+
+    Args:
+        name (str): full module name, e.g. 'matplotlib.pyplot'
+        on_import (function): called without arguments once, after the module is imported (e.g. to set plot styles)
+    """
+    def __init__(self, name, on_import=None):
+        self.__dict__['_name'] = name
+        self.__dict__['_on_import'] = on_import
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self.__dict__['_module'] is None:
+            self.__dict__['_module'] = importlib.import_module(self.__dict__['_name'])
+            on_import = self.__dict__['_on_import']
+            if on_import is not None:
+                on_import()
+        return self.__dict__['_module']
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        return "<lazily imported module " + self.__dict__['_name'] + ">"
+
+def lazy_import(name, on_import=None):
+    """Returns the module called name if it was already imported (after calling on_import), otherwise a LazyModule.
+    """
+    if name in sys.modules:
+        if on_import is not None:
+            on_import()
+        return sys.modules[name]
+    return LazyModule(name, on_import=on_import)
+
+def get_import_report(module_name, python=None):
+    """Imports module_name in a new interpreter.
+
+    Returns:
+        (dict): with "time" (seconds to import module_name) and "heavy_modules" (heavy_modules that were imported)
+    """
+    code = ("import json, sys, time; start = time.time(); import " + module_name + "; elapsed = time.time() - start; "
+            "print(json.dumps({'time': elapsed, 'heavy_modules': [m for m in " + repr(heavy_modules) + " if m in sys.modules]}))")
+    output = subprocess.check_output([python or sys.executable, '-c', code])
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+def check_import_times(budgets=None, verbose=True):
+    """Measures import times and returns the modules that take longer than their budget or import heavy modules.
+
+    Args:
+        budgets (dict): module names and seconds, defaults to ``import_time_budgets``
+
+    Returns:
+        (dict): module names and import reports of the modules over budget
+    """
+    if budgets is None:
+        budgets = import_time_budgets
+    failed = {}
+    for module_name in sorted(budgets):
+        report = get_import_report(module_name)
+        over_budget = report['time'] > budgets[module_name] or len(report['heavy_modules']) > 0
+        if over_budget:
+            failed[module_name] = report
+        if verbose:
+            print("{:<40} {:6.2f} s (budget {:.1f} s) {} {}".format(module_name, report['time'], budgets[module_name],
+                  'FAILED' if over_budget else 'ok', ", ".join(report['heavy_modules'])))
+    return failed
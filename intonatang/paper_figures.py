@@ -10,13 +10,6 @@ import pandas as pd
 import scipy.io as sio
 from scipy.stats import zscore, pearsonr
 from scipy.signal import resample
-import matplotlib
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
-from matplotlib.ticker import ScalarFormatter
-import matplotlib.image as mpimg
-matplotlib.rcParams['pdf.fonttype'] = 42
-import librosa
 from cycler import cycler
 
 
@@ -24,15 +17,44 @@ from . import intonatang as tang
 from . import timit
 from . import pitch_trf as ptrf
 from . import erps
-
-import seaborn
-seaborn.set_style("ticks", {'xtick.major.size':2, 'ytick.major.size':2, 'ytick.minor.size':0, 'xtick.minor.size':0, 'axes.linewidth': 1})
-seaborn.set_context("paper")
+from .lazy_imports import lazy_import
+
+figure_style_set = []
+
+def set_figure_style():
+    """Sets the matplotlib and seaborn styles of the paper figures. Called when matplotlib or seaborn is first used.
+    """
+    if len(figure_style_set) > 0:
+        return
+    figure_style_set.append(True)
+    import matplotlib
+    import matplotlib.pyplot
+    import matplotlib.gridspec
+    import seaborn
+    matplotlib.rcParams['pdf.fonttype'] = 42
+    seaborn.set_style("ticks", {'xtick.major.size':2, 'ytick.major.size':2, 'ytick.minor.size':0, 'xtick.minor.size':0, 'axes.linewidth': 1})
+    seaborn.set_context("paper")
+
+matplotlib = lazy_import('matplotlib', on_import=set_figure_style)
+plt = lazy_import('matplotlib.pyplot', on_import=set_figure_style)
+gridspec = lazy_import('matplotlib.gridspec', on_import=set_figure_style)
+mpimg = lazy_import('matplotlib.image', on_import=set_figure_style)
+seaborn = lazy_import('seaborn', on_import=set_figure_style)
+librosa = lazy_import('librosa')
 
 icolors = ['b', 'g', 'r', 'm']
 
-pitch_intensity = tang.get_pitch_and_intensity()
-pitches, intensities = tang.get_continuous_pitch_and_intensity()
+stim_pitch_and_intensity = {}
+
+def get_stim_pitch_and_intensity():
+    """Returns pitch_intensity (tang.get_pitch_and_intensity), pitches, and intensities
+    (tang.get_continuous_pitch_and_intensity), reading the Praat tables on first use.
+    """
+    if len(stim_pitch_and_intensity) == 0:
+        stim_pitch_and_intensity['pitch_intensity'] = tang.get_pitch_and_intensity()
+        stim_pitch_and_intensity['pitches'], stim_pitch_and_intensity['intensities'] = tang.get_continuous_pitch_and_intensity()
+    return stim_pitch_and_intensity['pitch_intensity'], stim_pitch_and_intensity['pitches'], stim_pitch_and_intensity['intensities']
+
 centers = tang.get_centers()
 
 def get_brain_imgs_and_xys(subjects=None):
@@ -55,6 +77,7 @@ def get_brain_imgs_and_xys(subjects=None):
     return imgs, xys
 
 def fig1():
+    pitch_intensity, pitches, intensities = get_stim_pitch_and_intensity()
     fig = plt.figure(figsize=(8, 5.5))
 
     gs = matplotlib.gridspec.GridSpec(1, 2, width_ratios=[2.5, 3*2], wspace=0.3)
@@ -587,6 +610,7 @@ def sfig1():
     return fig
 
 def fig3():
+    pitch_intensity, pitches, intensities = get_stim_pitch_and_intensity()
     fig = plt.figure(figsize=(6, 5))
 
     gs = matplotlib.gridspec.GridSpec(2, 1, height_ratios=[1, 2.5], left=0.2)
@@ -1019,7 +1043,7 @@ def add_timit_example_tokens_to_gridspec(gs, examples=None, titles=None, binned_
             ax5.plot(timit_pitch.loc[examples[i]].rel_pitch_global, color='#DB7D12')
             ax4.set_yscale("log")
             ax4.set(ylim=(50, 400), yticks=[50, 100, 200, 400], xticks=np.arange(12.5, durations[i]*100, 25), xlim=(0, durations[i]*100), xticklabels=[])
-            ax4.yaxis.set_major_formatter(ScalarFormatter())
+            ax4.yaxis.set_major_formatter(matplotlib.ticker.ScalarFormatter())
             ax5.set(ylim=(-3, 3), yticks=[-3, 0, 3], xticks=np.arange(12.5, durations[i]*100, 25),xlim=(0, durations[i]*100), xticklabels=[])
             if i != 0:
                 ax4.set(yticklabels=[])
@@ -0,0 +1,182 @@
+"""Online summaries of permutation distributions.
+
+The permutation tests in ``intonation_invariance`` produce one set of accuracies per permutation (e.g. n_chans x 3
+for ``test_invariance_control``). Instead of keeping every permutation in memory, a ``PermutationAccumulator``
+can be updated with each permutation as it finishes and keeps, for each value:
+
+* running count, mean, and variance of non-NaN permutation values (Welford's algorithm)
+* exceedance counts, the number of permutations with values greater than or equal to an observed value
+* a fixed-size uniform reservoir sample of whole permutations, used for percentiles
+
+Memory use and saved output size depend on the reservoir size but not on the number of permutations. When the
+number of permutations is not larger than the reservoir size, the reservoir contains every permutation, so
+percentiles are exactly those of the full distribution.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+
+class PermutationAccumulator(object):
+    """Accumulates running statistics of permutation values with a fixed shape.
+
+    Args:
+        shape (tuple): shape of the values from one permutation, e.g. (n_chans, 3)
+        observed (ndarray): observed values, broadcastable to shape. If given, exceedance counts are kept.
+        reservoir_size (int): number of permutations kept for percentiles.
+        seed (int): seed for the reservoir sampling.
+    """
+    def __init__(self, shape, observed=None, reservoir_size=1000, seed=0):
+        self.shape = tuple(shape)
+        self.observed = None if observed is None else np.broadcast_to(observed, self.shape).astype(float)
+        self.reservoir_size = int(reservoir_size)
+        self.seed = int(seed)
+        self.random_state = np.random.RandomState(self.seed)
+
+        self.n_perms = 0
+        self.count = np.zeros(self.shape)
+        self.mean = np.zeros(self.shape)
+        self.m2 = np.zeros(self.shape)
+        self.n_exceed = np.zeros(self.shape)
+        self.reservoir = np.zeros((self.reservoir_size,) + self.shape)
+
+    def update(self, values):
+        """Adds the values from one permutation.
+        """
+        values = np.asarray(values, dtype=float).reshape(self.shape)
+        valid = ~np.isnan(values)
+
+        self.count[valid] += 1
+        delta = values - self.mean
+        self.mean[valid] += delta[valid] / self.count[valid]
+        self.m2[valid] += delta[valid] * (values - self.mean)[valid]
+
+        if self.observed is not None:
+            self.n_exceed[valid] += values[valid] >= self.observed[valid]
+
+        # reservoir sampling (algorithm R) of whole permutations.
+        if self.n_perms < self.reservoir_size:
+            self.reservoir[self.n_perms] = values
+        else:
+            i = self.random_state.randint(0, self.n_perms + 1)
+            if i < self.reservoir_size:
+                self.reservoir[i] = values
+        self.n_perms += 1
+
+    def update_all(self, values_iter):
+        """Adds the values from each permutation in values_iter.
+        """
+        for values in values_iter:
+            self.update(values)
+        return self
+
+    def get_samples(self):
+        """Returns the reservoir sample of permutations, shape is (n_samples,) + shape.
+        """
+        return self.reservoir[:min(self.n_perms, self.reservoir_size)]
+
+    def get_mean(self):
+        """Returns the mean of the non-NaN permutation values, NaN where there were none.
+        """
+        mean = np.copy(self.mean)
+        mean[self.count == 0] = np.NaN
+        return mean
+
+    def get_var(self, ddof=0):
+        """Returns the variance of the non-NaN permutation values.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            var = self.m2 / (self.count - ddof)
+        var[self.count - ddof <= 0] = np.NaN
+        return var
+
+    def get_std(self, ddof=0):
+        return np.sqrt(self.get_var(ddof=ddof))
+
+    def get_percentile(self, q):
+        """Returns percentiles q (0-100) of each value, estimated from the reservoir sample.
+
+        Returns:
+            (ndarray): shape is shape if q is a scalar, otherwise (len(q),) + shape
+        """
+        return np.nanpercentile(self.get_samples(), q, axis=0)
+
+    def get_p_value(self):
+        """Returns the one-sided permutation p-value, (n_exceed + 1)/(count + 1), of the observed values.
+        """
+        if self.observed is None:
+            raise ValueError("PermutationAccumulator has no observed values.")
+        return (self.n_exceed + 1) / (self.count + 1)
+
+    def to_dict(self, prefix=''):
+        """Returns a dict of ndarrays that can be saved with scipy.io.savemat and restored with ``from_dict``.
+
+        Args:
+            prefix (str): prepended to every key, so the summary can be saved in the same file as other variables.
+        """
+        d = {'shape': np.array(self.shape), 'reservoir_size': self.reservoir_size, 'seed': self.seed,
+             'n_perms': self.n_perms, 'count': self.count, 'mean': self.mean, 'm2': self.m2,
+             'n_exceed': self.n_exceed, 'reservoir': self.get_samples(),
+             'random_state': np.array(self.random_state.get_state()[1]),
+             'random_state_pos': self.random_state.get_state()[2]}
+        if self.observed is not None:
+            d['observed'] = self.observed
+        return dict((prefix + key, value) for key, value in d.items())
+
+    @classmethod
+    def from_dict(cls, d, prefix=''):
+        """Restores an accumulator from ``to_dict`` output, including dicts returned by scipy.io.loadmat.
+        """
+        d = dict((key[len(prefix):], value) for key, value in d.items() if key.startswith(prefix))
+        shape = tuple(np.ravel(d['shape']).astype(int))
+        reservoir_size = int(np.ravel(d['reservoir_size'])[0])
+        observed = np.reshape(d['observed'], shape) if 'observed' in d else None
+        acc = cls(shape, observed=observed, reservoir_size=reservoir_size, seed=int(np.ravel(d['seed'])[0]))
+
+        acc.n_perms = int(np.ravel(d['n_perms'])[0])
+        acc.count = np.reshape(d['count'], shape).astype(float)
+        acc.mean = np.reshape(d['mean'], shape).astype(float)
+        acc.m2 = np.reshape(d['m2'], shape).astype(float)
+        acc.n_exceed = np.reshape(d['n_exceed'], shape).astype(float)
+        n_samples = min(acc.n_perms, reservoir_size)
+        acc.reservoir[:n_samples] = np.reshape(d['reservoir'], (n_samples,) + shape)
+
+        # continue the reservoir sampling where it left off.
+        state = list(acc.random_state.get_state())
+        state[1] = np.ravel(d['random_state']).astype(np.uint32)
+        state[2] = int(np.ravel(d['random_state_pos'])[0])
+        acc.random_state.set_state(tuple(state))
+        return acc
+
+def get_percentile_thresholds(perms, q=95, axis=1):
+    """Returns percentile q of permutation values for all channels at once.
+
+    Args:
+        perms (ndarray): permutation values, e.g. n_chans x n_perms
+        q (float or list): percentile(s) between 0 and 100
+        axis (int): permutation axis
+
+    Returns:
+        (ndarray): perms.shape without axis if q is a scalar, otherwise (len(q),) + that shape
+    """
+    return np.percentile(perms, q, axis=axis)
+
+def get_empirical_p_values(observed, perms, axis=1):
+    """Returns the one-sided permutation p-values, (n_exceed + 1)/(n_perms + 1), of observed values.
+
+    n_exceed is the number of permutation values greater than or equal to the observed value.
+
+    Args:
+        observed (ndarray): observed values, perms.shape without axis (e.g. n_chans)
+        perms (ndarray): permutation values, e.g. n_chans x n_perms
+        axis (int): permutation axis
+    """
+    perms = np.asarray(perms)
+    observed = np.expand_dims(np.asarray(observed), axis)
+    n_exceed = np.sum(perms >= observed, axis=axis)
+    return (n_exceed + 1) / (perms.shape[axis] + 1)
+
+def get_sig(observed, perms, q=95, axis=1):
+    """Returns 1 where observed is greater than percentile q of the permutation values and 0 elsewhere (as floats).
+    """
+    return (np.asarray(observed) > get_percentile_thresholds(perms, q=q, axis=axis)).astype(float)
@@ -0,0 +1,355 @@
+"""Runs the analysis stages that generate the paper results as a graph of dependent stages.
+
+Each ``Stage`` declares the function that computes it, the files it reads (inputs), the files it writes (outputs),
+and the stages it depends on. ``Pipeline.run`` runs stages in a process pool as soon as the stages they depend on
+have finished, so different subjects (and independent stages of one subject) run at the same time. A stage is
+skipped if all of its outputs exist, are newer than all of its inputs, and none of the stages it depends on ran.
+
+``get_all_results_pipeline`` declares the stages of ``intonatang.generate_all_results``,
+``pitch_trf.generate_all_results`` and ``timit.generate_all_results``::
+
+    from intonatang import pipeline
+    pipeline.get_all_results_pipeline().run(n_workers=8)
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import time
+import traceback
+from multiprocessing import Pool
+from collections import OrderedDict
+
+from . import result_store
+from .intonation_subject_data import get_blocks_for_subject_number
+from .intonation_subject_data import intonation_subject_numbers, nonspeech_subject_numbers as default_nonspeech_subject_numbers
+from .intonation_subject_data import timit_subject_numbers as default_timit_subject_numbers
+from .intonation_preanalysis import get_full_data_path_for_subject_number_and_block, get_Y_mat_filename
+from .intonation_preanalysis import save_Y_mats_for_subject_number, update_Y_mats_for_subject_number
+from .intonation_preanalysis import load_Y_mat_sns_sts_sps_for_subject_number
+from .intonation_encoding import single_electrode_encoding_varpart, single_electrode_encoding_all_weights
+from .intonation_encoding import save_encoding_results, save_encoding_results_all_weights
+from .intonation_encoding import get_encoding_results_filename, get_encoding_results_all_weights_filename
+from .intonation_invariance import test_invariance_control, save_control_test_accs, get_control_test_accs_filename
+from . import pitch_trf
+from . import timit
+
+# kinds of stages in get_all_results_pipeline. "encoding" includes the full model, "invariance" is the nonspeech
+# control invariance test.
+stage_kinds = ['preanalysis', 'encoding', 'invariance', 'ptrf', 'ptrf_permutations', 'timit_psis']
+
+class Stage(object):
+    """One step of a pipeline.
+
+    Args:
+        name (str): unique name of the stage
+        func (function): module-level function that computes and saves the outputs (it is sent to worker processes)
+        args (tuple): positional arguments of func
+        kwargs (dict): keyword arguments of func
+        inputs (list): paths of files read by func
+        outputs (list): paths of files written by func. Paths of results saved with result_store (in inputs or
+            outputs) are given as the .mat filename and are found in either format.
+        deps (list): names of stages that have to finish before this stage
+    """
+    def __init__(self, name, func, args=(), kwargs=None, inputs=(), outputs=(), deps=()):
+        self.name = name
+        self.func = func
+        self.args = tuple(args)
+        self.kwargs = {} if kwargs is None else dict(kwargs)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.deps = list(deps)
+
+    def is_up_to_date(self):
+        """Returns True if every output exists and is at least as new as every existing input.
+        """
+        if len(self.outputs) == 0:
+            return False
+        output_mtimes = []
+        for output in self.outputs:
+            path = get_existing_path(output)
+            if path is None:
+                return False
+            output_mtimes.append(os.path.getmtime(path))
+        input_paths = [get_existing_path(path) for path in self.inputs]
+        input_mtimes = [os.path.getmtime(path) for path in input_paths if path is not None]
+        return len(input_mtimes) == 0 or min(output_mtimes) >= max(input_mtimes)
+
+    def __repr__(self):
+        return "Stage(" + self.name + ")"
+
+def get_existing_path(path):
+    """Returns path if it exists, or the path of the results saved with result_store for the .mat filename path.
+    """
+    if os.path.exists(path):
+        return path
+    if path.endswith('.mat'):
+        return result_store.find_results(path)[0]
+    return None
+
+def run_stage(name, func, args, kwargs):
+    """Runs func in a worker process. Returns (name, wall time in seconds, formatted traceback or None).
+    """
+    start = time.time()
+    try:
+        func(*args, **kwargs)
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+    return name, time.time() - start, error
+
+class Pipeline(object):
+    """A set of stages that depend on each other.
+
+    Attributes:
+        stages (OrderedDict): stage names and stages, in the order they were added
+        report (OrderedDict): after ``run``, stage names and dicts with the "status" ("done", "skipped", "failed",
+            or "not run" if a dependency failed) and "time" (wall time in seconds) of each stage
+    """
+    def __init__(self, stages=()):
+        self.stages = OrderedDict()
+        self.report = OrderedDict()
+        for stage in stages:
+            self.add(stage)
+
+    def add(self, stage):
+        if stage.name in self.stages:
+            raise ValueError("Stage " + stage.name + " was already added.")
+        self.stages[stage.name] = stage
+        return stage
+
+    def get_order(self):
+        """Returns stage names in an order in which every stage comes after the stages it depends on.
+        """
+        order = []
+        state = {}
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError("Stages have a circular dependency: " + " -> ".join(path + [name]))
+            if name not in self.stages:
+                raise ValueError("Stage " + path[-1] + " depends on unknown stage " + name)
+            state[name] = 'visiting'
+            for dep in self.stages[name].deps:
+                visit(dep, path + [name])
+            state[name] = 'done'
+            order.append(name)
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def run(self, n_workers=None, force=False, verbose=True):
+        """Runs all stages that are not up to date.
+
+        Args:
+            n_workers (int): number of processes. If None, all cores are used. With n_workers=1, stages run one at
+                a time in this process.
+            force (bool): run every stage, even if its outputs are up to date.
+            verbose (bool): print each stage as it finishes and the report at the end.
+
+        Returns:
+            (OrderedDict): the report, see ``Pipeline.report``
+
+        Raises:
+            RuntimeError: if any stage failed. Stages that do not depend on the failed stage are still run.
+        """
+        order = self.get_order()
+        self.report = OrderedDict((name, {'status': None, 'time': 0.0}) for name in order)
+        start = time.time()
+
+        if n_workers == 1:
+            for name in order:
+                if self.should_run(name, force):
+                    self.finish(run_stage(name, self.stages[name].func, self.stages[name].args, self.stages[name].kwargs), verbose)
+        else:
+            pool = Pool(n_workers)
+            try:
+                running = {}
+                while True:
+                    for name in order:
+                        if self.report[name]['status'] is None and name not in running and self.is_ready(name):
+                            if self.should_run(name, force):
+                                stage = self.stages[name]
+                                running[name] = pool.apply_async(run_stage, (name, stage.func, stage.args, stage.kwargs))
+                    if len(running) == 0:
+                        break
+                    finished = [name for name in running if running[name].ready()]
+                    if len(finished) == 0:
+                        time.sleep(0.1)
+                    for name in finished:
+                        self.finish(running.pop(name).get(), verbose)
+            finally:
+                pool.terminate()
+                pool.join()
+
+        if verbose:
+            self.print_report(time.time() - start)
+        failed = [name for name in order if self.report[name]['status'] == 'failed']
+        if len(failed) > 0:
+            raise RuntimeError("Pipeline stages failed: " + ", ".join(failed))
+        return self.report
+
+    def is_ready(self, name):
+        return all(self.report[dep]['status'] is not None for dep in self.stages[name].deps)
+
+    def should_run(self, name, force):
+        """Marks the stage as skipped or not run and returns False, or returns True if the stage has to run.
+        """
+        stage = self.stages[name]
+        dep_statuses = [self.report[dep]['status'] for dep in stage.deps]
+        if any(status in ('failed', 'not run') for status in dep_statuses):
+            self.report[name]['status'] = 'not run'
+            return False
+        if not force and 'done' not in dep_statuses and stage.is_up_to_date():
+            self.report[name]['status'] = 'skipped'
+            return False
+        return True
+
+    def finish(self, result, verbose):
+        name, elapsed, error = result
+        self.report[name]['time'] = elapsed
+        self.report[name]['status'] = 'done' if error is None else 'failed'
+        if verbose:
+            print("{} {} ({:.1f} s)".format(name, self.report[name]['status'], elapsed))
+            if error is not None:
+                print(error)
+        # stages that depend on a failed stage can not run
+        if error is not None:
+            for other in self.get_order():
+                if self.report[other]['status'] is None and name in self.stages[other].deps:
+                    self.report[other]['status'] = 'not run'
+
+    def print_report(self, total_time=None):
+        width = max([len(name) for name in self.report] + [5])
+        for name, entry in self.report.items():
+            print("{} {:>8} {:10.1f} s".format(name.ljust(width), entry['status'], entry['time']))
+        if total_time is not None:
+            stage_time = sum(entry['time'] for entry in self.report.values())
+            print("{} {:>8} {:10.1f} s (sum of stages {:.1f} s)".format("total".ljust(width), "", total_time, stage_time))
+
+def run_preanalysis(subject_number, control_stim=False, zscore_to_silence=(True, False), use_cache=True):
+    if use_cache:
+        update_Y_mats_for_subject_number(subject_number, control_stim=control_stim, zscore_to_silence=zscore_to_silence)
+    else:
+        save_Y_mats_for_subject_number(subject_number, control_stim=control_stim, zscore_to_silence=zscore_to_silence)
+
+def run_encoding(subject_number, control_stim=False):
+    Y_mat, sns, sts, sps, Y_mat_plotter = load_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=control_stim)
+    r2_varpart, p_varpart, f_varpart = single_electrode_encoding_varpart(Y_mat, sns, sts, sps, control_stim=control_stim)
+    save_encoding_results(subject_number, r2_varpart, p_varpart, f_varpart, control_stim=control_stim)
+
+def run_full_model(subject_number, control_stim=False):
+    Y_mat, sns, sts, sps, Y_mat_plotter = load_Y_mat_sns_sts_sps_for_subject_number(subject_number, control_stim=control_stim)
+    f, fp, b, bp, total_r2 = single_electrode_encoding_all_weights(Y_mat, sns, sts, sps, control_stim=control_stim)
+    save_encoding_results_all_weights(subject_number, f, fp, b, bp, total_r2, control_stim=control_stim)
+
+def run_control_invariance(subject_number, n_workers=1, n_perms=1000):
+    accs, accs_test = test_invariance_control(subject_number, n_perms=n_perms, n_workers=n_workers)
+    save_control_test_accs(subject_number, accs, accs_test)
+
+def get_block_paths(subject_number, control_stim=False):
+    return [get_full_data_path_for_subject_number_and_block(subject_number, block)
+            for block in get_blocks_for_subject_number(subject_number, control_stim=control_stim)]
+
+def get_all_results_pipeline(subject_numbers=None, nonspeech_subject_numbers=None, ptrf_subject_numbers=None,
+                             timit_subject_numbers=None, use_cache=True, regenerate_processed_timit_data=False,
+                             regenerate_shuffled_timit_data=False, kinds=None, n_perms=None):
+    """Returns the Pipeline that generates all paper results.
+
+    Stages for each subject: preanalysis -> encoding, full model (speech and nonspeech control data) -> control
+    invariance (nonspeech subjects), ptrf and ptrf permutation test, and TIMIT PSIs.
+
+    Args:
+        subject_numbers (list): subjects for preanalysis and encoding. Defaults to those in
+            intonatang.generate_all_results.
+        nonspeech_subject_numbers (list): subjects with nonspeech control data
+        ptrf_subject_numbers (list): subjects for the ptrf analysis, defaults to those in pitch_trf.generate_all_results
+        timit_subject_numbers (list): subjects for PSIs, defaults to those in timit.generate_all_results
+        use_cache (bool): preanalysis only recomputes Y_mat files that are out of date
+            (see update_Y_mats_for_subject_number)
+        regenerate_processed_timit_data (bool): add a stage that regenerates the processed TIMIT pitch and phonemes
+        regenerate_shuffled_timit_data (bool): add a stage that regenerates the shuffled TIMIT pitch contours
+        kinds (list): kinds of stages to include (see ``stage_kinds``), defaults to all. Stages that depend on a
+            kind that is left out use its saved outputs, e.g. kinds=['encoding'] uses the saved Y_mats.
+        n_perms (int): number of permutations of the control invariance and ptrf permutation tests. Defaults to
+            those of test_invariance_control and run_ptrf_analysis_permutation_test.
+
+    Invariance permutations run with one process per stage, since the stages are already run in parallel.
+    """
+    if subject_numbers is None:
+        subject_numbers = intonation_subject_numbers
+    if nonspeech_subject_numbers is None:
+        nonspeech_subject_numbers = default_nonspeech_subject_numbers
+    if ptrf_subject_numbers is None:
+        ptrf_subject_numbers = intonation_subject_numbers
+    if timit_subject_numbers is None:
+        timit_subject_numbers = default_timit_subject_numbers
+    if kinds is None:
+        kinds = stage_kinds
+    for kind in kinds:
+        if kind not in stage_kinds:
+            raise ValueError("Unknown kind of stage " + str(kind) + ", expected one of " + ", ".join(stage_kinds))
+    perms_kwargs = {} if n_perms is None else {'n_perms': n_perms}
+
+    pipeline = Pipeline()
+
+    def add(kind, stage):
+        # dependencies on stages that are left out are satisfied by their saved outputs
+        if kind in kinds:
+            stage.deps = [dep for dep in stage.deps if dep in pipeline.stages]
+            pipeline.add(stage)
+
+    def add_preanalysis_and_encoding(subject_number, control_stim):
+        suffix = "_control" if control_stim else ""
+        name = "EC" + str(subject_number) + suffix
+        zscore_to_silence = [True] if control_stim else (True, False)
+        Y_mat_filenames = [get_Y_mat_filename(subject_number, control_stim=control_stim, zscore_to_silence=z) for z in zscore_to_silence]
+        add('preanalysis', Stage("preanalysis_" + name, run_preanalysis, (subject_number,),
+                           {'control_stim': control_stim, 'zscore_to_silence': zscore_to_silence, 'use_cache': use_cache},
+                           inputs=get_block_paths(subject_number, control_stim=control_stim), outputs=Y_mat_filenames))
+        add('encoding', Stage("encoding_" + name, run_encoding, (subject_number,), {'control_stim': control_stim},
+                           inputs=Y_mat_filenames[:1], outputs=[get_encoding_results_filename(subject_number, control_stim=control_stim)],
+                           deps=["preanalysis_" + name]))
+        add('encoding', Stage("full_model_" + name, run_full_model, (subject_number,), {'control_stim': control_stim},
+                           inputs=Y_mat_filenames[:1], outputs=[get_encoding_results_all_weights_filename(subject_number, control_stim=control_stim)],
+                           deps=["preanalysis_" + name]))
+
+    for subject_number in subject_numbers:
+        add_preanalysis_and_encoding(subject_number, False)
+
+    for subject_number in nonspeech_subject_numbers:
+        if subject_number not in subject_numbers:
+            add_preanalysis_and_encoding(subject_number, False)
+        add_preanalysis_and_encoding(subject_number, True)
+        name = "EC" + str(subject_number)
+        add('invariance', Stage("control_invariance_" + name, run_control_invariance, (subject_number,), perms_kwargs,
+                           inputs=[get_Y_mat_filename(subject_number), get_Y_mat_filename(subject_number, control_stim=True)],
+                           outputs=[get_control_test_accs_filename(subject_number)],
+                           deps=["preanalysis_" + name, "preanalysis_" + name + "_control"]))
+
+    timit_deps = []
+    if regenerate_processed_timit_data:
+        pipeline.add(Stage("processed_timit_data", timit.generate_processed_timit_data))
+        timit_deps = ["processed_timit_data"]
+    shuffle_deps = list(timit_deps)
+    if regenerate_shuffled_timit_data:
+        pipeline.add(Stage("shuffled_timit_pitch", pitch_trf.save_shuffled_timit_pitch_contours, deps=timit_deps))
+        shuffle_deps = shuffle_deps + ["shuffled_timit_pitch"]
+
+    timit_pitch_filename = os.path.join(timit.processed_timit_data_path, 'timit_pitch_phonetic.h5')
+    for subject_number in ptrf_subject_numbers:
+        name = "EC" + str(subject_number)
+        inputs = [timit.get_h5py_out_filename(subject_number), timit_pitch_filename]
+        add('ptrf', Stage("ptrf_" + name, pitch_trf.run_ptrf_analysis_pipeline_for_subject_number, (subject_number,),
+                           inputs=inputs, outputs=[pitch_trf.get_cv_model_fold_filename(subject_number)], deps=timit_deps))
+        add('ptrf_permutations', Stage("ptrf_permutation_" + name, pitch_trf.run_ptrf_analysis_permutation_test, (subject_number,), perms_kwargs,
+                           inputs=inputs, outputs=[pitch_trf.get_cv_shuffle_fold_filename(subject_number)], deps=shuffle_deps))
+
+    for subject_number in timit_subject_numbers:
+        name = "EC" + str(subject_number)
+        add('timit_psis', Stage("timit_psis_" + name, timit.save_average_response_psis, (subject_number,),
+                           inputs=[timit.get_h5py_out_filename(subject_number)],
+                           outputs=[timit.get_average_response_psis_filename(subject_number)], deps=timit_deps))
+
+    return pipeline
@@ -6,28 +6,38 @@ timit_data_path = os.path.join(os.path.dirname(__file__), 'data', 'timit')
 processed_timit_data_path = os.path.join(os.path.dirname(__file__), 'processed_timit_data')
 
 import numpy as np
-import scipy.io as sio
 from scipy.stats import zscore
-import matplotlib.pyplot as plt
 import pandas as pd
 import random
+from collections import OrderedDict
 
 from . import timit
+from . import cache
+from . import result_store
+from . import permutation_stats
+from .instrumentation import instrument
 from .intonation_stims import get_pitch_and_intensity
+from .intonation_subject_data import intonation_subject_numbers
 from .temporal_receptive_field import *
+from .pitch_trf_plots import plot_prediction_overlay, get_channel_order, plot_trf, plot_trf_rel_versus_change
+from .pitch_trf_plots import plot_trfs, plot_grid, plot_heschls
 
 def generate_all_results(regenerate_shuffled_timit_data=False):
-    subject_numbers = [113, 118, 122, 123, 125, 129, 131]
-
     if regenerate_shuffled_timit_data:
-        timit_pitch = timit.get_timit_pitch()
-        for i in range(25):
-            randomize_timit_pitch_contours(timit_pitch, save_as=i)
+        save_shuffled_timit_pitch_contours()
 
-    for subject_number in subject_numbers:
+    for subject_number in intonation_subject_numbers:
         run_ptrf_analysis_permutation_test(subject_number)
         run_ptrf_analysis_pipeline_for_subject_number(subject_number)
 
+def save_shuffled_timit_pitch_contours(n_shuffles=25):
+    """Saves n_shuffles TIMIT pitch data sets with randomized pitch contours, used by run_ptrf_analysis_permutation_test.
+    """
+    timit_pitch = timit.get_timit_pitch()
+    for i in range(n_shuffles):
+        randomize_timit_pitch_contours(timit_pitch, save_as=i)
+
+@instrument
 def run_ptrf_analysis_pipeline_for_subject_number(subject_number, pitch_scaling="log"):
     """Pitch temporal receptive field analysis pipeline.
 
@@ -53,16 +63,15 @@ def run_ptrf_analysis_pipeline_for_subject_number(subject_number, pitch_scaling=
     wts_abs = np.zeros((n_chans, 598, 25))
     wts_rel = np.zeros((n_chans, 598, 25))
 
-    abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(timit_pitch, pitch_scaling=pitch_scaling)
+    abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(pitch_scaling=pitch_scaling)
+    bin_edges = {'abs': abs_bin_edges, 'rel': rel_bin_edges}
 
     for i in range(25):
         pitch_intensity, neural_activity, last_indexes = get_neural_activity_and_pitch_phonetic_for_fold(out, timit_pitch, i, pitch_scaling=pitch_scaling)
-        stims_all, resps_all = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, feat="all")
-        stims_abs_bin, resps_abs_bin = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, feat="abs_bin")
-        stims_rel_bin, resps_rel_bin = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, feat="rel_bin")
-        test_corr_all[:,i], wts_all[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims_all, resps_all)
-        test_corr_abs_bin[:,i], wts_abs[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims_abs_bin, resps_abs_bin)
-        test_corr_rel_bin[:,i], wts_rel[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims_rel_bin, resps_rel_bin)
+        stims, resps, one_hot_groups = get_stims_and_resps_for_feats(pitch_intensity, neural_activity, last_indexes, bin_edges, feats=["all", "abs_bin", "rel_bin"])
+        test_corr_all[:,i], wts_all[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims["all"], resps, one_hot_groups=one_hot_groups["all"])
+        test_corr_abs_bin[:,i], wts_abs[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims["abs_bin"], resps, one_hot_groups=one_hot_groups["abs_bin"])
+        test_corr_rel_bin[:,i], wts_rel[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims["rel_bin"], resps, one_hot_groups=one_hot_groups["rel_bin"])
 
     r2_abs_folds = test_corr_all ** 2 - test_corr_rel_bin ** 2
     r2_rel_folds = test_corr_all ** 2 - test_corr_abs_bin ** 2
@@ -87,17 +96,16 @@ def run_ptrf_analysis_pipeline_for_subject_number_testing_rel_versus_change(subj
     wts_rel = np.zeros((n_chans, 1058, 25)) #598 = 46*13
     wts_change = np.zeros((n_chans, 1058, 25))
 
-    abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(timit_pitch, pitch_scaling=pitch_scaling)
-    abs_change_bin_edges = get_bin_edges_abs_pitch_change(timit_pitch, pitch_scaling=pitch_scaling)
+    abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(pitch_scaling=pitch_scaling)
+    abs_change_bin_edges = get_bin_edges_abs_pitch_change(pitch_scaling=pitch_scaling)
+    bin_edges = {'abs': abs_bin_edges, 'rel': rel_bin_edges, 'abs_change': abs_change_bin_edges}
 
     for i in range(25):
         pitch_intensity, neural_activity, last_indexes = get_neural_activity_and_pitch_phonetic_for_fold(out, timit_pitch, i, pitch_scaling=pitch_scaling)
-        stims_all, resps_all = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, abs_change_bin_edges=abs_change_bin_edges, feat="all_with_change")
-        stims_rel, resps_rel = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, abs_change_bin_edges=abs_change_bin_edges, feat="abs_rel")
-        stims_change, resps_change = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, abs_change_bin_edges=abs_change_bin_edges, feat="abs_change")
-        test_corr_all[:,i], wts_all[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims_all, resps_all)
-        test_corr_rel[:,i], wts_rel[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims_rel, resps_rel)
-        test_corr_change[:,i], wts_change[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims_change, resps_change)
+        stims, resps, one_hot_groups = get_stims_and_resps_for_feats(pitch_intensity, neural_activity, last_indexes, bin_edges, feats=["all_with_change", "abs_rel", "abs_change"])
+        test_corr_all[:,i], wts_all[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims["all_with_change"], resps, one_hot_groups=one_hot_groups["all_with_change"])
+        test_corr_rel[:,i], wts_rel[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims["abs_rel"], resps, one_hot_groups=one_hot_groups["abs_rel"])
+        test_corr_change[:,i], wts_change[:, :, i] = run_cv_temporal_ridge_regression_model_fold(stims["abs_change"], resps, one_hot_groups=one_hot_groups["abs_change"])
 
     r2_rel_folds = test_corr_all ** 2 - test_corr_change ** 2
     r2_change_folds = test_corr_all ** 2 - test_corr_rel ** 2
@@ -125,12 +133,13 @@ def get_subject_permutation_test_data(subject_number, n_perms=200, pitch_scaling
 
     return r2_all_perms, r2_abs_perms, r2_rel_perms
 
+@instrument
 def run_ptrf_analysis_permutation_test(subject_number, n_perms=200, pitch_scaling="log", which_perms=None):
     print("Running ptrf permutation for EC" + str(subject_number))
     print("permutations:")
     print(which_perms)
-    timit_pitch = timit.get_timit_pitch_phonetic()
-    abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(timit_pitch, pitch_scaling=pitch_scaling)
+    abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(pitch_scaling=pitch_scaling)
+    bin_edges = {'abs': abs_bin_edges, 'rel': rel_bin_edges}
 
     out = timit.load_h5py_out(subject_number)
     for trial in out:
@@ -158,12 +167,10 @@ def run_ptrf_analysis_permutation_test(subject_number, n_perms=200, pitch_scalin
         for i in range(25):
             print(i)
             pitch_intensity, neural_activity, last_indexes = get_neural_activity_and_pitch_phonetic_for_fold(out, timit_pitch_shuffled, i, pitch_scaling=pitch_scaling)
-            stims_all, resps_all = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, feat="all")
-            stims_abs_bin, resps_abs_bin = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, feat="abs_bin")
-            stims_rel_bin, resps_rel_bin = get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, feat="rel_bin")
-            test_corr_all[:,i], wts = run_cv_temporal_ridge_regression_model_fold(stims_all, resps_all)
-            test_corr_abs_bin[:,i], wts = run_cv_temporal_ridge_regression_model_fold(stims_abs_bin, resps_abs_bin)
-            test_corr_rel_bin[:,i], wts = run_cv_temporal_ridge_regression_model_fold(stims_rel_bin, resps_rel_bin)
+            stims, resps, one_hot_groups = get_stims_and_resps_for_feats(pitch_intensity, neural_activity, last_indexes, bin_edges, feats=["all", "abs_bin", "rel_bin"])
+            test_corr_all[:,i], wts = run_cv_temporal_ridge_regression_model_fold(stims["all"], resps, one_hot_groups=one_hot_groups["all"])
+            test_corr_abs_bin[:,i], wts = run_cv_temporal_ridge_regression_model_fold(stims["abs_bin"], resps, one_hot_groups=one_hot_groups["abs_bin"])
+            test_corr_rel_bin[:,i], wts = run_cv_temporal_ridge_regression_model_fold(stims["rel_bin"], resps, one_hot_groups=one_hot_groups["rel_bin"])
         
         r2_abs_folds = test_corr_all ** 2 - test_corr_rel_bin ** 2
         r2_rel_folds = test_corr_all ** 2 - test_corr_abs_bin ** 2
@@ -184,24 +191,17 @@ def run_ptrf_analysis_permutation_test(subject_number, n_perms=200, pitch_scalin
 
     save_cv_shuffle_fold(subject_number, r2_all_perms, r2_abs_perms, r2_rel_perms)
 
-def get_abs_and_rel_sig(subject_number):
-    r_all, r_abs, r_rel, abs_r2, rel_r2, wts_all, wts_abs, wts_rel = load_cv_model_fold(subject_number)
-    ptrf_permutation_data = sio.loadmat(os.path.join(results_path, 'EC' + str(subject_number) + '_shuffle200_25fold_ptrf_results_10bins.mat'))
-    r2_abs_perms = ptrf_permutation_data['r2_abs']
-    r2_rel_perms = ptrf_permutation_data['r2_rel']
-    abs_sig = np.ones((256)) * -1
-    rel_sig = np.ones((256)) * -1
-    for chan in np.arange(256):
-        if rel_r2[0, chan] > np.percentile(r2_rel_perms[chan], [95])[0]:
-            rel_sig[chan] = 1
-        else:
-            rel_sig[chan] = 0
-        if abs_r2[0, chan] > np.percentile(r2_abs_perms[chan], [95])[0]:
-            abs_sig[chan] = 1
-        else:
-            abs_sig[chan] = 0
+def get_abs_and_rel_sig(subject_number, q=95):
+    """Returns whether r2 of the absolute and relative pitch models of each channel is greater than percentile q of
+    r2 from the shuffled models (1 if so, 0 otherwise).
+    """
+    r2 = load_cv_model_fold_variables(subject_number, ['r2_abs', 'r2_rel'])
+    ptrf_permutation_data = result_store.load_results(get_cv_shuffle_fold_filename(subject_number), variable_names=['r2_abs', 'r2_rel'])
+    abs_sig = permutation_stats.get_sig(r2['r2_abs'][0, :256], ptrf_permutation_data['r2_abs'][:256], q=q)
+    rel_sig = permutation_stats.get_sig(r2['r2_rel'][0, :256], ptrf_permutation_data['r2_rel'][:256], q=q)
     return abs_sig, rel_sig
 
+@instrument
 def get_neural_activity_and_pitch_phonetic_for_fold(out_h5py, timit_pitch, fold, pitch_scaling="log"):
     out = out_h5py
     n_sentences = len(out)
@@ -281,62 +281,112 @@ def get_nt_nchans_for_out(out, timit_pitch):
             nt = nt + timit_pitch.loc[timit_name].pitch.shape[0]
     return nt, nchans
 
+# blocks of stim columns, computed once per split of a fold and shared by the models (see get_stims_and_resps_for_feats)
+feature_blocks = OrderedDict()
+
+def feature_block(name, one_hot=False):
+    """Registers a block of stim columns. The decorated function gets the pitch_intensity rows of a split (see
+    get_neural_activity_and_pitch_phonetic_for_fold) and a dict of bin edges, and returns the (n_samples x n_columns)
+    block. one_hot blocks (binned pitch) have at most one 1 in each row and are 0 otherwise.
+    """
+    def register(func):
+        feature_blocks[name] = (func, one_hot)
+        return func
+    return register
+
+@feature_block("abs_pitch_change", one_hot=True)
+def get_abs_pitch_change_block(pitch_intensity, bin_edges):
+    return get_pitch_matrix(pitch_intensity[:, 4], bin_edges['abs_change'])
+
+@feature_block("abs_pitch", one_hot=True)
+def get_abs_pitch_block(pitch_intensity, bin_edges):
+    return get_pitch_matrix(pitch_intensity[:, 0], bin_edges['abs'])
+
+@feature_block("rel_pitch", one_hot=True)
+def get_rel_pitch_block(pitch_intensity, bin_edges):
+    return get_pitch_matrix(pitch_intensity[:, 1], bin_edges['rel'])
+
+@feature_block("pitch_binary", one_hot=True)
+def get_pitch_binary_block(pitch_intensity, bin_edges):
+    return (get_pitch_bin_codes(pitch_intensity[:, 1], bin_edges['rel']) >= 0).astype(float)[:, np.newaxis]
+
+@feature_block("intensity")
+def get_intensity_block(pitch_intensity, bin_edges):
+    return transform_intensity(pitch_intensity[:, 2])
+
+@feature_block("bias")
+def get_bias_block(pitch_intensity, bin_edges):
+    return np.ones((pitch_intensity.shape[0], 1))
+
+# blocks of the stim of each model. Blocks that are next to each other in feature_blocks are taken as views.
+feat_blocks = {"abs_bin": ["abs_pitch", "pitch_binary", "intensity", "bias"],
+               "rel_bin": ["rel_pitch", "pitch_binary", "intensity", "bias"],
+               "all": ["abs_pitch", "rel_pitch", "pitch_binary", "intensity", "bias"],
+               "abs_rel": ["abs_pitch", "rel_pitch", "pitch_binary", "intensity", "bias"],
+               "abs_change": ["abs_pitch", "abs_pitch_change", "pitch_binary", "intensity", "bias"],
+               "all_with_change": ["abs_pitch", "rel_pitch", "abs_pitch_change", "pitch_binary", "intensity", "bias"]}
+
+def get_stims_and_resps_for_feats(pitch_intensity, neural_activity, last_indexes, bin_edges, feats=("all", "abs_bin", "rel_bin")):
+    """Returns the stims of several models and the resps for training, hyperparameter optimization, and testing.
+
+    Samples without intensity are removed and each feature block that the models use is computed once for each split,
+    into one buffer. The stim of each model is a view of the buffer if its blocks are next to each other in the
+    buffer, and a copy of its columns otherwise.
+
+    Args:
+        pitch_intensity, neural_activity, last_indexes: output of get_neural_activity_and_pitch_phonetic_for_fold
+        bin_edges (dict): bin edges of pitch features with keys 'abs' and 'rel', and 'abs_change' if a model uses
+            abs_pitch_change
+        feats (list): models, keys of feat_blocks
+
+    Returns:
+        (tuple):
+            * **stims** (*dict*): [train_stim, ridge_stim, test_stim] of each model
+            * **resps** (*list*): [train_resp, ridge_resp, test_resp], shared by the models
+            * **one_hot_groups** (*dict*): sizes of the one-hot blocks at the start of the stim of each model (see
+              temporal_receptive_field.run_cv_temporal_ridge_regression_model_fold)
+    """
+    block_names = [name for name in feature_blocks if any(name in feat_blocks[feat] for feat in feats)]
+    resp = neural_activity.T
+    split_indexes = [0, last_indexes[0], last_indexes[1], pitch_intensity.shape[0]]
+
+    stims = {feat: [] for feat in feats}
+    resps = []
+    for start, stop in zip(split_indexes[:-1], split_indexes[1:]):
+        has_intensity = ~np.isnan(pitch_intensity[start:stop, 2])
+        split_pitch_intensity = pitch_intensity[start:stop][has_intensity]
+        blocks = [feature_blocks[name][0](split_pitch_intensity, bin_edges) for name in block_names]
+        block_columns = {}
+        column = 0
+        for name, block in zip(block_names, blocks):
+            block_columns[name] = np.arange(column, column + block.shape[1])
+            column = column + block.shape[1]
+        buffer = np.hstack(blocks)
+        for feat in feats:
+            columns = np.concatenate([block_columns[name] for name in feat_blocks[feat]])
+            if np.all(np.diff(columns) == 1):
+                stims[feat].append(buffer[:, columns[0]:columns[-1] + 1])
+            else:
+                stims[feat].append(buffer[:, columns])
+        resps.append(resp[start:stop][has_intensity])
+
+    one_hot_groups = {}
+    for feat in feats:
+        one_hot_groups[feat] = [len(block_columns[name]) for name in feat_blocks[feat] if feature_blocks[name][1]]
+    return stims, resps, one_hot_groups
+
 def get_stim_and_resp_from_pitch_intensity_neural_activity_fold(pitch_intensity, neural_activity, last_indexes, abs_bin_edges, rel_bin_edges, abs_change_bin_edges=None, nbins=10, feat="all"):
     """Returns matrices for independent variables (stimulus features) and dependent variables (neural activity on all channels) for training, hyperparamater optimization, and testing.
 
     This function further processes the output of get_neural_activity_and_pitch_phonetic_for_fold. Starting with the nt x n_continuous_features matrix of pitch_intensity and 
     the n_chans x nt matrix of neural activity, this function produces the matrices representing the binary matrix of binned pitch features as the stim and transposes the neural 
     activity to get the resp. These are then split into three matrices along the time dimension.
+
+    To get the stims of several models of the same fold, use get_stims_and_resps_for_feats.
     """
-    resp = neural_activity.T
-    pi_train = pitch_intensity[0:last_indexes[0], :]
-    na_train = resp[0:last_indexes[0], :]
-    pi_ridge = pitch_intensity[last_indexes[0]: last_indexes[1], :]
-    na_ridge = resp[last_indexes[0]:last_indexes[1], :]
-    pi_test = pitch_intensity[last_indexes[1]:, :]
-    na_test = resp[last_indexes[1]:, :]
-    pis = [pi_train, pi_ridge, pi_test]
-    nas = [na_train, na_ridge, na_test]
-
-    full_pitch_intensity = np.copy(pitch_intensity)
-    full_intensity = full_pitch_intensity[:, 2]
-    full_pitch_intensity = full_pitch_intensity[~np.isnan(full_intensity), :]
-    stims = []
-    resps = []
-    for pitch_intensity, neural_activity in zip(pis, nas):
-        intensity = pitch_intensity[:, 2]
-        pitch_intensity = pitch_intensity[~np.isnan(intensity), :]
-        neural_activity = neural_activity[~np.isnan(intensity), :]
-        abs_pitch = pitch_intensity[:, 0]
-        rel_pitch = pitch_intensity[:, 1]
-        abs_pitch_change = pitch_intensity[:, 4]
-
-        if nbins==10:
-            stim_pitch_abs = get_pitch_matrix(abs_pitch, abs_bin_edges)
-            stim_pitch_rel = get_pitch_matrix(rel_pitch, rel_bin_edges)
-            if abs_change_bin_edges is not None:
-                stim_pitch_abs_change = get_pitch_matrix(abs_pitch_change, abs_change_bin_edges)
-
-        pitch_binary = np.any(stim_pitch_rel, axis=1).astype(np.int)[:, np.newaxis]
-        stim_int = transform_intensity(pitch_intensity[:, 2])
-        stim_onset = transform_time_indexes(pitch_intensity[:, 3])
-        bias_ones = np.ones((stim_int.shape[0], 1))
-        if feat == "abs_bin":
-            stim = np.hstack([stim_pitch_abs, pitch_binary, stim_int, bias_ones])
-        elif feat == "rel_bin":
-            stim = np.hstack([stim_pitch_rel, pitch_binary, stim_int, bias_ones])
-        elif feat == "all":
-            stim = np.hstack([stim_pitch_abs, stim_pitch_rel, pitch_binary, stim_int, bias_ones])
-        elif feat == "abs_rel":
-            stim = np.hstack([stim_pitch_abs, stim_pitch_rel, pitch_binary, stim_int, bias_ones])
-        elif feat == "abs_change":
-            stim = np.hstack([stim_pitch_abs, stim_pitch_abs_change, pitch_binary, stim_int, bias_ones])
-        elif feat == "all_with_change":
-            stim = np.hstack([stim_pitch_abs, stim_pitch_rel, stim_pitch_abs_change, pitch_binary, stim_int, bias_ones])
-        stims.append(stim)
-        resps.append(neural_activity)
-
-    return stims, resps
+    bin_edges = {'abs': abs_bin_edges, 'rel': rel_bin_edges, 'abs_change': abs_change_bin_edges}
+    stims, resps, one_hot_groups = get_stims_and_resps_for_feats(pitch_intensity, neural_activity, last_indexes, bin_edges, feats=[feat])
+    return stims[feat], resps
 
 def transform_intensity(intensity):
     assert len(intensity.shape) == 1
@@ -356,8 +406,15 @@ def get_bin_edges_percent_range(a, bins=10, percent=95):
     counts, bin_edges = np.histogram(a, bins=bins, range=a_range)
     return bin_edges
 
-def get_bin_edges_abs_rel(timit_pitch, bins=10, percent=95, pitch_scaling="log"):
-    """Returns abs_bin_edges and rel_bin_edges"""
+def get_bin_edges_abs_rel(timit_pitch=None, bins=10, percent=95, pitch_scaling="log"):
+    """Returns abs_bin_edges and rel_bin_edges
+
+    Without timit_pitch, the saved bin edges of timit_pitch_phonetic.h5 are used (see get_timit_bin_edges).
+    """
+    if timit_pitch is None:
+        bin_edges = get_timit_bin_edges(bins=bins, percent=percent, pitch_scaling=pitch_scaling)
+        return bin_edges['abs'], bin_edges['rel']
+
     if pitch_scaling == "log":
         abs_pitch = timit_pitch['abs_pitch']
         rel_pitch = timit_pitch['rel_pitch_global']
@@ -369,7 +426,14 @@ def get_bin_edges_abs_rel(timit_pitch, bins=10, percent=95, pitch_scaling="log")
     rel_bin_edges = get_bin_edges_percent_range(rel_pitch[~np.isnan(rel_pitch)], bins=bins, percent=percent)
     return abs_bin_edges, rel_bin_edges
 
-def get_bin_edges_abs_pitch_change(timit_pitch, bins=10, percent=95, pitch_scaling="log"):
+def get_bin_edges_abs_pitch_change(timit_pitch=None, bins=10, percent=95, pitch_scaling="log"):
+    """Returns abs_change_bin_edges
+
+    Without timit_pitch, the saved bin edges of timit_pitch_phonetic.h5 are used (see get_timit_bin_edges).
+    """
+    if timit_pitch is None:
+        return get_timit_bin_edges(bins=bins, percent=percent, pitch_scaling=pitch_scaling)['abs_change']
+
     if pitch_scaling == "log":
         abs_pitch_change = timit_pitch['abs_pitch_change']
     elif pitch_scaling == "erb":
@@ -378,54 +442,150 @@ def get_bin_edges_abs_pitch_change(timit_pitch, bins=10, percent=95, pitch_scali
     abs_change_bin_edges = get_bin_edges_percent_range(abs_pitch_change[~np.isnan(abs_pitch_change)], bins=bins, percent=percent)
     return abs_change_bin_edges
 
+# bin edges of the TIMIT pitch already loaded in this process, by cache key
+timit_bin_edges = {}
+
+def get_timit_bin_edges_filename(bins=10, percent=95, pitch_scaling="log"):
+    return os.path.join(processed_timit_data_path, 'timit_bin_edges_' + pitch_scaling + '_' + str(bins) + 'bins_' + str(percent) + '.npz')
+
+def get_timit_bin_edges(bins=10, percent=95, pitch_scaling="log"):
+    """Returns the bin edges of absolute pitch, relative pitch, and absolute pitch change in timit_pitch_phonetic.h5.
+
+    The bin edges are computed once and saved next to timit_pitch_phonetic.h5 (get_timit_bin_edges_filename), and are
+    computed again when timit_pitch_phonetic.h5 changes. They are kept in memory, so do not modify them.
+
+    Returns:
+        (dict): bin edges with keys 'abs', 'rel', and 'abs_change'
+    """
+    timit_pitch_filename = os.path.join(timit.processed_timit_data_path, 'timit_pitch_phonetic.h5')
+    key, description = cache.get_cache_key([timit_pitch_filename], {'bins': bins, 'percent': percent, 'pitch_scaling': pitch_scaling})
+    if key not in timit_bin_edges:
+        filename = get_timit_bin_edges_filename(bins=bins, percent=percent, pitch_scaling=pitch_scaling)
+        bin_edges = cache.load_cached_arrays(filename, key, ['abs', 'rel', 'abs_change'])
+        if bin_edges is None:
+            timit_pitch = timit.get_timit_pitch_phonetic()
+            abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(timit_pitch, bins=bins, percent=percent, pitch_scaling=pitch_scaling)
+            abs_change_bin_edges = get_bin_edges_abs_pitch_change(timit_pitch, bins=bins, percent=percent, pitch_scaling=pitch_scaling)
+            bin_edges = {'abs': abs_bin_edges, 'rel': rel_bin_edges, 'abs_change': abs_change_bin_edges}
+            try:
+                cache.save_cached_arrays(filename, key, description, **bin_edges)
+            except (IOError, OSError):
+                # e.g. installed in a read-only location, the bin edges are computed again in the next process
+                pass
+        timit_bin_edges[key] = bin_edges
+    return timit_bin_edges[key]
+
+def get_pitch_bin_codes(pitch, bin_edges):
+    """Returns the index of the bin of each pitch value, or -1 if it is in no bin (NaN, i.e. unvoiced).
+
+    Values outside bin_edges are put in the first or last bin. pitch is not modified.
+    """
+    pitch = np.asarray(pitch, dtype=float)
+    clipped = np.where(pitch < bin_edges[0], bin_edges[0] + 0.0001, pitch)
+    clipped = np.where(clipped > bin_edges[-1], bin_edges[-1] - 0.0001, clipped)
+    bin_codes = np.digitize(clipped, bin_edges) - 1
+    # NaNs (and values equal to the last edge) are digitized past the last bin
+    bin_codes[bin_codes >= len(bin_edges) - 1] = -1
+    return bin_codes
+
 def get_pitch_matrix(pitch, bin_edges):
-    pitch[pitch < bin_edges[0]] = bin_edges[0] + 0.0001
-    pitch[pitch > bin_edges[-1]] = bin_edges[-1] - 0.0001
-    bin_indexes = np.digitize(pitch, bin_edges) - 1
-    stim_pitch = np.zeros((len(pitch), 10))
-    for i, b in enumerate(bin_indexes):
-        if b < 10:
-            stim_pitch[i, b] = 1
+    """Returns the binary matrix (n_samples x n_bins) with a 1 in the bin of each pitch value (see get_pitch_bin_codes).
+    """
+    bin_codes = get_pitch_bin_codes(pitch, bin_edges)
+    stim_pitch = np.zeros((len(bin_codes), len(bin_edges) - 1))
+    in_bin = bin_codes >= 0
+    stim_pitch[np.flatnonzero(in_bin), bin_codes[in_bin]] = 1
     return stim_pitch
 
 def save_cv_model_fold(subject_number, test_corr_all, test_corr_abs_bin, test_corr_rel_bin, r2_abs, r2_rel, wts_all, wts_abs, wts_rel, pitch_scaling="log", note=""):
-    filename = 'EC' + str(subject_number) + '_25fold_ptrf_results_10bins' + note
-    if pitch_scaling != "log":
-        filename = filename + "_" + pitch_scaling
-    filename = os.path.join(results_path, filename + ".mat")
-    sio.savemat(filename, {'r_all': test_corr_all, 'r_abs_bin': test_corr_abs_bin,
+    filename = get_cv_model_fold_filename(subject_number, pitch_scaling=pitch_scaling, note=note)
+    result_store.save_results(filename, {'r_all': test_corr_all, 'r_abs_bin': test_corr_abs_bin,
           'r_rel_bin': test_corr_rel_bin, 'r2_abs': r2_abs, 'r2_rel': r2_rel, 'wts_all': wts_all, 'wts_abs': wts_abs, 'wts_rel': wts_rel})
 
-def load_cv_model_fold(subject_number, pitch_scaling="log", note=""):
+def load_cv_model_fold(subject_number, pitch_scaling="log", note="", mmap_mode=None):
+    """Loads ptrf results saved by save_cv_model_fold.
+
+    With results saved in the "npy" format (see result_store), mmap_mode='r' memory-maps the weights instead of
+    reading them.
+    """
+    data = result_store.load_results(get_cv_model_fold_filename(subject_number, pitch_scaling=pitch_scaling, note=note), mmap_mode=mmap_mode)
+    return data['r_all'], data['r_abs_bin'], data['r_rel_bin'], data['r2_abs'], data['r2_rel'], data['wts_all'], data['wts_abs'], data['wts_rel']
+
+def load_cv_model_fold_variables(subject_number, variable_names, pitch_scaling="log", note="", mmap_mode=None):
+    """Loads only the variables in variable_names (e.g. ['r2_abs', 'r2_rel']) from the ptrf results.
+
+    Returns:
+        (dict): variable names and arrays
+    """
+    return result_store.load_results(get_cv_model_fold_filename(subject_number, pitch_scaling=pitch_scaling, note=note),
+                                     variable_names=variable_names, mmap_mode=mmap_mode)
+
+def load_cv_model_fold_wts(subject_number, chans, model="all", pitch_scaling="log", note=""):
+    """Returns the weights of one model (all, abs, or rel) for chans, shape is (len(chans), n_features, n_folds).
+
+    With results saved in the "npy" format, only the weights of chans are read from disk.
+    """
+    wts = load_cv_model_fold_variables(subject_number, ['wts_' + model], pitch_scaling=pitch_scaling, note=note, mmap_mode='r')['wts_' + model]
+    return np.array(wts[chans])
+
+def get_cv_model_fold_filename(subject_number, pitch_scaling="log", note=""):
     filename = 'EC' + str(subject_number) + '_25fold_ptrf_results_10bins' + note
     if pitch_scaling != "log":
         filename = filename + "_" + pitch_scaling
-    filename = os.path.join(results_path, filename + ".mat")
-    data = sio.loadmat(filename)
-    return data['r_all'], data['r_abs_bin'], data['r_rel_bin'], data['r2_abs'], data['r2_rel'], data['wts_all'], data['wts_abs'], data['wts_rel']
+    return os.path.join(results_path, filename + ".mat")
 
-def save_cv_shuffle_fold(subject_number, r2_all, r2_abs, r2_rel, pitch_scaling="log"):
+def get_cv_shuffle_fold_filename(subject_number, pitch_scaling="log"):
     filename = 'EC' + str(subject_number) + '_shuffle200_25fold_ptrf_results_10bins.mat'
     if pitch_scaling != "log":
         filename = filename + "_" + pitch_scaling
-    filename = os.path.join(results_path, filename)
-    sio.savemat(filename, {'r2_all': r2_all, 'r2_abs': r2_abs, 'r2_rel': r2_rel})
+    return os.path.join(results_path, filename)
+
+def save_cv_shuffle_fold(subject_number, r2_all, r2_abs, r2_rel, pitch_scaling="log"):
+    filename = get_cv_shuffle_fold_filename(subject_number, pitch_scaling=pitch_scaling)
+    result_store.save_results(filename, {'r2_all': r2_all, 'r2_abs': r2_abs, 'r2_rel': r2_rel})
 
 def load_cv_shuffle_fold(subject_number, pitch_scaling="log"):
-    filename = 'EC' + str(subject_number) + '_shuffle200_25fold_ptrf_results_10bins.mat'
-    if pitch_scaling != "log":
-        filename = filename + "_" + pitch_scaling
-    filename = os.path.join(results_path, filename)
-    data = sio.loadmat(filename)
+    filename = get_cv_shuffle_fold_filename(subject_number, pitch_scaling=pitch_scaling)
+    data = result_store.load_results(filename)
     return data['r2_all'], data['r2_abs'], data['r2_rel']
 
-def get_intonation_tokens_stim():
+# stims of the intonation tokens (by bin edges and delays) and predicted responses to them (by subject, with the size
+# and modification time of the ptrf results they were predicted from) that were already computed in this process
+token_stims = {}
+token_preds = {}
+
+def get_intonation_tokens_stim(abs_bin_edges=None, rel_bin_edges=None, delays=get_delays()):
+    """Returns the stims of each intonation token for the ptrf models, including the delayed stims dstims_all,
+    dstims_abs, and dstims_rel.
+
+    Bin edges default to those of the TIMIT pitch (get_timit_bin_edges). The stims are computed once in a process for
+    each set of bin edges and delays, and are shared by all callers, so they should not be modified.
+    """
+    token_stim_mat, token_names, dstims = get_intonation_tokens_stim_and_dstims(abs_bin_edges, rel_bin_edges, delays)
+    return token_stim_mat
+
+def get_intonation_tokens_dstims(abs_bin_edges=None, rel_bin_edges=None, delays=get_delays()):
+    """Returns the delayed stims of all intonation tokens, stacked for each ptrf model (see get_intonation_tokens_stim).
+
+    Returns:
+        (tuple):
+            * **token_names** (*list*): names of the tokens, in the order of the stacked stims
+            * **dstims** (*dict*): "all", "abs" and "rel" models and their (n_tokens, n_times, n_features) delayed stims
+    """
+    token_stim_mat, token_names, dstims = get_intonation_tokens_stim_and_dstims(abs_bin_edges, rel_bin_edges, delays)
+    return token_names, dstims
+
+def get_intonation_tokens_stim_and_dstims(abs_bin_edges=None, rel_bin_edges=None, delays=get_delays()):
+    if abs_bin_edges is None or rel_bin_edges is None:
+        abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel()
+    key = (tuple(abs_bin_edges), tuple(rel_bin_edges), tuple(delays))
+    if key in token_stims:
+        return token_stims[key]
+
     pitch_intensity_intonation = get_pitch_and_intensity()
-    timit_pitch = timit.get_timit_pitch_phonetic()
-    abs_bin_edges, rel_bin_edges = get_bin_edges_abs_rel(timit_pitch)
 
     token_stim = {}
-    for token, pi in pitch_intensity_intonation.iteritems():
+    for token, pi in pitch_intensity_intonation.items():
         token_stim[token] = {}
         token_stim[token]['abs_pitch'] = timit.zscore_abs_pitch(pi['pitch'])
         token_stim[token]['intensity'] = timit.zscore_intensity(pi['intensity'])
@@ -436,14 +596,13 @@ def get_intonation_tokens_stim():
         token_stim[token]['stim_int'] = transform_intensity(token_stim[token]['intensity'])
         token_stim[token]['bias_ones'] = np.ones((token_stim[token]['stim_int'].shape[0], 1))
 
-    delays = get_delays()
     padding_all = np.zeros((75, 23))
     padding_all[:,22] = 1
     padding_other = np.zeros((75, 13))
     padding_other[:,12] = 1
 
     token_stim_mat = {}
-    for token, s in token_stim.iteritems():
+    for token, s in token_stim.items():
         token_stim_mat[token] = {}
         token_stim_mat[token]['abs_bin'] = np.hstack([s['stim_pitch_abs'], s['pitch_binary'], s['stim_int'], s['bias_ones']])
         token_stim_mat[token]['rel_bin'] = np.hstack([s['stim_pitch_rel'], s['pitch_binary'], s['stim_int'], s['bias_ones']])
@@ -455,18 +614,33 @@ def get_intonation_tokens_stim():
         token_stim_mat[token]['abs_padded'] = np.concatenate([padding_other, token_stim_mat[token]['abs_bin'], padding_other], axis=0)
         token_stim_mat[token]['rel_padded'] = np.concatenate([padding_other, token_stim_mat[token]['rel_bin'], padding_other], axis=0)
 
-        token_stim_mat[token]['dstims_all'] = get_dstim(token_stim_mat[token]['all_padded'], delays)
-        token_stim_mat[token]['dstims_abs'] = get_dstim(token_stim_mat[token]['abs_padded'], delays)
-        token_stim_mat[token]['dstims_rel'] = get_dstim(token_stim_mat[token]['rel_padded'], delays)
+    # the delayed stims of each token are views of one array per model, so that all tokens are predicted at once
+    token_names = sorted(token_stim_mat)
+    dstims = {}
+    for model in ['all', 'abs', 'rel']:
+        dstims[model] = np.array([get_dstim(token_stim_mat[token][model + '_padded'], delays) for token in token_names])
+        for token_i, token in enumerate(token_names):
+            token_stim_mat[token]['dstims_' + model] = dstims[model][token_i]
 
-    return token_stim_mat
+    token_stims[key] = (token_stim_mat, token_names, dstims)
+    return token_stims[key]
+
+def predict_response_to_intonation_stims(subject_number, chan=None):
+    """Returns the mean and standard error of the responses to the intonation tokens predicted by the ptrf models
+    (all, abs, rel) of all channels of subject_number, for each intonation condition and speaker.
 
-def predict_response_to_intonation_stims(subject_number, chan):
-    token_stim_mat = get_intonation_tokens_stim()
-    r_all, r_abs, r_rel, abs_r2, rel_r2, wts_all, wts_abs, wts_rel = load_cv_model_fold(subject_number)
-    wts_all = np.nanmean(wts_all, axis=2)
-    wts_abs = np.nanmean(wts_abs, axis=2)
-    wts_rel = np.nanmean(wts_rel, axis=2)
+    The predictions of a subject are computed once in a process, and again if its ptrf results are saved again. chan
+    is not used, since the predictions of all channels are returned.
+    """
+    path, format = result_store.find_results(get_cv_model_fold_filename(subject_number))
+    file_signature = cache.get_file_signature(path) if path is not None else {}
+    signature = (file_signature.get('size'), file_signature.get('mtime'))
+    if subject_number in token_preds and token_preds[subject_number][0] == signature:
+        return token_preds[subject_number][1]
+
+    token_names, dstims = get_intonation_tokens_dstims()
+    wts = load_cv_model_fold_variables(subject_number, ['wts_all', 'wts_abs', 'wts_rel'])
+    token_indexes = dict((token, token_i) for token_i, token in enumerate(token_names))
 
     tokens_male_st1 = ['sn1_st1_sp1', 'sn2_st1_sp1', 'sn3_st1_sp1', 'sn4_st1_sp1']
     tokens_male_st2 = ['sn1_st2_sp1', 'sn2_st2_sp1', 'sn3_st2_sp1', 'sn4_st2_sp1']
@@ -478,38 +652,29 @@ def predict_response_to_intonation_stims(subject_number, chan):
     tokens_female_st3 = ['sn1_st3_sp2', 'sn2_st3_sp2', 'sn3_st3_sp2', 'sn4_st3_sp2', 'sn1_st3_sp3', 'sn2_st3_sp3', 'sn3_st3_sp3', 'sn4_st3_sp3']
     tokens_female_st4 = ['sn1_st4_sp2', 'sn2_st4_sp2', 'sn3_st4_sp2', 'sn4_st4_sp2', 'sn1_st4_sp3', 'sn2_st4_sp3', 'sn3_st4_sp3', 'sn4_st4_sp3']
 
-    tokens = [tokens_male_st1, tokens_male_st2, tokens_male_st3, tokens_male_st4, tokens_female_st1, tokens_female_st2, tokens_female_st3, tokens_female_st4]
-
-    all_preds_tokens = [[get_all_pred(wts_all, token_stim_mat[token]['dstims_all']) for token in tokens_list] for tokens_list in tokens]
-    abs_pred_tokens = [[get_all_pred(wts_abs, token_stim_mat[token]['dstims_abs']) for token in tokens_list] for tokens_list in tokens]
-    rel_pred_tokens = [[get_all_pred(wts_rel, token_stim_mat[token]['dstims_rel']) for token in tokens_list] for tokens_list in tokens]
-
-    all_preds1 = [np.mean(np.array(a), axis=0)[:,50:350] for a in all_preds_tokens]
-    abs_pred1 = [np.mean(np.array(a), axis=0)[:,50:350] for a in abs_pred_tokens]
-    rel_pred1 = [np.mean(np.array(a), axis=0)[:,50:350] for a in rel_pred_tokens]
-
-    all_preds_ste1 = [np.std(np.array(a), axis=0)[:,50:350]/np.sqrt(len(a)) for a in all_preds_tokens]
-    abs_pred_ste1 = [np.std(np.array(a), axis=0)[:,50:350]/np.sqrt(len(a)) for a in abs_pred_tokens]
-    rel_pred_ste1 = [np.std(np.array(a), axis=0)[:,50:350]/np.sqrt(len(a)) for a in rel_pred_tokens]
-
     tokens_male = tokens_male_st1 + tokens_male_st2 + tokens_male_st3 + tokens_male_st4
     tokens_female = tokens_female_st1 + tokens_female_st2 + tokens_female_st3 + tokens_female_st4
 
-    tokens = [tokens_male, tokens_female]
-
-    all_preds_tokens = [[get_all_pred(wts_all, token_stim_mat[token]['dstims_all']) for token in tokens_list] for tokens_list in tokens]
-    abs_pred_tokens = [[get_all_pred(wts_abs, token_stim_mat[token]['dstims_abs']) for token in tokens_list] for tokens_list in tokens]
-    rel_pred_tokens = [[get_all_pred(wts_rel, token_stim_mat[token]['dstims_rel']) for token in tokens_list] for tokens_list in tokens]
+    token_groups1 = [tokens_male_st1, tokens_male_st2, tokens_male_st3, tokens_male_st4, tokens_female_st1, tokens_female_st2, tokens_female_st3, tokens_female_st4]
+    token_groups2 = [tokens_male, tokens_female]
 
-    all_preds2 = [np.mean(np.array(a), axis=0)[:,50:350] for a in all_preds_tokens]
-    abs_pred2 = [np.mean(np.array(a), axis=0)[:,50:350] for a in abs_pred_tokens]
-    rel_pred2 = [np.mean(np.array(a), axis=0)[:,50:350] for a in rel_pred_tokens]
+    # predictions from the mean wts over folds, only at the times that are returned (predictions at a time only
+    # depend on the dstim at that time)
+    token_groups = token_groups1 + token_groups2
+    groups = [[token_indexes[token] for token in tokens] for tokens in token_groups]
+    means_stes = {}
+    for model in ['all', 'abs', 'rel']:
+        means_stes[model] = get_group_pred_mean_and_ste(np.nanmean(wts['wts_' + model], axis=2), dstims[model][:, 50:350], groups)
 
-    all_preds_ste2 = [np.std(np.array(a), axis=0)[:,50:350]/np.sqrt(len(a)) for a in all_preds_tokens]
-    abs_pred_ste2 = [np.std(np.array(a), axis=0)[:,50:350]/np.sqrt(len(a)) for a in abs_pred_tokens]
-    rel_pred_ste2 = [np.std(np.array(a), axis=0)[:,50:350]/np.sqrt(len(a)) for a in rel_pred_tokens]
+    results = []
+    for group_slice in [slice(0, len(token_groups1)), slice(len(token_groups1), len(token_groups))]:
+        for model in ['all', 'abs', 'rel']:
+            pred_means, pred_stes = means_stes[model]
+            results.append(list(pred_means[group_slice]))
+            results.append(list(pred_stes[group_slice]))
 
-    return all_preds1, all_preds_ste1, abs_pred1, abs_pred_ste1, rel_pred1, rel_pred_ste1, all_preds2, all_preds_ste2, abs_pred2, abs_pred_ste2, rel_pred2, rel_pred_ste2
+    token_preds[subject_number] = (signature, tuple(results))
+    return token_preds[subject_number][1]
 
 def nan_zscore(a):
     a[~np.isnan(a)] = zscore(a[~np.isnan(a)])
@@ -568,117 +733,3 @@ def randomize_timit_pitch_contours(timit_pitch, save_as=None):
         timit_pitch.to_hdf(filename, 'timit_pitch_shuffle_' + str(save_as))
 
     return timit_pitch
-
-def plot_prediction_overlay(test_corr, resp, all_pred, pitch_intensity, chans=[], start_time=5000):
-    chans = np.array(chans)
-    if chans.shape[0] == 0:
-        sorted_chans = test_corr.argsort()
-        chans = sorted_chans[-3:]
-    chans = np.array(chans)
-    corrs = np.array(test_corr)[chans]
-    n_chans = chans.shape[0]
-    fig = plt.figure(figsize=(10, 2*n_chans + 2))
-    for i, (chan, r) in enumerate(zip(chans, corrs)):
-        ax = fig.add_subplot(n_chans+1, 1, i+1)
-        ax.plot(all_pred[chan, start_time:start_time+500], 'k')
-        ax.plot(resp[start_time:start_time+500, chan], 'r')
-        ax.set_title("Channel %d, r=%2.2f"%(chan, r))
-    ax = fig.add_subplot(n_chans+1, 1, n_chans+1)
-    ax.plot(pitch_intensity[3,start_time:start_time+500], 'm')
-    ax.set_title('Stimulus')
-    fig.tight_layout()
-    return fig
-
-def get_channel_order():
-    channel_order = []
-    for i in np.arange(16):
-        x = np.arange(256-i,16-i-1,-16)
-        channel_order.append(x)
-    return np.hstack(channel_order)
-
-def plot_trf(wts, chan, wts_shape=(46,23), wts1=(0, 10), wts2=(10, 20), min_max=(0, 20), wts1_label=None, wts2_label=None):
-    fig, axs = plt.subplots(2, 1, figsize=(3.5, 5), sharex=True)
-    min_value = np.min(wts[chan].reshape(*wts_shape)[3:43, min_max[0]:min_max[1]])
-    max_value = np.max(wts[chan].reshape(*wts_shape)[3:43, min_max[0]:min_max[1]])
-    abs_value = np.max(np.abs([min_value, max_value]))
-    min_value = -1 * abs_value
-    max_value = abs_value
-    im1 = axs[0].imshow(np.fliplr(np.flipud(wts[chan].reshape(*wts_shape)[3:43, wts1[0]:wts1[1]].T)), cmap=plt.get_cmap('RdBu_r'), aspect="auto")
-    im3 = axs[1].imshow(np.fliplr(np.flipud(wts[chan].reshape(*wts_shape)[3:43, wts2[0]:wts2[1]].T)), cmap=plt.get_cmap('PuOr_r'), aspect="auto")
-    for im in [im1, im3]:
-        im.set_clim((-1 * abs_value, abs_value))
-    min_tick_value = np.trunc(np.ceil(min_value * 100))/100
-    max_tick_value = np.trunc(np.floor(max_value * 100))/100
-    fig.colorbar(im1, ax=axs[0], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
-    fig.colorbar(im3, ax=axs[1], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
-    if wts1_label is None:
-        im1.axes.set(yticks=(0, 3, 6, 9), yticklabels=[250, 200, 150, 90], ylabel="Absolute pitch (Hz)")
-    if wts2_label is None:
-        im3.axes.set(xticks=[0, 39], xticklabels=[400, 0], xlabel="Delay (ms)", 
-            yticks=(0,3,6,9), yticklabels=[1.7, 0.6, -0.5, -1.7], ylabel="Relative pitch (z-score)")
-    fig.tight_layout()
-    return fig
-
-def plot_trf_rel_versus_change(wts, chan):
-    fig, axs = plt.subplots(2, 1, figsize=(3.5, 5), sharex=True)
-    min_value = np.min(wts[chan].reshape(46,33)[3:43, 10:30])
-    max_value = np.max(wts[chan].reshape(46,33)[3:43, 10:30])
-    abs_value = np.max(np.abs([min_value, max_value]))
-    min_value = -1 * abs_value
-    max_value = abs_value
-    im1 = axs[0].imshow(np.fliplr(np.flipud(wts[chan].reshape(46, 33)[3:43,20:30].T)), cmap=plt.get_cmap('RdBu_r'), aspect="auto")
-    im3 = axs[1].imshow(np.fliplr(np.flipud(wts[chan].reshape(46, 33)[3:43,10:20].T)), cmap=plt.get_cmap('PuOr_r'), aspect="auto")
-    for im in [im1, im3]:
-        im.set_clim((-1 * abs_value, abs_value))
-    min_tick_value = np.trunc(np.ceil(min_value * 100))/100
-    max_tick_value = np.trunc(np.floor(max_value * 100))/100
-    fig.colorbar(im1, ax=axs[0], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
-    fig.colorbar(im3, ax=axs[1], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
-    #im1.axes.set(yticks=(0, 3, 6, 9), yticklabels=[250, 200, 150, 90], ylabel="Absolute pitch change (Hz')")
-    #im3.axes.set(xticks=[0, 39], xticklabels=[400, 0], xlabel="Delay (ms)", 
-    #    yticks=(0,3,6,9), yticklabels=[1.7, 0.6, -0.5, -1.7], ylabel="Relative pitch (z-score)")
-    fig.tight_layout()
-    return fig
-
-def plot_trfs(wts, test_corr, delays, vlim=None, with_edges=True):
-    if with_edges:
-        trfs = [wts[chan, :].reshape(len(delays)+6, -1)[3:-3,:-2].T for chan in range(wts.shape[0])]
-    else:
-        trfs = [wts[chan, :].reshape(len(delays), -1).T for chan in range(wts.shape[0])]
-    titles = [test_corr[chan] for chan in range(wts.shape[0])]
-    if vlim is None:
-        val = np.max(np.abs([np.min(trfs), np.max(trfs)]))
-        vlim = [-1*val, val]
-    figs = []
-    figs.append(plot_grid(trfs[:256], titles[:256], vlim=vlim))
-    if(len(trfs) == 288):
-        figs.append(plot_heschls(trfs[256:], titles[256:], vlim=vlim))
-    return figs
-
-def plot_grid(data, titles, vlim=(-0.2, 0.2)):
-    channel_order = get_channel_order()
-    fig = plt.figure(figsize=(40, 40))
-
-    for i, (data_chan, title) in enumerate(zip(data, titles)):
-        ax = fig.add_subplot(16, 16, channel_order[i])
-        plt.imshow(data_chan, vmin=vlim[0], vmax=vlim[1], cmap=plt.get_cmap("RdBu_r"), aspect="auto", interpolation="none")
-        ax.set_title('%d, r=%2.2f'%(i, title))
-        ax.set_xticks([])
-        ax.set_yticks([])
-
-    fig.tight_layout()
-    return fig
-
-def plot_heschls(data, titles, vlim=(-0.2, 0.2)):
-    channel_order = np.arange(32) + 256 + 1
-    fig = plt.figure(figsize=(20, 10))
-
-    for i, (data_chan, title) in enumerate(zip(data, titles)):
-        ax = fig.add_subplot(4, 8, channel_order[i] - 256)
-        plt.imshow(data_chan, vmin=vlim[0], vmax=vlim[1], cmap=plt.get_cmap("RdBu_r"), aspect="auto", interpolation="none")
-        ax.set_title('%d, r=%2.2f'%(i + 256, title))
-        ax.set_xticks([])
-        ax.set_yticks([])
-
-    fig.tight_layout()
-    return fig
@@ -0,0 +1,123 @@
+"""Plots of the pitch temporal receptive fields (ptrf) and their predictions.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import numpy as np
+
+from .lazy_imports import lazy_import
+plt = lazy_import('matplotlib.pyplot')
+
+def plot_prediction_overlay(test_corr, resp, all_pred, pitch_intensity, chans=[], start_time=5000):
+    chans = np.array(chans)
+    if chans.shape[0] == 0:
+        sorted_chans = test_corr.argsort()
+        chans = sorted_chans[-3:]
+    chans = np.array(chans)
+    corrs = np.array(test_corr)[chans]
+    n_chans = chans.shape[0]
+    fig = plt.figure(figsize=(10, 2*n_chans + 2))
+    for i, (chan, r) in enumerate(zip(chans, corrs)):
+        ax = fig.add_subplot(n_chans+1, 1, i+1)
+        ax.plot(all_pred[chan, start_time:start_time+500], 'k')
+        ax.plot(resp[start_time:start_time+500, chan], 'r')
+        ax.set_title("Channel %d, r=%2.2f"%(chan, r))
+    ax = fig.add_subplot(n_chans+1, 1, n_chans+1)
+    ax.plot(pitch_intensity[3,start_time:start_time+500], 'm')
+    ax.set_title('Stimulus')
+    fig.tight_layout()
+    return fig
+
+def get_channel_order():
+    channel_order = []
+    for i in np.arange(16):
+        x = np.arange(256-i,16-i-1,-16)
+        channel_order.append(x)
+    return np.hstack(channel_order)
+
+def plot_trf(wts, chan, wts_shape=(46,23), wts1=(0, 10), wts2=(10, 20), min_max=(0, 20), wts1_label=None, wts2_label=None):
+    fig, axs = plt.subplots(2, 1, figsize=(3.5, 5), sharex=True)
+    min_value = np.min(wts[chan].reshape(*wts_shape)[3:43, min_max[0]:min_max[1]])
+    max_value = np.max(wts[chan].reshape(*wts_shape)[3:43, min_max[0]:min_max[1]])
+    abs_value = np.max(np.abs([min_value, max_value]))
+    min_value = -1 * abs_value
+    max_value = abs_value
+    im1 = axs[0].imshow(np.fliplr(np.flipud(wts[chan].reshape(*wts_shape)[3:43, wts1[0]:wts1[1]].T)), cmap=plt.get_cmap('RdBu_r'), aspect="auto")
+    im3 = axs[1].imshow(np.fliplr(np.flipud(wts[chan].reshape(*wts_shape)[3:43, wts2[0]:wts2[1]].T)), cmap=plt.get_cmap('PuOr_r'), aspect="auto")
+    for im in [im1, im3]:
+        im.set_clim((-1 * abs_value, abs_value))
+    min_tick_value = np.trunc(np.ceil(min_value * 100))/100
+    max_tick_value = np.trunc(np.floor(max_value * 100))/100
+    fig.colorbar(im1, ax=axs[0], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
+    fig.colorbar(im3, ax=axs[1], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
+    if wts1_label is None:
+        im1.axes.set(yticks=(0, 3, 6, 9), yticklabels=[250, 200, 150, 90], ylabel="Absolute pitch (Hz)")
+    if wts2_label is None:
+        im3.axes.set(xticks=[0, 39], xticklabels=[400, 0], xlabel="Delay (ms)", 
+            yticks=(0,3,6,9), yticklabels=[1.7, 0.6, -0.5, -1.7], ylabel="Relative pitch (z-score)")
+    fig.tight_layout()
+    return fig
+
+def plot_trf_rel_versus_change(wts, chan):
+    fig, axs = plt.subplots(2, 1, figsize=(3.5, 5), sharex=True)
+    min_value = np.min(wts[chan].reshape(46,33)[3:43, 10:30])
+    max_value = np.max(wts[chan].reshape(46,33)[3:43, 10:30])
+    abs_value = np.max(np.abs([min_value, max_value]))
+    min_value = -1 * abs_value
+    max_value = abs_value
+    im1 = axs[0].imshow(np.fliplr(np.flipud(wts[chan].reshape(46, 33)[3:43,20:30].T)), cmap=plt.get_cmap('RdBu_r'), aspect="auto")
+    im3 = axs[1].imshow(np.fliplr(np.flipud(wts[chan].reshape(46, 33)[3:43,10:20].T)), cmap=plt.get_cmap('PuOr_r'), aspect="auto")
+    for im in [im1, im3]:
+        im.set_clim((-1 * abs_value, abs_value))
+    min_tick_value = np.trunc(np.ceil(min_value * 100))/100
+    max_tick_value = np.trunc(np.floor(max_value * 100))/100
+    fig.colorbar(im1, ax=axs[0], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
+    fig.colorbar(im3, ax=axs[1], ticks=[min_tick_value, 0, max_tick_value], aspect=10)
+    #im1.axes.set(yticks=(0, 3, 6, 9), yticklabels=[250, 200, 150, 90], ylabel="Absolute pitch change (Hz')")
+    #im3.axes.set(xticks=[0, 39], xticklabels=[400, 0], xlabel="Delay (ms)", 
+    #    yticks=(0,3,6,9), yticklabels=[1.7, 0.6, -0.5, -1.7], ylabel="Relative pitch (z-score)")
+    fig.tight_layout()
+    return fig
+
+def plot_trfs(wts, test_corr, delays, vlim=None, with_edges=True):
+    if with_edges:
+        trfs = [wts[chan, :].reshape(len(delays)+6, -1)[3:-3,:-2].T for chan in range(wts.shape[0])]
+    else:
+        trfs = [wts[chan, :].reshape(len(delays), -1).T for chan in range(wts.shape[0])]
+    titles = [test_corr[chan] for chan in range(wts.shape[0])]
+    if vlim is None:
+        val = np.max(np.abs([np.min(trfs), np.max(trfs)]))
+        vlim = [-1*val, val]
+    figs = []
+    figs.append(plot_grid(trfs[:256], titles[:256], vlim=vlim))
+    if(len(trfs) == 288):
+        figs.append(plot_heschls(trfs[256:], titles[256:], vlim=vlim))
+    return figs
+
+def plot_grid(data, titles, vlim=(-0.2, 0.2)):
+    channel_order = get_channel_order()
+    fig = plt.figure(figsize=(40, 40))
+
+    for i, (data_chan, title) in enumerate(zip(data, titles)):
+        ax = fig.add_subplot(16, 16, channel_order[i])
+        plt.imshow(data_chan, vmin=vlim[0], vmax=vlim[1], cmap=plt.get_cmap("RdBu_r"), aspect="auto", interpolation="none")
+        ax.set_title('%d, r=%2.2f'%(i, title))
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+    fig.tight_layout()
+    return fig
+
+def plot_heschls(data, titles, vlim=(-0.2, 0.2)):
+    channel_order = np.arange(32) + 256 + 1
+    fig = plt.figure(figsize=(20, 10))
+
+    for i, (data_chan, title) in enumerate(zip(data, titles)):
+        ax = fig.add_subplot(4, 8, channel_order[i] - 256)
+        plt.imshow(data_chan, vmin=vlim[0], vmax=vlim[1], cmap=plt.get_cmap("RdBu_r"), aspect="auto", interpolation="none")
+        ax.set_title('%d, r=%2.2f'%(i + 256, title))
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+    fig.tight_layout()
+    return fig
@@ -0,0 +1,334 @@
+"""Frozen copies of the published implementations of the main analyses, used as references by ``equivalence``.
+
+The functions here are the implementations the results in the paper were computed with, kept as they were so that
+optimized implementations in the other modules can be checked against them. Do not optimize or refactor them.
+
+The few changes from the published code do not change any output:
+
+* the debugging prints of get_timelocked_activity are removed, and epoch boundaries are cast to int (they were floats,
+  which newer numpy versions reject as slice indices).
+* get_psis takes timit_phonemes as an argument (loaded with timit.get_timit_phonemes if None), so it can be run on
+  synthetic data.
+* test_invariance draws the permutations of each (to_cond, p) from the random stream that
+  intonation_invariance.get_perm_random_state gives that task, in the same order the published code drew them from
+  np.random, so that it can be compared to the parallel implementation with the same seed. Progress bars are removed.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+from functools import reduce
+
+import numpy as np
+from scipy.stats import f
+
+from .lazy_imports import lazy_import
+sm = lazy_import('statsmodels.formula.api')
+stats = lazy_import('scipy.stats')
+discriminant_analysis = lazy_import('sklearn.discriminant_analysis')
+
+default_which_chans = np.arange(256)
+
+# temporal_receptive_field
+
+def get_dstim(stim, delays, add_edges=True):
+    n_samples, n_features = stim.shape
+    if add_edges:
+        step = delays[1] - delays[0]
+        delays_beg = [delays[0]-3*step, delays[0]-2*step, delays[0]-step]
+        delays_end = [delays[-1]+step, delays[-1]+2*step, delays[-1]+3*step]
+        delays = np.concatenate([delays_beg, delays, delays_end])
+    dstim = []
+    for i, d in enumerate(delays):
+        dstim_slice = np.zeros((n_samples, n_features))
+        if d<0:
+            dstim_slice[:d, :] = stim[-d:, :]
+        elif d>0:
+            dstim_slice[d:, :] = stim[:-d, :]
+        else:
+            dstim_slice = stim.copy()
+        dstim.append(dstim_slice)
+
+    dstim = np.hstack(dstim)
+    return dstim
+
+def run_cv_temporal_ridge_regression_model_fold(stims, resps, delays, alphas):
+    dstims = [get_dstim(stim, delays) for stim in stims]
+    n_chans = resps[0].shape[1]
+
+    wts_alphas, ridge_corrs_alphas = run_ridge_regression(dstims[0], resps[0], dstims[1], resps[1], alphas)
+    best_alphas = ridge_corrs_alphas.argmax(0) #returns array with length nchans.
+    best_wts = [wts_alphas[best_alphas[chan], :, chan] for chan in range(n_chans)]
+    test_pred = [np.dot(dstims[2], best_wts[chan]) for chan in range(n_chans)]
+    test_corr = np.array([np.corrcoef(test_pred[chan], resps[2][:, chan])[0,1] for chan in range(n_chans)])
+    test_corr[np.isnan(test_corr)] = 0
+
+    wts = np.array(best_wts)
+    return test_corr, wts
+
+def run_ridge_regression(train_stim, train_resp, ridge_stim, ridge_resp, alphas):
+    n_features = train_stim.shape[1] #stim shape is time x features
+    n_chans = train_resp.shape[1] #resp shape is time x channels
+    n_alphas = alphas.shape[0]
+
+    wts = np.zeros((n_alphas, n_features, n_chans))
+    ridge_corrs = np.zeros((n_alphas, n_chans))
+
+    dtype = np.single
+    covmat = np.array(np.dot(train_stim.astype(dtype).T, train_stim.astype(dtype)))
+    l, Q = np.linalg.eigh(covmat)
+    Usr = np.dot(Q.T, np.dot(train_stim.T, train_resp))
+
+    for alpha_i, alpha in enumerate(alphas):
+        D_inv = np.diag(1/(l+alpha)).astype(dtype)
+        wt = np.array(reduce(np.dot, [Q, D_inv, Usr]).astype(dtype))
+        pred = np.dot(ridge_stim, wt)
+        ridge_corr = np.zeros((n_chans))
+        for i in range(ridge_resp.shape[1]):
+            ridge_corr[i] = np.corrcoef(ridge_resp[:, i], pred[:, i])[0, 1]
+        ridge_corr[np.isnan(ridge_corr)] = 0
+
+        ridge_corrs[alpha_i, :] = ridge_corr
+        wts[alpha_i, :, :] = wt
+
+    return wts, ridge_corrs
+
+# pitch_trf
+
+def get_pitch_matrix(pitch, bin_edges):
+    pitch[pitch < bin_edges[0]] = bin_edges[0] + 0.0001
+    pitch[pitch > bin_edges[-1]] = bin_edges[-1] - 0.0001
+    bin_indexes = np.digitize(pitch, bin_edges) - 1
+    stim_pitch = np.zeros((len(pitch), 10))
+    for i, b in enumerate(bin_indexes):
+        if b < 10:
+            stim_pitch[i, b] = 1
+    return stim_pitch
+
+# intonation_preanalysis
+
+def get_Y_mats(times, good_trials, hg, zscore_to_silence=(True, False), control_stim=False, missing_f0_stim=False):
+    """Returns Y_mat and Y_mat_plotter for each normalization as save_Y_mat_sns_sts_sps_for_subject_number computed them.
+
+    Returns:
+        (dict): (Y_mat, Y_mat_plotter) for each value in zscore_to_silence, like intonation_preanalysis.get_Y_mats
+    """
+    from .intonation_preanalysis import get_all_good_trials
+    all_good_trials = get_all_good_trials(good_trials, control_stim=control_stim, missing_f0_stim=missing_f0_stim)
+    Y_mats = {}
+    for z in zscore_to_silence:
+        Y_mat_plotter = get_concatenated_data(times, [hg_block[:256] for hg_block in hg], zscore=False, back=25, forward=275, zscore_to_silence=z)
+        Y_mat_plotter = Y_mat_plotter[:, :, all_good_trials]
+        Y_mat, centers = get_time_averaged_data(times, [hg_block[:256] for hg_block in hg], zscore=False, zscore_to_silence=z)
+        Y_mat = Y_mat[:, :, all_good_trials]
+        Y_mats[z] = (Y_mat, Y_mat_plotter)
+    return Y_mats
+
+def get_timelocked_activity(times, hg, zscore=True, hz=100, back=0, forward=250, zscore_to_silence=True):
+    if zscore:
+        for i in np.arange(hg.shape[0]):
+            hg[i, ~np.isnan(hg[i])] = stats.zscore(hg[i, ~np.isnan(hg[i])])
+
+    Y_mat = np.zeros((hg.shape[0], int(back+forward), np.shape(times)[1]), dtype=float)
+
+    if zscore_to_silence:
+        baseline = []
+        for i, seconds in enumerate(times[0]):
+            index = int(np.round(seconds*hz))
+            baseline.append(hg[:, index-30:index])
+
+        baseline = np.concatenate(baseline, axis=1)
+
+        baseline_mean = np.nanmean(baseline, axis=1)
+        baseline_std = np.nanstd(baseline, axis=1)
+
+    for i, seconds in enumerate(times[0]):
+        index = int(np.round(seconds * hz))
+        if zscore_to_silence:
+            try:
+                Y_mat[:,:,i] = hg[:, int(index-back):int(index+forward)]
+            except:
+                print('Error creating Y_mat at trial i: ' + str(i) + ' index: ' + str(index))
+            for t in range(Y_mat.shape[1]):
+                Y_mat[:, t, i] = (Y_mat[:, t, i] - baseline_mean)/baseline_std
+        else:
+            try:
+                Y_mat[:,:,i] = hg[:, int(index-back):int(index+forward)]
+            except:
+                print('Error creating Y_mat at trial i: ' + str(i) + ' index: ' + str(index))
+
+    return Y_mat
+
+def get_concatenated_data(times_list, hg_list, hz=100, back=0, forward=250, zscore=True, zscore_to_silence=True):
+    Y_cat = np.concatenate([get_timelocked_activity(times, hg, zscore=zscore, hz=hz, back=back, forward=forward, zscore_to_silence=zscore_to_silence) for (times, hg) in zip(times_list, hg_list)], 2)
+    return Y_cat
+
+def get_time_averaged_data(times_list, hg_list, window=6, hz=100, back=15, forward=285, zscore=True, zscore_to_silence=True):
+    Y_cat = get_concatenated_data(times_list, hg_list, hz=hz, zscore=zscore, back=back+window/2, forward=forward+window/2, zscore_to_silence=zscore_to_silence)
+    centers = get_centers(back=back, forward=forward, window=6)
+    Y_mat = np.zeros((Y_cat.shape[0], centers.shape[0], Y_cat.shape[2]))
+
+    for i, c in enumerate(centers):
+        Y_mat[:, i, :] = np.nanmean(Y_cat[:, int(c+back):int(c+back+window), :], axis=1)
+    return Y_mat, centers
+
+def get_centers(back=15, forward=285, window=6):
+    centers = np.arange(-1*back, forward+window/2, window/2)
+    return centers
+
+# intonation_encoding
+
+def single_electrode_encoding_varpart(Y_mat, sns, sts, sps, which_chans=default_which_chans, use_adj_r2=True, control_stim=False):
+    from .intonation_encoding import get_xs_dummy_code_varpart
+    xs = get_xs_dummy_code_varpart(sns, sts, sps, control_stim=control_stim)
+    r2s_varpart = np.zeros((Y_mat.shape[0], Y_mat.shape[1], 7))
+    p_values = np.zeros((Y_mat.shape[0], Y_mat.shape[1], 7))
+    f_stats = np.zeros((Y_mat.shape[0], Y_mat.shape[1], 7))
+
+    r2s_wo = np.zeros((Y_mat.shape[0], Y_mat.shape[1], 8))
+
+    #First calculate the r2s for the full model
+    for chan in range(256):
+        if chan in which_chans:
+            for t in range(Y_mat.shape[1]):
+                result = sm.OLS(Y_mat[chan, t, :], xs[-1]).fit()
+                if use_adj_r2:
+                    r2s_wo[chan, t, 7] = result.rsquared_adj
+                else:
+                    r2s_wo[chan, t, 7] = result.rsquared
+
+    #Then calcuate r2 differences and assess significance with the F statistic
+    xs = xs[:-1]
+    N = Y_mat.shape[2]
+    if control_stim:
+        k = 40 # 5 sn x 4 st x 2 speakers
+    else:
+        k = 48 #hard-coded to work with 4 sn, 4 st, 3 sp
+    for i, x in enumerate(xs):
+        fstat = np.zeros((Y_mat.shape[0], Y_mat.shape[1]))
+        for chan in range(256):
+            if chan in which_chans:
+                for t in range(Y_mat.shape[1]):
+                    result = sm.OLS(Y_mat[chan, t, :], x).fit()
+                    if use_adj_r2:
+                        r2s_wo[chan, t, i] = result.rsquared_adj
+                        r2s_varpart[chan, t, i] = r2s_wo[chan, t, 7] - r2s_wo[chan, t, i]
+                    else:
+                        r2s_wo[chan, t, i] = result.rsquared
+                        r2s_varpart[chan, t, i] = r2s_wo[chan, t, 7] - r2s_wo[chan, t, i]
+        m = k - x.shape[1]
+        fstat = (r2s_varpart[:,:,i]/m)/((1 - r2s_wo[:,:,7])/(N - k - 1))
+        f_stats[:,:,i] = fstat
+        p_values[:, :, i] = f.sf(fstat, m, N-k-1)
+    return r2s_varpart, p_values, f_stats
+
+# intonation_invariance
+
+def residualize(Y_mat, by):
+    Y_resid = np.copy(Y_mat)
+    for i, cond in enumerate(by):
+        Y_resid[:,:,i] = Y_mat[:,:,i] - np.nanmean(Y_mat[:,:,by==cond], axis=2)
+    return Y_resid
+
+def test_invariance(Y_mat, sns, sts, sps, of_what="st", to_what="sn", n_perms=1000, solver="svd", shrinkage=1, seed=None):
+    from .intonation_invariance import get_base_seed, get_perm_random_state
+    seed = get_base_seed(seed)
+
+    bad_time_indexes = np.isnan(np.sum(Y_mat, axis=2))
+    condition_dict = {'st': sts, 'sn': sns, 'sp': sps}
+    condition_labels = {'st':[1, 2, 3, 4], 'sn': [1,2,3,4], 'sp':[1,2,3]}
+
+    ofs = condition_dict[of_what]
+    tos = condition_dict[to_what]
+    Y_resid = residualize(Y_mat, tos)
+    n_chans, n_timepoints, n_trials = Y_mat.shape
+
+    if solver == "svd":
+        lda = discriminant_analysis.LinearDiscriminantAnalysis()
+    elif solver == "lsqr":
+        lda = discriminant_analysis.LinearDiscriminantAnalysis(solver=solver, shrinkage=shrinkage)
+
+    accs = np.zeros((n_chans, len(condition_labels[to_what]), n_perms, 8))
+    for to_cond in condition_labels[to_what]:
+        n_train_100 = int(np.sum(tos != to_cond))
+        n_test_100 = int(np.sum(tos == to_cond))
+        n1 = n_train_100 - n_test_100
+        ofs1 = ofs[tos != to_cond]
+        ofs2 = ofs[tos == to_cond]
+
+        for p in np.arange(n_perms):
+            random_state = get_perm_random_state(seed, to_cond, p)
+            rand_perm_train = random_state.permutation(n_train_100)
+            shuffle_train = random_state.permutation(n_train_100)
+            shuffle_test = random_state.permutation(n_test_100)
+
+            for chan in np.arange(n_chans):
+                Y_mat_chan = Y_mat[chan][~bad_time_indexes[chan]]
+                Y_resid_chan = Y_resid[chan][~bad_time_indexes[chan]]
+
+                if Y_mat_chan.shape[0] < 1:
+                    accs[chan, to_cond-1, p, :] = np.NaN
+                else:
+                    Y_train = Y_mat_chan[:, tos != to_cond].T
+                    Y_resid_train = Y_resid_chan[:, tos != to_cond].T
+                    Y_test = Y_mat_chan[:, tos == to_cond].T
+                    Y_resid_test = Y_resid_chan[:, tos == to_cond].T
+
+                    lda.fit(Y_train[rand_perm_train][np.arange(n1)], ofs1[rand_perm_train][np.arange(n1)])
+                    accs[chan, to_cond-1, p, 0] = lda.score(Y_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[rand_perm_train][np.arange(n1, n_train_100)])
+                    accs[chan, to_cond-1, p, 1] = lda.score(Y_test, ofs2) if p == 0 else np.NaN
+                    accs[chan, to_cond-1, p, 2] = lda.score(Y_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[shuffle_train][np.arange(n1, n_train_100)])
+                    accs[chan, to_cond-1, p, 3] = lda.score(Y_test, ofs2[shuffle_test])
+
+                    lda.fit(Y_resid_train[rand_perm_train][np.arange(n1)], ofs1[rand_perm_train][np.arange(n1)])
+                    accs[chan, to_cond-1, p, 4] = lda.score(Y_resid_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[rand_perm_train][np.arange(n1, n_train_100)])
+                    accs[chan, to_cond-1, p, 5] = lda.score(Y_resid_test, ofs2) if p == 0 else np.NaN
+                    accs[chan, to_cond-1, p, 6] = lda.score(Y_resid_train[rand_perm_train][np.arange(n1, n_train_100)], ofs1[shuffle_train][np.arange(n1, n_train_100)])
+                    accs[chan, to_cond-1, p, 7] = lda.score(Y_resid_test, ofs2[shuffle_test])
+
+    return accs
+
+# timit
+
+def get_psis(out, phoneme_order=None, timit_phonemes=None):
+    from . import timit
+    if phoneme_order is None:
+        phoneme_order = timit.phoneme_order
+    # timit_phonemes is a dataframe containing information about phoneme onsets in timit sentences
+    if timit_phonemes is None:
+        timit_phonemes = timit.get_timit_phonemes()
+    names = [i[0] for i in out.items()] # timit sentences that are in a given subject's out data file
+    timit_phonemes = timit_phonemes[timit_phonemes.index.get_level_values(0).isin(names)]
+
+    psis = np.zeros((256, len(phoneme_order)))
+
+    #Get the distribution of high-gamma values at 110ms after phoneme onset for each electrode for each phoneme.
+    #The phoneme is the key used in the dict activitiy_distributions
+    activity_distributions = {}
+    for phoneme in phoneme_order:
+        # all instances of a specific phoneme in the set of timit sentences a subject heard
+        phoneme_instances = timit_phonemes[timit_phonemes.phn == phoneme]
+
+        activity_phoneme = np.zeros((256, len(phoneme_instances)))
+        for i, trial in enumerate(phoneme_instances.iterrows()):
+            timit_name = trial[0][0]
+            start_time = trial[1].start_time
+            index = int(round((start_time + 0.11)*100) + 50)
+
+            activity_phoneme[:, i] = out[timit_name]['ecog'][:][:256,index,0].flatten()
+
+        activity_distributions[phoneme] = activity_phoneme
+
+    phonemes = set(phoneme_order)
+
+    for p_index, phoneme1 in enumerate(phoneme_order):
+        dist1 = activity_distributions[phoneme1]
+
+        for phoneme2 in phonemes - set([phoneme1]):
+            dist2 = activity_distributions[phoneme2]
+
+            for chan in np.arange(256):
+                z_stat, p_value = stats.ranksums(dist1[chan,:], dist2[chan,:])
+                if(p_value < 0.001):
+                    psis[chan, p_index] = psis[chan, p_index] + 1
+
+    return psis.T
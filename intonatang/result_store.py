@@ -0,0 +1,166 @@
+"""Storage of intermediate results in either .mat files or directories of .npy files.
+
+Results (preprocessed Y_mat, encoding results, invariance accuracies, ptrf weights, ...) are dicts of ndarrays.
+Two formats are supported:
+
+* "mat": one MATLAB .mat file, written with scipy.io.savemat (the original format, readable from MATLAB).
+* "npy": a directory with one uncompressed .npy file per variable. Single variables can be loaded without reading
+  the rest of the results, and can be memory-mapped (``mmap_mode='r'``) so that only the parts that are indexed
+  (e.g. one channel of ``wts_all``) are read from disk.
+
+Functions in this module take the .mat filename of a result (e.g. results/EC113_encoding_varpart.mat). The "npy"
+directory for the same result is the filename without the .mat extension (results/EC113_encoding_varpart/).
+The format used for saving defaults to ``default_format``, which can be set with the INTONATANG_RESULT_FORMAT
+environment variable or ``set_default_format``. Loading finds whichever format exists. Saving removes the copy in
+the other format (and its cache sidecar), so that a stale copy is never found first.
+
+By default, arrays loaded from either format have the shapes that scipy.io.loadmat returns (1d arrays and scalars
+become 1 x n row vectors), so code written for the .mat files works unchanged.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import shutil
+
+import numpy as np
+import scipy.io as sio
+
+from . import cache
+
+formats = ['mat', 'npy']
+default_format = os.environ.get('INTONATANG_RESULT_FORMAT', 'mat')
+
+def set_default_format(format):
+    """Sets the format used by save_results when no format is given ("mat" or "npy").
+    """
+    global default_format
+    if format not in formats:
+        raise ValueError("format must be one of " + str(formats))
+    default_format = format
+
+def get_path(filename, format):
+    """Returns the path of the result with .mat filename in the given format.
+    """
+    if format == 'mat':
+        return filename
+    elif format == 'npy':
+        return os.path.splitext(filename)[0]
+    raise ValueError("format must be one of " + str(formats))
+
+def find_results(filename, format=None):
+    """Returns (path, format) of saved results for filename, or (None, None) if there are none.
+
+    If format is None, the default format is checked first.
+    """
+    if format is None:
+        search_formats = [default_format] + [f for f in formats if f != default_format]
+    else:
+        search_formats = [format]
+    for f in search_formats:
+        path = get_path(filename, f)
+        if (f == 'npy' and os.path.isdir(path)) or (f == 'mat' and os.path.isfile(path)):
+            return path, f
+    return None, None
+
+def remove_results(filename, format):
+    """Removes saved results for filename in the given format, along with their cache sidecar.
+    """
+    path = get_path(filename, format)
+    if format == 'npy' and os.path.isdir(path):
+        shutil.rmtree(path)
+    elif format == 'mat' and os.path.isfile(path):
+        os.remove(path)
+    sidecar_path = cache.get_sidecar_path(path)
+    if os.path.isfile(sidecar_path):
+        os.remove(sidecar_path)
+
+def save_results(filename, data, format=None, keep_other=False):
+    """Saves a dict of arrays.
+
+    Once the results are in place, results for filename saved in the other format are removed.
+
+    Args:
+        filename (str): .mat filename of the result
+        data (dict): variable names and arrays
+        format (str): "mat" or "npy". Defaults to default_format.
+        keep_other (bool): keep results in the other format (only for copies of the same results, see convert_results).
+
+    Returns:
+        (str): path that was written
+    """
+    if format is None:
+        format = default_format
+    path = get_path(filename, format)
+
+    if format == 'mat':
+        sio.savemat(path, data)
+    else:
+        # write to a temporary directory first so an interrupted save does not leave partial results.
+        tmp_path = path + '.tmp'
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name, value in data.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), np.asarray(value))
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(tmp_path, path)
+
+    if not keep_other:
+        for other_format in formats:
+            if other_format != format:
+                remove_results(filename, other_format)
+    return path
+
+def load_results(filename, variable_names=None, mmap_mode=None, format=None, matlab_shapes=True):
+    """Loads a dict of arrays saved with save_results (or scipy.io.savemat).
+
+    Args:
+        filename (str): .mat filename of the result
+        variable_names (list): variables to load. Defaults to all of them. For the "npy" format, other variables
+            are not read at all.
+        mmap_mode (str): passed to np.load for the "npy" format, e.g. 'r' to memory-map arrays read-only.
+            Ignored for the "mat" format.
+        format (str): "mat" or "npy". If None, whichever exists is loaded.
+        matlab_shapes (bool): return 1d arrays and scalars from the "npy" format as 1 x n arrays, like loadmat.
+
+    Returns:
+        (dict): variable names and arrays
+    """
+    path, format = find_results(filename, format=format)
+    if path is None:
+        raise IOError("No saved results for " + filename)
+
+    if format == 'mat':
+        data = sio.loadmat(path, variable_names=variable_names)
+        return dict((name, value) for name, value in data.items() if not name.startswith('__'))
+
+    if variable_names is None:
+        variable_names = [os.path.splitext(f)[0] for f in os.listdir(path) if f.endswith('.npy')]
+    data = {}
+    for name in variable_names:
+        value = np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+        if matlab_shapes and value.ndim < 2:
+            value = value.reshape(1, -1)
+        data[name] = value
+    return data
+
+def convert_results(filename, to_format):
+    """Converts saved results for filename to to_format (e.g. to export "npy" results to .mat for MATLAB users).
+
+    The results in the original format are kept.
+
+    Returns:
+        (str): path that was written
+    """
+    path, format = find_results(filename)
+    if format == to_format:
+        return path
+    data = load_results(filename, format=format, matlab_shapes=False)
+    return save_results(filename, data, format=to_format, keep_other=True)
+
+def export_mat(filename):
+    """Writes the .mat file for results saved in the "npy" format.
+    """
+    return convert_results(filename, 'mat')
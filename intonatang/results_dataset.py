@@ -0,0 +1,232 @@
+"""Lazy, memoized access to saved results of multiple subjects.
+
+``ResultsDataset`` loads each saved result (encoding results, ptrf results, permutation tests, PSIs) for a subject
+only when it is first needed and keeps it in a least-recently-used cache shared by all datasets, so calling
+``intonatang.load_all_data`` repeatedly (e.g. for different figures with overlapping subject lists) does not read
+the same files again. Cached results are keyed by the size and modification time of their files, so results that
+are saved again (e.g. by generate_all_results or the pipeline) are read again.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .intonation_encoding import load_encoding_results, load_encoding_results_all_weights
+from .intonation_encoding import get_encoding_results_filename, get_encoding_results_all_weights_filename
+from .pitch_trf import load_cv_model_fold_variables, get_abs_and_rel_sig
+from .pitch_trf import get_cv_model_fold_filename, get_cv_shuffle_fold_filename
+from . import timit
+from . import cache
+from . import result_store
+from .intonation_subject_data import timit_subject_numbers as all_subject_numbers
+
+class LRUCache(object):
+    """Dict-like cache that keeps at most max_size items, dropping the least recently used item first.
+
+    Args:
+        max_size (int): maximum number of items. None for no limit.
+    """
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        """Returns the cached value for key, calling compute() to get it if it is not cached.
+        """
+        if key in self.items:
+            value = self.items.pop(key)
+            self.items[key] = value
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.items[key] = value
+        if self.max_size is not None:
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.items.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+artifact_cache = LRUCache(max_size=128)
+
+def clear_cache():
+    """Clears the results cached by all ResultsDatasets that use the shared cache.
+    """
+    artifact_cache.clear()
+
+def get_results_signature(filenames):
+    """Returns the (size, mtime) of the saved results of each .mat filename (see result_store.find_results), or None
+    for results that do not exist.
+    """
+    signature = []
+    for filename in filenames:
+        path, format = result_store.find_results(filename)
+        if path is None:
+            signature.append(None)
+        else:
+            file_signature = cache.get_file_signature(path)
+            signature.append((file_signature['size'], file_signature['mtime']))
+    return tuple(signature)
+
+def load_encoding_summary(subject_number, alpha=0.05/(256*101)):
+    """Summarizes encoding results of one subject, masking non-significant times.
+
+    Returns:
+        (tuple):
+            * **data_varpart** (*DataFrame*): max r2 of each encoding model subset and significance, one row per
+              electrode
+            * **r_mean** (*ndarray*): 256 x 7, mean r2 over significant times
+            * **r_max** (*ndarray*): 256 x 7, max r2 over significant times
+            * **cat** (*ndarray*): 256, index of the subset with the largest r2, -1 for non-significant electrodes
+    """
+    r2_varpart, p_varpart, f_varpart = load_encoding_results(subject_number)
+    data_varpart = pd.DataFrame(np.nanmax(r2_varpart, 1), columns=['sn', 'st', 'sp', 'sn st', 'sn sp', 'st sp', 'sn st sp'])
+    data_varpart['subject_number'] = subject_number
+
+    f, fp, b, bp, r2 = load_encoding_results_all_weights(subject_number)
+    sig_elecs_bool = np.nansum(fp < alpha, axis=1) > 2
+    not_sig_times = fp > alpha
+
+    sig_varpart = np.nansum(p_varpart[:, :, :3] < alpha, axis=1) > 2
+    data_varpart['sn_sig'] = sig_varpart[:, 0]
+    data_varpart['st_sig'] = sig_varpart[:, 1]
+    data_varpart['sp_sig'] = sig_varpart[:, 2]
+
+    r2_varpart[not_sig_times] = np.NaN
+
+    r_mean = np.nanmean(r2_varpart, axis=1)
+    r_max = np.nanmax(r2_varpart, axis=1)
+    cat = np.argmax(r_max, axis=1)
+    cat[~sig_elecs_bool] = -1
+
+    data_varpart['sig_full'] = sig_elecs_bool
+    data_varpart['cat'] = cat
+    return data_varpart, r_mean, r_max, cat
+
+def load_ptrf_r2(subject_number):
+    """Returns r2_abs and r2_rel (each 256) of the ptrf models without loading the model weights.
+    """
+    data = load_cv_model_fold_variables(subject_number, ['r2_abs', 'r2_rel'])
+    return data['r2_abs'][0, :256], data['r2_rel'][0, :256]
+
+def load_ptrf_mean_wts(subject_number):
+    """Returns the weights of the full ptrf model averaged over folds, 256 x n_features.
+    """
+    wts_all = load_cv_model_fold_variables(subject_number, ['wts_all'], mmap_mode='r')['wts_all']
+    return np.mean(wts_all, axis=2)
+
+def load_psis(subject_number):
+    average_response, psis = timit.load_average_response_psis_for_subject_number(subject_number)
+    return psis
+
+class ResultsDataset(object):
+    """Saved results of several subjects, loaded on first access.
+
+    Each result is loaded once per subject and cached (see ``artifact_cache``) until its files change. Results are only loaded for the
+    attributes that are used, e.g. ``ResultsDataset().all_psis`` only loads the PSI results.
+
+    Args:
+        subject_numbers (list): defaults to all subjects
+        cache (LRUCache): defaults to the module-level ``artifact_cache``, shared by all datasets
+
+    Attributes:
+        datas (DataFrame): per-electrode summary of all subjects (as in load_all_data)
+        r_mean_all, r_max_all (ndarray): n_elecs x 7, mean and max r2 over significant times
+        cat_all (ndarray): n_elecs, encoding category of each electrode
+        r2s_abs, r2s_rel (ndarray): n_elecs, r2 of the absolute and relative pitch ptrf models
+        wtss (list): per-subject full ptrf model weights averaged over folds
+        all_psis (ndarray): PSIs of all subjects concatenated along axis 1
+    """
+    loaders = {'encoding_summary': load_encoding_summary,
+               'ptrf_r2': load_ptrf_r2,
+               'ptrf_sig': get_abs_and_rel_sig,
+               'ptrf_mean_wts': load_ptrf_mean_wts,
+               'psis': load_psis}
+
+    # .mat filenames of the results read by each loader
+    filenames = {'encoding_summary': lambda subject_number: [get_encoding_results_filename(subject_number),
+                                                             get_encoding_results_all_weights_filename(subject_number)],
+                 'ptrf_r2': lambda subject_number: [get_cv_model_fold_filename(subject_number)],
+                 'ptrf_sig': lambda subject_number: [get_cv_model_fold_filename(subject_number),
+                                                     get_cv_shuffle_fold_filename(subject_number)],
+                 'ptrf_mean_wts': lambda subject_number: [get_cv_model_fold_filename(subject_number)],
+                 'psis': lambda subject_number: [timit.get_average_response_psis_filename(subject_number)]}
+
+    def __init__(self, subject_numbers=None, cache=None):
+        if subject_numbers is None:
+            subject_numbers = all_subject_numbers
+        self.subject_numbers = list(subject_numbers)
+        self.cache = artifact_cache if cache is None else cache
+
+    def get(self, name, subject_number):
+        """Returns the result called name (a key of ``loaders``) for subject_number, loading it if it is not cached
+        or its files changed since it was cached.
+        """
+        signature = get_results_signature(self.filenames[name](subject_number))
+        return self.cache.get((name, subject_number, signature), lambda: self.loaders[name](subject_number))
+
+    def get_all(self, name):
+        return [self.get(name, subject_number) for subject_number in self.subject_numbers]
+
+    @property
+    def datas(self):
+        datas = []
+        for subject_number in self.subject_numbers:
+            data_varpart = self.get('encoding_summary', subject_number)[0].copy()
+            r2_abs, r2_rel = self.get('ptrf_r2', subject_number)
+            data_varpart['r2_abs'] = r2_abs
+            data_varpart['r2_rel'] = r2_rel
+            abs_sig, rel_sig = self.get('ptrf_sig', subject_number)
+            data_varpart['rel_sig'] = rel_sig
+            data_varpart['abs_sig'] = abs_sig
+            datas.append(data_varpart)
+        return pd.concat(datas)
+
+    @property
+    def r_mean_all(self):
+        return np.concatenate([summary[1] for summary in self.get_all('encoding_summary')])
+
+    @property
+    def r_max_all(self):
+        return np.concatenate([summary[2] for summary in self.get_all('encoding_summary')])
+
+    @property
+    def cat_all(self):
+        return np.concatenate([summary[3] for summary in self.get_all('encoding_summary')])
+
+    @property
+    def r2s_abs(self):
+        return np.concatenate([r2[0] for r2 in self.get_all('ptrf_r2')])
+
+    @property
+    def r2s_rel(self):
+        return np.concatenate([r2[1] for r2 in self.get_all('ptrf_r2')])
+
+    @property
+    def wtss(self):
+        return [np.copy(wts) for wts in self.get_all('ptrf_mean_wts')]
+
+    @property
+    def all_psis(self):
+        return np.concatenate(self.get_all('psis'), axis=1)
+
+    def load_all_data(self):
+        """Returns the same tuple as intonatang.load_all_data.
+        """
+        return (self.datas, self.r_mean_all, self.r_max_all, self.cat_all, self.r2s_abs, self.r2s_rel,
+                self.wtss, self.all_psis)
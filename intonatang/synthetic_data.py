@@ -0,0 +1,228 @@
+"""Synthetic data with the shapes of the real data, for benchmarks and for running the analyses without patient data.
+
+The generated data has no scientific meaning. Neural activity is noise with small condition dependent responses
+added, so that analyses run through the same code paths (e.g. LDA models are better than chance) as with real data.
+
+In-memory data:
+
+* ``get_synthetic_block_data``: contents of a block .mat file (high-gamma, stimulus onset times, bad channels and
+  bad time segments)
+* ``get_synthetic_Y_mat``: Y_mat and condition labels, as returned by load_Y_mat_sns_sts_sps_for_subject_number
+* ``get_synthetic_timit_pitch``, ``get_synthetic_timit_phonemes``, ``get_synthetic_timit_strat``: TIMIT tables as
+  saved by timit.save_timit_pitch_phonetic and timit.save_timit_phonemes and the stratified folds
+* ``get_synthetic_timit_out``: dict with the structure of the h5py TIMIT data of a subject (timit.load_h5py_out)
+
+``save_synthetic_data`` writes all of these to files with the same names and layout as the real data, e.g. to a
+temporary directory that subject_data_path, processed_timit_data_path, and timit_data_path can be pointed to.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.io as sio
+
+from .timit import phoneme_order, phonetic_features, phonetic_dict
+
+def get_synthetic_block_data(subject_number=100, block=1, n_trials=96, n_chans=256, hz=100, n_bad_chans=4,
+                             n_bad_segments=2, trial_interval=3.5, seed=0):
+    """Returns the contents of a block .mat file.
+
+    Args:
+        subject_number, block: used for the names of the hg variables
+        n_trials (int): 96 for speech blocks, 120 for nonspeech control blocks, 144 for missing f0 blocks
+        n_chans (int): number of channels
+        hz (int): sampling rate of the hg data
+        n_bad_chans (int): number of channels listed in bcs
+        n_bad_segments (int): number of bad time segments
+        trial_interval (float): seconds between stimulus onsets
+
+    Returns:
+        (dict): with keys 'ECxx_Bxx_hg_100Hz', 'ECxx_Bxx_log_hg_100Hz', 'times' (1 x n_trials, s), 'bcs'
+            (1 x n_bad_chans), and 'badTimeSegments' (n_bad_segments x 2, s)
+    """
+    random_state = np.random.RandomState(seed)
+    n_samples = int((n_trials * trial_interval + 5) * hz)
+    times = 2 + np.arange(n_trials) * trial_interval + random_state.uniform(0, 0.2, n_trials)
+
+    # stimulus evoked responses with a channel specific amplitude and a condition (trial % 4) specific offset.
+    hg = random_state.gamma(2, 0.5, (n_chans, n_samples))
+    response = np.exp(-0.5 * ((np.arange(int(2.2 * hz)) - hz * 0.5) / (hz * 0.25))**2)
+    gains = random_state.uniform(0, 2, n_chans)
+    for i, t in enumerate(times):
+        start = int(np.round(t * hz))
+        hg[:, start:start + response.shape[0]] += np.outer(gains * (1 + 0.25 * (i % 4)), response)
+
+    bad_segment_starts = random_state.uniform(0, n_samples / hz - 5, n_bad_segments)
+    name = 'EC' + str(subject_number) + '_B' + str(block)
+    return {name + '_hg_100Hz': hg,
+            name + '_log_hg_100Hz': np.log(hg),
+            'times': times[np.newaxis, :],
+            'bcs': np.sort(random_state.choice(n_chans, n_bad_chans, replace=False))[np.newaxis, :],
+            'badTimeSegments': np.column_stack([bad_segment_starts, bad_segment_starts + 1])}
+
+def get_synthetic_conditions(n_trials=96, n_sentences=4, n_sentence_types=4, n_speakers=3):
+    """Returns sns, sts, sps (1-based condition labels) with every combination of conditions repeated.
+    """
+    trial = np.arange(n_trials)
+    sns = trial % n_sentences + 1
+    sts = (trial // n_sentences) % n_sentence_types + 1
+    sps = (trial // (n_sentences * n_sentence_types)) % n_speakers + 1
+    return sns, sts, sps
+
+def get_synthetic_Y_mat(n_chans=256, n_timepoints=101, n_trials=96, effect_size=0.5, nan_fraction=0.01, seed=0):
+    """Returns Y_mat, sns, sts, sps, and Y_mat_plotter like load_Y_mat_sns_sts_sps_for_subject_number.
+
+    Channels respond to the intonation condition (sts) with random time courses scaled by effect_size. nan_fraction
+    of the trials of each channel are NaN, like trials that overlap bad time segments.
+    """
+    random_state = np.random.RandomState(seed)
+    sns, sts, sps = get_synthetic_conditions(n_trials)
+    Y_mat = random_state.randn(n_chans, n_timepoints, n_trials)
+    st_effects = effect_size * random_state.randn(n_chans, n_timepoints, 4)
+    Y_mat += st_effects[:, :, sts - 1]
+    Y_mat[random_state.rand(n_chans, 1, n_trials).repeat(n_timepoints, axis=1) < nan_fraction] = np.NaN
+    Y_mat_plotter = random_state.randn(n_chans, 300, n_trials)
+    return Y_mat, sns, sts, sps, Y_mat_plotter
+
+def get_synthetic_timit_names(n_sentences=500):
+    return ['s' + str(i).zfill(4) for i in range(n_sentences)]
+
+def get_synthetic_timit_pitch(n_sentences=500, min_length=150, max_length=350, seed=0):
+    """Returns a TIMIT pitch table with the columns of timit.get_timit_pitch_phonetic.
+
+    The table has one row per 10 ms bin of each sentence, indexed by (timit_name, bin). Pitch is NaN in unvoiced
+    bins. Phonetic feature columns are filled from the phonemes in get_synthetic_timit_phonemes.
+    """
+    random_state = np.random.RandomState(seed)
+    tables = []
+    names = get_synthetic_timit_names(n_sentences)
+    for name in names:
+        n = random_state.randint(min_length, max_length)
+        hz = np.exp(random_state.normal(4.94, 0.25) + np.cumsum(random_state.normal(0, 0.01, n)))
+        voiced = np.convolve(random_state.rand(n) < 0.6, np.ones(5) / 5, mode='same') > 0.5
+        pitch = np.where(voiced, hz, np.NaN)
+        intensity = np.where(voiced, random_state.normal(70, 5, n), random_state.normal(50, 5, n))
+        tables.append(pd.DataFrame({'pitch': pitch, 'intensity': intensity}))
+    timit_pitch = pd.concat(tables, keys=names)
+
+    # same derived columns as timit.save_timit_pitch
+    timit_pitch['log_hz'] = np.log(timit_pitch['pitch'])
+    timit_pitch['erb_rate'] = 11.17 * np.log((timit_pitch['pitch'] + 312) / (timit_pitch['pitch'] + 14675)) + 43
+    for column, rel_column in [('log_hz', 'rel_pitch_global'), ('erb_rate', 'rel_pitch_global_erb')]:
+        grouped = timit_pitch[column].groupby(level=0)
+        timit_pitch[rel_column] = (timit_pitch[column] - grouped.transform('mean')) / grouped.transform('std', ddof=0)
+    timit_pitch['abs_pitch'] = (timit_pitch['log_hz'] - np.mean(timit_pitch['log_hz'])) / np.std(timit_pitch['log_hz'])
+    timit_pitch['abs_pitch_erb'] = (timit_pitch['erb_rate'] - np.mean(timit_pitch['erb_rate'])) / np.std(timit_pitch['erb_rate'])
+    timit_pitch['abs_pitch_change'] = timit_pitch['abs_pitch'].diff()
+    timit_pitch['abs_pitch_erb_change'] = timit_pitch['abs_pitch_erb'].diff()
+    timit_pitch['zscore_intensity'] = (timit_pitch.intensity - np.mean(timit_pitch.intensity)) / np.std(timit_pitch.intensity)
+
+    timit_phonemes = get_synthetic_timit_phonemes(timit_pitch, seed=seed)
+    phns = []
+    for name in names:
+        phonemes = timit_phonemes.loc[name]
+        n = timit_pitch.loc[name].shape[0]
+        phn = np.array(['h#'] * n, dtype=object)
+        for start_time, end_time, p in zip(phonemes.start_time, phonemes.end_time, phonemes.phn):
+            phn[int(round(start_time * 100)) - 1:int(round(end_time * 100)) - 1] = p
+        phns.append(phn)
+    timit_pitch['phn'] = np.concatenate(phns)
+    for feat in phonetic_features:
+        timit_pitch[feat] = np.array([feat in phonetic_dict.get(phn, []) for phn in timit_pitch['phn']], dtype=int)
+    return timit_pitch
+
+def get_synthetic_timit_phonemes(timit_pitch, min_duration=0.04, max_duration=0.15, seed=0):
+    """Returns a phoneme table with the columns of timit.get_timit_phonemes (start_time, end_time in s, phn).
+
+    Each sentence starts and ends with silence (h#), with phonemes from timit.phoneme_order in between.
+    """
+    random_state = np.random.RandomState(seed + 1)
+    tables = []
+    names = timit_pitch.index.get_level_values(0).unique()
+    for name in names:
+        duration = timit_pitch.loc[name].shape[0] / 100
+        boundaries = [0, 0.2]
+        while boundaries[-1] < duration - 0.4:
+            boundaries.append(boundaries[-1] + random_state.uniform(min_duration, max_duration))
+        boundaries.append(duration)
+        phns = ['h#'] + [str(phn) for phn in random_state.choice(phoneme_order, len(boundaries) - 3)] + ['h#']
+        tables.append(pd.DataFrame({'start_time': boundaries[:-1], 'end_time': boundaries[1:], 'phn': phns},
+                                   columns=['start_time', 'end_time', 'phn']))
+    return pd.concat(tables, keys=list(names), names=['timit_name', 'phoneme_index'])
+
+def get_synthetic_timit_strat(names, n_folds=25, seed=0):
+    """Returns n_folds orderings of names (pandas Series), like pitch_trf.load_timit_strat.
+    """
+    random_state = np.random.RandomState(seed)
+    return [pd.Series(random_state.permutation(names)) for fold in range(n_folds)]
+
+def get_synthetic_timit_out(timit_pitch, n_chans=256, n_repeats=1, sentences=None, seed=0):
+    """Returns a dict with the structure of timit.load_h5py_out.
+
+    out[timit_name]['ecog'] is n_chans x (n_bins + 100) x n_repeats: neural data starts 500 ms before the
+    sentence and ends 500 ms after it. Channels respond to the sentence's relative pitch with random delays.
+    """
+    random_state = np.random.RandomState(seed)
+    if sentences is None:
+        sentences = timit_pitch.index.get_level_values(0).unique()
+    delays = random_state.randint(5, 30, n_chans)
+    gains = random_state.uniform(0, 1, n_chans)
+    out = {}
+    for name in sentences:
+        rel_pitch = np.nan_to_num(timit_pitch.loc[name]['rel_pitch_global'].values)
+        n = rel_pitch.shape[0] + 100
+        ecog = random_state.randn(n_chans, n, n_repeats)
+        for chan in range(n_chans):
+            ecog[chan, 50 + delays[chan]:50 + delays[chan] + rel_pitch.shape[0] - 50, :] += \
+                gains[chan] * rel_pitch[:rel_pitch.shape[0] - 50, np.newaxis]
+        out[name] = {'ecog': ecog}
+    return out
+
+def save_synthetic_data(path, subject_number=100, n_blocks=3, n_trials=96, n_chans=256, n_sentences=500, seed=0):
+    """Saves synthetic block .mat files, the TIMIT h5 file of a subject, and the TIMIT tables in path.
+
+    The files are saved as:
+
+    * path/subject_data/ECxx/ECxx_Bx/ECxx_Bx.mat for blocks 1 to n_blocks (subject_data_path)
+    * path/subject_data/ECxx/ECxx_timit.h5 (timit.load_h5py_out)
+    * path/processed_timit_data/timit_pitch.h5, timit_phonemes.h5, timit_pitch_phonetic.h5
+      (processed_timit_data_path)
+    * path/timit/timit_strat_25folds.h5 (timit_data_path)
+
+    Saving the h5 files needs h5py and pytables.
+    """
+    import h5py
+
+    subject_path = os.path.join(path, 'subject_data', 'EC' + str(subject_number))
+    for block in range(1, n_blocks + 1):
+        block_path = os.path.join(subject_path, 'EC' + str(subject_number) + '_B' + str(block))
+        if not os.path.isdir(block_path):
+            os.makedirs(block_path)
+        data = get_synthetic_block_data(subject_number, block, n_trials=n_trials, n_chans=n_chans, seed=seed + block)
+        sio.savemat(os.path.join(block_path, 'EC' + str(subject_number) + '_B' + str(block) + '.mat'), data)
+
+    timit_pitch = get_synthetic_timit_pitch(n_sentences=n_sentences, seed=seed)
+    timit_phonemes = get_synthetic_timit_phonemes(timit_pitch, seed=seed)
+    out = get_synthetic_timit_out(timit_pitch, n_chans=n_chans, seed=seed)
+    with h5py.File(os.path.join(subject_path, 'EC' + str(subject_number) + '_timit.h5'), 'w') as f:
+        group = f.create_group('EC' + str(subject_number))
+        for name in sorted(out):
+            trial = group.create_group(name)
+            trial.create_dataset('ecog', data=out[name]['ecog'])
+            trial.attrs['timit_name'] = np.array([name.encode('ascii')])
+
+    processed_path = os.path.join(path, 'processed_timit_data')
+    timit_path = os.path.join(path, 'timit')
+    for p in [processed_path, timit_path]:
+        if not os.path.isdir(p):
+            os.makedirs(p)
+    pitch_columns = [c for c in timit_pitch.columns if c != 'phn' and c not in phonetic_features]
+    timit_pitch[pitch_columns].to_hdf(os.path.join(processed_path, 'timit_pitch.h5'), key='timit_pitch')
+    timit_phonemes.to_hdf(os.path.join(processed_path, 'timit_phonemes.h5'), key='timit_phonemes')
+    timit_pitch.to_hdf(os.path.join(processed_path, 'timit_pitch_phonetic.h5'), key='timit_pitch_phonetic')
+    strat_filename = os.path.join(timit_path, 'timit_strat_25folds.h5')
+    for fold, timit_strat in enumerate(get_synthetic_timit_strat(get_synthetic_timit_names(n_sentences), seed=seed)):
+        timit_strat.to_hdf(strat_filename, key='timit_strat' + str(fold))
@@ -21,7 +21,11 @@ The two strategies are:
 from __future__ import division, print_function, absolute_import
 
 import numpy as np
-import sklearn.model_selection as model_selection
+import scipy.sparse
+
+from .instrumentation import instrument
+from .lazy_imports import lazy_import
+model_selection = lazy_import('sklearn.model_selection')
 
 def get_alphas(start=2, stop=7, num=10):
     """Returns alphas from num^start to num^stop in log space.
@@ -33,6 +37,7 @@ def get_delays(delay_seconds=0.4, fs=100):
     """
     return np.arange(np.floor(delay_seconds * fs), dtype=int)
 
+@instrument
 def get_dstim(stim, delays=get_delays(), add_edges=True):
     """Returns stimulus features with given delays.
 
@@ -46,11 +51,7 @@ def get_dstim(stim, delays=get_delays(), add_edges=True):
         dstim (ndarray): (n_samples, n_features x n_delays (including edge delays if added))
     """
     n_samples, n_features = stim.shape
-    if add_edges:
-        step = delays[1] - delays[0]
-        delays_beg = [delays[0]-3*step, delays[0]-2*step, delays[0]-step]
-        delays_end = [delays[-1]+step, delays[-1]+2*step, delays[-1]+3*step]
-        delays = np.concatenate([delays_beg, delays, delays_end])
+    delays = get_dstim_delays(delays, add_edges=add_edges)
     dstim = []
     for i, d in enumerate(delays):
         dstim_slice = np.zeros((n_samples, n_features))
@@ -65,6 +66,162 @@ def get_dstim(stim, delays=get_delays(), add_edges=True):
     dstim = np.hstack(dstim)
     return dstim
 
+def get_dstim_delays(delays=get_delays(), add_edges=True):
+    """Returns the delays of the columns of get_dstim, with the 3 edge delays on both sides if add_edges is True.
+    """
+    if add_edges:
+        step = delays[1] - delays[0]
+        delays_beg = [delays[0]-3*step, delays[0]-2*step, delays[0]-step]
+        delays_end = [delays[-1]+step, delays[-1]+2*step, delays[-1]+3*step]
+        delays = np.concatenate([delays_beg, delays, delays_end])
+    return np.asarray(delays, dtype=int)
+
+def get_bin_codes_from_one_hot(stim, one_hot_groups):
+    """Splits stim into groups of one-hot columns (e.g. pitch bins) and the remaining dense columns.
+
+    Args:
+        stim: (n_samples, n_features)
+        one_hot_groups (list): number of columns of each group of one-hot columns at the start of stim. Each row
+            of a group has at most one 1 and is 0 otherwise.
+
+    Returns:
+        (tuple):
+            * **bin_codes** (*list*): (codes, n_bins) of each group. codes is the index of the column that is 1 in
+              each row, or -1 if all columns of the group are 0.
+            * **dense** (*ndarray*): (n_samples, n_features - sum(one_hot_groups)) remaining columns
+
+    Raises:
+        ValueError: if a group is not one-hot
+    """
+    bin_codes = []
+    start = 0
+    for n_bins in one_hot_groups:
+        block = stim[:, start:start + n_bins]
+        if not np.all((block == 0) | (block == 1)) or np.any(np.sum(block, axis=1) > 1):
+            raise ValueError("Columns " + str(start) + "-" + str(start + n_bins - 1) + " of stim are not one-hot.")
+        codes = np.argmax(block, axis=1)
+        codes[~np.any(block == 1, axis=1)] = -1
+        bin_codes.append((codes, n_bins))
+        start = start + n_bins
+    return bin_codes, stim[:, start:]
+
+def get_stim_rows(bin_codes, dense, start, stop):
+    """Returns rows start:stop of the stim that bin_codes and dense were made from (see get_bin_codes_from_one_hot).
+    """
+    rows = [np.zeros((stop - start, n_bins)) for codes, n_bins in bin_codes]
+    for block, (codes, n_bins) in zip(rows, bin_codes):
+        in_bin = codes[start:stop] >= 0
+        block[np.flatnonzero(in_bin), codes[start:stop][in_bin]] = 1
+    return np.hstack(rows + [dense[start:stop]])
+
+def get_lagged_products(feature_codes, n_one_hot, dense, lag):
+    """Returns the (n_features x n_features) matrix of sum over samples u of stim[u, f1] * stim[u + lag, f2].
+
+    Args:
+        feature_codes (ndarray): (n_samples, n_groups) column of stim that is 1 in each group of one-hot columns,
+            or n_one_hot if none is
+        n_one_hot (int): number of one-hot columns of stim
+        dense (ndarray): (n_samples, n_dense) columns of stim after the one-hot columns
+
+    Products of one-hot columns are counts of co-occurring columns (np.bincount), products of one-hot and dense
+    columns are sums of the dense column over the samples in each bin, so the zeros of the one-hot columns are skipped.
+    """
+    n_samples, n_dense = dense.shape
+    n_codes = n_one_hot + 1
+    codes_a = feature_codes[:n_samples - lag]
+    codes_b = feature_codes[lag:]
+    dense_a = dense[:n_samples - lag]
+    dense_b = dense[lag:]
+
+    products = np.zeros((n_one_hot + n_dense, n_one_hot + n_dense))
+    pairs = codes_a[:, :, None] * n_codes + codes_b[:, None, :]
+    counts = np.bincount(pairs.ravel(), minlength=n_codes * n_codes).reshape(n_codes, n_codes)
+    products[:n_one_hot, :n_one_hot] = counts[:n_one_hot, :n_one_hot]
+    dense_cols = np.arange(n_dense)
+    sums_a = np.bincount((codes_a[:, :, None] * n_dense + dense_cols).ravel(),
+                         weights=np.broadcast_to(dense_b[:, None, :], codes_a.shape + (n_dense,)).ravel(),
+                         minlength=n_codes * n_dense).reshape(n_codes, n_dense)
+    sums_b = np.bincount((codes_b[:, :, None] * n_dense + dense_cols).ravel(),
+                         weights=np.broadcast_to(dense_a[:, None, :], codes_b.shape + (n_dense,)).ravel(),
+                         minlength=n_codes * n_dense).reshape(n_codes, n_dense)
+    products[:n_one_hot, n_one_hot:] = sums_a[:n_one_hot]
+    products[n_one_hot:, :n_one_hot] = sums_b[:n_one_hot].T
+    products[n_one_hot:, n_one_hot:] = np.dot(dense_a.T, dense_b)
+    return products
+
+@instrument
+def get_lagged_covariance(bin_codes, dense, resp=None, delays=get_delays(), add_edges=True):
+    """Returns X'X (and X'Y) of the lagged stimulus X = get_dstim(stim, delays, add_edges) without computing X.
+
+    stim is given as groups of one-hot columns (integer bin codes) followed by dense columns (see
+    get_bin_codes_from_one_hot). X'X only depends on the difference of the delays of its rows and columns, except for
+    the few samples that are shifted past the start or end of stim. It is computed from the lagged products of the
+    stim features (get_lagged_products) for each difference of delays, minus the products of those samples. X'Y sums
+    the (shifted) responses of the samples in each bin.
+
+    Args:
+        bin_codes (list): (codes, n_bins) of each group of one-hot columns
+        dense (ndarray): (n_samples, n_dense) columns after the one-hot columns, e.g. intensity and bias
+        resp (ndarray): (n_samples, n_chans), optional
+
+    Returns:
+        (tuple):
+            * **covmat** (*ndarray*): X'X, (n_features x n_delays, n_features x n_delays)
+            * **stim_resp** (*ndarray*): X'Y, (n_features x n_delays, n_chans), or None if resp is None
+    """
+    dense = np.asarray(dense, dtype=float)
+    n_samples = dense.shape[0]
+    n_features = sum(n_bins for codes, n_bins in bin_codes) + dense.shape[1]
+    delays = get_dstim_delays(delays, add_edges=add_edges)
+    n_delays = len(delays)
+
+    max_lag = min(np.max(delays) - np.min(delays), n_samples - 1)
+    n_one_hot = n_features - dense.shape[1]
+    offsets = np.cumsum([0] + [n_bins for codes, n_bins in bin_codes])
+    feature_codes = np.column_stack([np.where(codes >= 0, codes + offset, n_one_hot)
+                                     for (codes, n_bins), offset in zip(bin_codes, offsets)])
+    products = [get_lagged_products(feature_codes, n_one_hot, dense, lag) for lag in range(max_lag + 1)]
+    # samples near the start and end of stim, for the products of samples that are shifted past the start or end
+    n_edge = min(n_samples, max_lag + np.max(np.abs(delays)) + 1)
+    head = get_stim_rows(bin_codes, dense, 0, n_edge)
+    tail = get_stim_rows(bin_codes, dense, n_samples - n_edge, n_samples)
+
+    covmat = np.zeros((n_delays * n_features, n_delays * n_features))
+    for i, delay_i in enumerate(delays):
+        for j, delay_j in enumerate(delays):
+            # X'X[(i, f1), (j, f2)] = sum over u of stim[u, f1] * stim[u + lag, f2], for u in [0, n_samples)
+            # with u + lag and u + delay_i in [0, n_samples)
+            lag = delay_i - delay_j
+            first, last = max(0, -lag), min(n_samples, n_samples - lag)
+            start, stop = max(first, -delay_i), min(last, n_samples - delay_i)
+            if start >= stop:
+                continue
+            block = products[lag] if lag >= 0 else products[-lag].T
+            if start > first:
+                block = block - np.dot(head[first:start].T, head[first + lag:start + lag])
+            if stop < last:
+                offset = n_samples - n_edge
+                block = block - np.dot(tail[stop - offset:last - offset].T, tail[stop + lag - offset:last + lag - offset])
+            covmat[i * n_features:(i + 1) * n_features, j * n_features:(j + 1) * n_features] = block
+
+    if resp is None:
+        return covmat, None
+
+    # resp shifted by each delay, with zeros where the shifted samples are outside of resp
+    padding = np.max(np.abs(delays))
+    resp_padded = np.zeros((n_samples + 2 * padding, resp.shape[1]))
+    resp_padded[padding:padding + n_samples] = resp
+    # one-hot columns as a sparse (n_one_hot, n_samples) matrix, column-compressed for fast products with resp
+    in_bin = feature_codes < n_one_hot
+    one_hot = scipy.sparse.csc_matrix((np.ones(np.sum(in_bin)), (feature_codes[in_bin], np.nonzero(in_bin)[0])),
+                                      shape=(n_one_hot, n_samples))
+    stim_resp = np.zeros((n_delays * n_features, resp.shape[1]))
+    for i, delay in enumerate(delays):
+        resp_shifted = resp_padded[padding + delay:padding + delay + n_samples]
+        stim_resp[i * n_features:i * n_features + n_one_hot] = one_hot.dot(resp_shifted)
+        stim_resp[i * n_features + n_one_hot:(i + 1) * n_features] = np.dot(dense.T, resp_shifted)
+    return covmat, stim_resp
+
 def run_cv_temporal_ridge_regression_model(stim, resp, delays=get_delays(), alphas=get_alphas(), n_folds=5):
     """Given stim and resp, fit temporal receptive fields using ridge regression and KFold cross validation.
 
@@ -121,7 +278,7 @@ def run_cv_temporal_ridge_regression_model(stim, resp, delays=get_delays(), alph
 
     return test_corr_folds, wts_folds
 
-def run_cv_temporal_ridge_regression_model_fold(stims, resps, delays=get_delays(), alphas=get_alphas()):
+def run_cv_temporal_ridge_regression_model_fold(stims, resps, delays=get_delays(), alphas=get_alphas(), one_hot_groups=None):
     """Fit trf models with user-given split of data into training, validation, and test.
 
     Args:
@@ -129,6 +286,9 @@ def run_cv_temporal_ridge_regression_model_fold(stims, resps, delays=get_delays(
             i.e. [train_stim, ridge_stim, test_stim] where train_stim is (n_training_samples x n_features)
         resps (list): list of resp data split into training, validation, and test.
             The number of samples in each set should match that for the stims.
+        one_hot_groups (list): sizes of the groups of one-hot columns at the start of the stims (e.g. [10, 10, 1] for
+            absolute pitch bins, relative pitch bins, and pitch_binary). If given, the covariance of the training
+            stim is computed from the bin codes with get_lagged_covariance instead of from the delayed training stim.
 
     Returns:
         (tuple)
@@ -139,10 +299,16 @@ def run_cv_temporal_ridge_regression_model_fold(stims, resps, delays=get_delays(
                 validation set. Shape of wts is (n_chans, n_features)
 
     """
-    dstims = [get_dstim(stim, delays) for stim in stims]
     n_chans = resps[0].shape[1]
-
-    wts_alphas, ridge_corrs_alphas = run_ridge_regression(dstims[0], resps[0], dstims[1], resps[1], alphas)
+    if one_hot_groups is None:
+        dstims = [get_dstim(stim, delays) for stim in stims]
+        wts_alphas, ridge_corrs_alphas = run_ridge_regression(dstims[0], resps[0], dstims[1], resps[1], alphas)
+    else:
+        dstims = [None] + [get_dstim(stim, delays) for stim in stims[1:]]
+        bin_codes, dense = get_bin_codes_from_one_hot(stims[0], one_hot_groups)
+        covmat, stim_resp = get_lagged_covariance(bin_codes, dense, resps[0], delays)
+        wts_alphas, ridge_corrs_alphas = run_ridge_regression(None, resps[0], dstims[1], resps[1], alphas,
+                                                              covmat=covmat, stim_resp=stim_resp)
     best_alphas = ridge_corrs_alphas.argmax(0) #returns array with length nchans.
     best_wts = [wts_alphas[best_alphas[chan], :, chan] for chan in range(n_chans)]
     test_pred = [np.dot(dstims[2], best_wts[chan]) for chan in range(n_chans)]
@@ -152,7 +318,8 @@ def run_cv_temporal_ridge_regression_model_fold(stims, resps, delays=get_delays(
     wts = np.array(best_wts)
     return test_corr, wts
 
-def run_ridge_regression(train_stim, train_resp, ridge_stim, ridge_resp, alphas):
+@instrument
+def run_ridge_regression(train_stim, train_resp, ridge_stim, ridge_resp, alphas, covmat=None, stim_resp=None):
     """Runs ridge (L2 regularized) regression for ridge parameters in alphas and returns wts fit
     on training data and correlation between actual and predicted on validation data for each alpha.
 
@@ -162,6 +329,9 @@ def run_ridge_regression(train_stim, train_resp, ridge_stim, ridge_resp, alphas)
         ridge_stim: (n_validation_samples x n_features)
         ridge_resp: (n_validation_samples x n_chans)
         alphas: 1d array with ridge parameters to use
+        covmat: X'X of train_stim, if already computed (e.g. with get_lagged_covariance)
+        stim_resp: X'y of train_stim and train_resp, if already computed. If both covmat and stim_resp are given,
+            train_stim is not used and can be None.
 
     Returns:
         (tuple):
@@ -197,7 +367,7 @@ def run_ridge_regression(train_stim, train_resp, ridge_stim, ridge_resp, alphas)
 
     The wts (B) can be calculated by the matrix multiplication of [Q, D_inv, Usr]
     """
-    n_features = train_stim.shape[1] #stim shape is time x features
+    n_features = ridge_stim.shape[1] #stim shape is time x features
     n_chans = train_resp.shape[1] #resp shape is time x channels
     n_alphas = alphas.shape[0]
 
@@ -205,9 +375,12 @@ def run_ridge_regression(train_stim, train_resp, ridge_stim, ridge_resp, alphas)
     ridge_corrs = np.zeros((n_alphas, n_chans))
 
     dtype = np.single
-    covmat = np.array(np.dot(train_stim.astype(dtype).T, train_stim.astype(dtype)))
-    l, Q = np.linalg.eigh(covmat)
-    Usr = np.dot(Q.T, np.dot(train_stim.T, train_resp))
+    if covmat is None:
+        covmat = np.array(np.dot(train_stim.astype(dtype).T, train_stim.astype(dtype)))
+    l, Q = np.linalg.eigh(np.asarray(covmat, dtype=dtype))
+    if stim_resp is None:
+        stim_resp = np.dot(train_stim.T, train_resp)
+    Usr = np.dot(Q.T, stim_resp)
 
     for alpha_i, alpha in enumerate(alphas):
         D_inv = np.diag(1/(l+alpha)).astype(dtype)
@@ -224,8 +397,50 @@ def run_ridge_regression(train_stim, train_resp, ridge_stim, ridge_resp, alphas)
     return wts, ridge_corrs
 
 def get_all_pred(wts, dstim):
-    all_pred = np.array([np.dot(dstim, wts[chan]) for chan in range(wts.shape[0])])
-    return all_pred
+    """Returns the predictions of all channels for dstim.
+
+    Args:
+        wts: (n_chans, n_features)
+        dstim: (n_times, n_features), or a stack of delayed stims (n_stims, n_times, n_features)
+
+    Returns:
+        all_pred: (n_chans, n_times), or (n_stims, n_chans, n_times) for a stack of delayed stims
+    """
+    if dstim.ndim == 2:
+        return np.dot(wts, dstim.T)
+    return np.dot(dstim, wts.T).transpose(0, 2, 1)
+
+def get_group_pred_mean_and_ste(wts, dstims, groups, chunk_size=16):
+    """Returns the mean and standard error of the predictions (see get_all_pred) of the stims in each group.
+
+    Predictions are linear in the stims, so the mean of each group is the prediction of the mean stim of the group.
+    For the standard errors, stims are predicted chunk_size at a time and their squared differences from the means
+    are summed, so the predictions of all stims are never kept. Groups can overlap.
+
+    Args:
+        wts: (n_chans, n_features)
+        dstims: (n_stims, n_times, n_features)
+        groups (list): indexes of the stims in each group
+
+    Returns:
+        (tuple): pred_means, pred_stes: (n_groups, n_chans, n_times)
+    """
+    n_stims, n_times = dstims.shape[0:2]
+    in_group = np.zeros((len(groups), n_stims), dtype=bool)
+    for group_i, group in enumerate(groups):
+        in_group[group_i, group] = True
+    n = np.sum(in_group, axis=1)
+
+    pred_means = get_all_pred(wts, np.tensordot(in_group / n[:, np.newaxis], dstims, axes=1))
+    sums_squares = np.zeros(pred_means.shape)
+    for start in range(0, n_stims, chunk_size):
+        pred = get_all_pred(wts, dstims[start:start + chunk_size])
+        for group_i in range(len(groups)):
+            in_chunk = in_group[group_i, start:start + chunk_size]
+            if np.any(in_chunk):
+                sums_squares[group_i] += np.sum((pred[in_chunk] - pred_means[group_i]) ** 2, axis=0)
+    pred_stes = np.sqrt(sums_squares / n[:, np.newaxis, np.newaxis]) / np.sqrt(n)[:, np.newaxis, np.newaxis]
+    return pred_means, pred_stes
 
 def reshape_wts_to_2d(wts, delays_used=get_delays(), delay_edges_added=True):
     """Expand the 1d array of wts to the 2d shape of n_delays x n_features.
@@ -247,4 +462,5 @@ def reshape_wts_to_2d(wts, delays_used=get_delays(), delay_edges_added=True):
     return wts_2d
 
 __all__ = ['get_alphas', 'get_delays', 'run_cv_temporal_ridge_regression_model_fold', 'get_dstim', 
-           'run_cv_temporal_ridge_regression_model', 'get_all_pred', 'run_ridge_regression']
+           'run_cv_temporal_ridge_regression_model', 'get_all_pred', 'run_ridge_regression',
+           'get_group_pred_mean_and_ste', 'get_bin_codes_from_one_hot', 'get_lagged_covariance']
@@ -0,0 +1,151 @@
+"""Plots of the TIMIT responses: phoneme responses and PSIs (plot_nima_fig1) and sentence onset ERPs on the grid.
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+from .lazy_imports import lazy_import
+plt = lazy_import('matplotlib.pyplot')
+
+def plot_timit_onset_erps(Y_mat, indexes1, indexes2, gc=np.arange(256), x_zero=None):
+    fig = plot_grid_mean_ste(Y_mat, indexes1, indexes2, gc=gc, x_zero=x_zero)
+    return fig
+
+def plot_timit_onset_erps_for_subject(subject_number):
+    # timit is imported in the functions that use it, since timit re-exports the plots of this module.
+    from .timit import get_timit_erps
+    Y_mat_onset, Y_mat_offset, females = get_timit_erps(subject_number)
+    gc = np.arange(256)
+    fig = plot_timit_onset_erps(Y_mat_onset, females==0, females==1, gc, x_zero=50)
+    return fig
+
+def plot_nima_fig1(average_response, psis, cm_choice=None, five_chans=[245,130,165,131,69]):
+    from .timit import phoneme_order
+    if cm_choice is None:
+        cm_choice = plt.get_cmap('bwr')
+    resp_axes_positions = [[0.058, 0.1, 0.11, 0.75],
+                            [0.218, 0.1, 0.11, 0.75],
+                            [0.378, 0.1, 0.11, 0.75],
+                            [0.538, 0.1, 0.11, 0.75],
+                            [0.698, 0.1, 0.11, 0.75]] 
+
+    psi_axes_positions = [[0.058+0.111, 0.1, 0.02, 0.75],
+                            [0.218+0.111, 0.1, 0.02, 0.75],
+                            [0.378+0.111, 0.1, 0.02, 0.75],
+                            [0.538+0.111, 0.1, 0.02, 0.75],
+                            [0.698+0.111, 0.1, 0.02, 0.75]]
+
+    max_value = np.max(average_response[five_chans,:,:])
+
+
+    fig = plt.figure(figsize=(7,7))
+    for i, resp_axes_position in enumerate(resp_axes_positions):
+        ax = fig.add_axes(resp_axes_position)
+        im1 = ax.imshow(average_response[five_chans[i],:,:], interpolation='none', aspect='auto', vmin=-1*0.8*max_value, vmax=0.8*max_value, cmap=cm_choice)
+        add_resp_axes_styles(ax)
+    for i, psi_axes_position in enumerate(psi_axes_positions):
+        ax = fig.add_axes(psi_axes_position)
+        im2 = ax.imshow(np.atleast_2d(psis[:,five_chans[i]]).T, interpolation='none', aspect='auto', cmap=plt.get_cmap('Greys'), vmin=0, vmax=len(phoneme_order))
+        ax.set_axis_off()
+
+    ax1 = fig.add_axes([0.86, 0.1, 0.05, 0.3])
+    plt.colorbar(im1, cax=ax1, label='high-gamma (z-score)')
+    ax2 = fig.add_axes([0.86, 0.5, 0.05, 0.3])
+    plt.colorbar(im2, cax=ax2, label='psi')
+
+    return fig
+
+def plot_erps_for_five_chans(Y_mat_onset, indexes1, indexes2, chans, x_zero=None):
+    axes_positions =  [[0.058, 0.2, 0.13, 0.65],
+                            [0.218, 0.2, 0.13, 0.65],
+                            [0.378, 0.2, 0.13, 0.65],
+                            [0.538, 0.2, 0.13, 0.65],
+                            [0.698, 0.2, 0.13, 0.65]] 
+
+    Y_mat = Y_mat_onset[chans,:,:]
+
+    average_hg1 = np.mean(Y_mat[:,:,indexes1], 2)
+    ste_hg1 = np.std(Y_mat[:,:,indexes1], 2)/np.sqrt(sum(indexes1))
+    average_hg2 = np.mean(Y_mat[:,:,indexes2], 2)
+    ste_hg2 = np.std(Y_mat[:,:,indexes2], 2)/np.sqrt(sum(indexes2))   
+    min_value = np.min(average_hg2)
+    max_value = np.max(average_hg2)    
+
+    min_value = -1.5
+    max_value = 3.5    
+
+    fig = plt.figure(figsize=(10, 2))
+    for i, pos in enumerate(axes_positions):
+        ax = fig.add_axes(pos)
+        ax.plot(average_hg1[i], 'b')
+        ax.fill_between(np.arange(Y_mat.shape[1]), average_hg1[i] + ste_hg1[i], average_hg1[i] - ste_hg1[i], color='b', alpha=0.2)
+        ax.plot(average_hg2[i], 'r')
+        ax.fill_between(np.arange(Y_mat.shape[1]), average_hg2[i] + ste_hg2[i], average_hg2[i] - ste_hg2[i], color='r', alpha=0.2)
+
+        ax.set_xticklabels(['','0','','1','','2'])
+        ax.set_xlabel('Time (s)')
+        if i != 0:
+            ax.set_yticklabels([])
+        else:
+            ax.set_ylabel('High-gamma (z-score)')
+        if x_zero is not None:
+            ax.plot([x_zero, x_zero], [min_value, max_value], color='k', alpha=0.4)
+        ax.set_ylim(min_value, max_value)
+        ax.set_title(str(chans[i]), {'fontsize':20})  
+    return fig
+
+def add_resp_axes_styles(ax):
+    from .timit import phoneme_order
+    ax.set_yticks(np.arange(len(phoneme_order)))
+    ax.set_yticklabels(phoneme_order)
+    ax.set_xticks([0,10,20,30,40,50])
+    ax.set_xticklabels(['','0','','0.2','','0.4'])
+    ax.set_xlabel('Time (s)')
+    ymin,ymax = ax.get_ylim()
+    ax.plot([10,10],[ymin,ymax], 'k--')
+    return ax
+
+def plot_grid_phoneme_response(average_response, gc):
+    max_value = np.max(average_response)*0.7
+
+    fig = plt.figure(figsize=(20,20))
+    channel_order = [256,240,224,208,192,176,160,144,128,112,96,80,64,48,32,16,255,239,223,207,191,175,159,143,127,111,95,79,63,47,31,15,254,238,222,206,190,174,158,142,126,110,94,78,62,46,30,14,253,237,221,205,189,173,157,141,125,109,93,77,61,45,29,13,252,236,220,204,188,172,156,140,124,108,92,76,60,44,28,12,251,235,219,203,187,171,155,139,123,107,91,75,59,43,27,11,250,234,218,202,186,170,154,138,122,106,90,74,58,42,26,10,249,233,217,201,185,169,153,137,121,105,89,73,57,41,25,9,248,232,216,200,184,168,152,136,120,104,88,72,56,40,24,8,247,231,215,199,183,167,151,135,119,103,87,71,55,39,23,7,246,230,214,198,182,166,150,134,118,102,86,70,54,38,22,6,245,229,213,197,181,165,149,133,117,101,85,69,53,37,21,5,244,228,212,196,180,164,148,132,116,100,84,68,52,36,20,4,243,227,211,195,179,163,147,131,115,99,83,67,51,35,19,3,242,226,210,194,178,162,146,130,114,98,82,66,50,34,18,2,241,225,209,193,177,161,145,129,113,97,81,65,49,33,17,1]
+    for i in range(256):
+        if i in gc:
+            ax = fig.add_subplot(16,16,channel_order[i])
+            ax.imshow(average_response[i,:,:], aspect='auto', cmap=plt.get_cmap('bwr'), interpolation='None', vmin=-1*max_value, vmax=max_value)
+            ax.set_xticklabels([])
+            ax.set_yticklabels([])
+            ax.text(0.2,0.8, str(i), transform=ax.transAxes)
+    fig.tight_layout()
+    return fig
+
+def plot_grid_mean_ste(Y_mat, indexes1, indexes2, gc, x_zero=None):
+    fig = plt.figure(figsize=(20,20))
+    channel_order = [256,240,224,208,192,176,160,144,128,112,96,80,64,48,32,16,255,239,223,207,191,175,159,143,127,111,95,79,63,47,31,15,254,238,222,206,190,174,158,142,126,110,94,78,62,46,30,14,253,237,221,205,189,173,157,141,125,109,93,77,61,45,29,13,252,236,220,204,188,172,156,140,124,108,92,76,60,44,28,12,251,235,219,203,187,171,155,139,123,107,91,75,59,43,27,11,250,234,218,202,186,170,154,138,122,106,90,74,58,42,26,10,249,233,217,201,185,169,153,137,121,105,89,73,57,41,25,9,248,232,216,200,184,168,152,136,120,104,88,72,56,40,24,8,247,231,215,199,183,167,151,135,119,103,87,71,55,39,23,7,246,230,214,198,182,166,150,134,118,102,86,70,54,38,22,6,245,229,213,197,181,165,149,133,117,101,85,69,53,37,21,5,244,228,212,196,180,164,148,132,116,100,84,68,52,36,20,4,243,227,211,195,179,163,147,131,115,99,83,67,51,35,19,3,242,226,210,194,178,162,146,130,114,98,82,66,50,34,18,2,241,225,209,193,177,161,145,129,113,97,81,65,49,33,17,1]
+
+    #average_hg1 = np.mean(Y_mat[:,:,indexes1], 2)
+    #ste_hg1 = np.std(Y_mat[:,:,indexes1], 2)/np.sqrt(sum(indexes1))
+    average_hg2 = np.mean(Y_mat[:,:,indexes2], 2)
+    ste_hg2 = np.std(Y_mat[:,:,indexes2], 2)/np.sqrt(sum(indexes2))
+    min_value = np.min(average_hg2)
+    max_value = np.max(average_hg2)
+
+    for i in range(256):
+        if i in gc:
+            ax = fig.add_subplot(16,16,channel_order[i])
+            #ax.plot(average_hg1[i], 'b')
+            #ax.fill_between(np.arange(Y_mat.shape[1]), average_hg1[i] + ste_hg1[i], average_hg1[i] - ste_hg1[i], color='b', alpha=0.2)
+            ax.plot(average_hg2[i], 'b')
+            ax.fill_between(np.arange(Y_mat.shape[1]), average_hg2[i] + ste_hg2[i], average_hg2[i] - ste_hg2[i], color='b', alpha=0.2)
+
+            ax.set_xticklabels([])
+            ax.set_yticklabels([])
+            if x_zero is not None:
+                ax.plot([x_zero, x_zero], [min_value, max_value], color='k', alpha=0.4)
+            ax.set_ylim(min_value, max_value)
+
+            ax.text(0.2,0.8, str(i), transform=ax.transAxes)
+    fig.tight_layout()
+    return fig
@@ -7,6 +7,9 @@ setup(name="intonatang",
     author_email="clairetang6@gmail.com",
     packages=find_packages(),
     include_package_data=True,
+    entry_points={
+        "console_scripts": ["intonatang = intonatang.cli:main"]
+    },
     classifiers=[
         "Intended Audience :: Science/Research",
         "Intended Audience :: Developers",